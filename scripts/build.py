@@ -0,0 +1,165 @@
+"""
+Builds the useless-box firmware code for faster boot.
+
+    python scripts/build.py mpy
+    python scripts/build.py deploy --port /dev/cu.usbmodem1452201
+    python scripts/build.py freeze --micropython ~/micropython
+
+"mpy" cross-compiles src/useless-box to .mpy files in build/useless-box, so the board
+loads bytecode instead of compiling the source on every power-up. "deploy" builds and
+copies the result to the board with mpremote. "freeze" writes a manifest that bakes
+the modules into a custom firmware image and, given a MicroPython checkout with
+ESP-IDF set up, builds it into firmware/.
+
+mpy-cross must match the firmware version (pip install mpy-cross==1.23.0).
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.normpath(os.path.join(HERE, ".."))
+SOURCE = os.path.join(ROOT, "src", "useless-box")
+BUILD = os.path.join(ROOT, "build")
+FIRMWARE = os.path.join(ROOT, "firmware")
+
+BOARD = "ESP32_GENERIC_C3"
+MPY_VERSION = "mpy v6."  # Bytecode version of MicroPython 1.23
+SCRIPTS = ("boot.py", "main.py")  # Run as source by MicroPython, so never compiled
+SKIP = ("tests", "__pycache__")
+
+def modules(directory):
+    """
+    Lists the modules to compile, as paths relative to directory.
+    """
+    found = []
+    for parent, folders, files in os.walk(directory):
+        folders[:] = sorted(folder for folder in folders if folder not in SKIP)
+        for name in sorted(files):
+            path = os.path.relpath(os.path.join(parent, name), directory)
+            if name.endswith(".py") and path not in SCRIPTS:
+                found.append(path)
+    return found
+
+def check_mpy_cross():
+    try:
+        version = subprocess.run(["mpy-cross", "--version"], capture_output=True, text=True, check=True).stdout
+    except FileNotFoundError:
+        sys.exit("mpy-cross not found, install it with: pip install mpy-cross==1.23.0")
+    if MPY_VERSION not in version:
+        sys.exit(f"mpy-cross emits the wrong bytecode version for the firmware: {version.strip()}")
+
+def build_mpy(libs, optimize=0):
+    """
+    Compiles src/useless-box and any library directories into build/useless-box.
+    :param optimize: mpy-cross optimization level; 1 and up drop `if __debug__:` blocks, such as DEBUG telemetry.
+    :return: The output directory.
+    """
+    check_mpy_cross()
+    output = os.path.join(BUILD, "useless-box")
+    shutil.rmtree(output, ignore_errors=True)
+
+    for directory in [SOURCE] + libs:
+        for path in modules(directory):
+            target = os.path.join(output, path[:-3] + ".mpy")
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            subprocess.run(["mpy-cross", "-O" + str(optimize), "-o", target, "-s", path, os.path.join(directory, path)], check=True)
+
+    for name in SCRIPTS:
+        shutil.copy(os.path.join(SOURCE, name), output)
+    shutil.copytree(os.path.join(SOURCE, "behaviors"), os.path.join(output, "behaviors"))
+
+    size = sum(os.path.getsize(os.path.join(parent, name)) for parent, _, files in os.walk(output) for name in files)
+    print(f"{output}: {size} bytes")
+    return output
+
+# Removes source files that have a compiled .mpy next to them, since MicroPython imports .py first
+REMOVE_STALE_SOURCE = """
+import os
+def clean(path):
+    for name, kind, *_ in os.ilistdir(path or "/"):
+        full = path + "/" + name
+        if kind == 0x4000:
+            clean(full)
+        elif name.endswith(".mpy"):
+            try:
+                os.remove(full[:-4] + ".py")
+                print("removed", full[:-4] + ".py")
+            except OSError:
+                pass
+clean("")
+"""
+
+def deploy(output, port):
+    """
+    Copies a build to the board with mpremote and soft-resets it.
+    """
+    command = ["mpremote", "connect", port]
+    for parent, _, files in sorted(os.walk(output)):
+        remote = os.path.relpath(parent, output)
+        if remote != ".":
+            command += ["fs", "mkdir", ":" + remote.replace(os.sep, "/"), "+"]
+        for name in sorted(files):
+            target = name if remote == "." else remote.replace(os.sep, "/") + "/" + name
+            command += ["fs", "cp", os.path.join(parent, name), ":" + target, "+"]
+    command += ["exec", REMOVE_STALE_SOURCE, "+", "soft-reset"]
+    subprocess.run(command, check=True)
+
+def write_manifest(libs, optimize=0):
+    """
+    Writes a MicroPython manifest freezing the useless-box modules on top of the board's default ones.
+    :param optimize: Optimization level the modules are frozen with, see build_mpy.
+    :return: Path of the manifest.
+    """
+    lines = ['include("$(PORT_DIR)/boards/manifest.py")', ""]
+    for directory in [SOURCE] + libs:
+        for path in modules(directory):
+            lines.append(f'module("{path.replace(os.sep, "/")}", base_path="{directory}", opt={optimize})')
+
+    os.makedirs(BUILD, exist_ok=True)
+    manifest = os.path.join(BUILD, "manifest.py")
+    with open(manifest, "w") as file:
+        file.write("\n".join(lines) + "\n")
+    print(f"{manifest}: {len(lines) - 2} frozen modules")
+    return manifest
+
+def build_firmware(manifest, micropython):
+    """
+    Builds the ESP32-C3 firmware with the frozen modules and copies it to firmware/.
+    """
+    port = os.path.join(micropython, "ports", "esp32")
+    subprocess.run(["make", "-C", port, "BOARD=" + BOARD, "FROZEN_MANIFEST=" + manifest], check=True)
+    image = os.path.join(FIRMWARE, BOARD + "-useless-box.bin")
+    shutil.copy(os.path.join(port, "build-" + BOARD, "firmware.bin"), image)
+    print(f"{image}: flash it like the stock image, then upload boot.py, main.py and behaviors/ only")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("command", choices=("mpy", "deploy", "freeze"))
+    parser.add_argument("--lib", action="append", default=[],
+                        help="extra directory of modules to include, e.g. a checkout of the apds9960 library")
+    parser.add_argument("--port", help="serial port of the board, for deploy")
+    parser.add_argument("--micropython", help="MicroPython checkout to build the frozen firmware with")
+    parser.add_argument("--optimize", type=int, default=0, metavar="LEVEL",
+                        help="mpy-cross optimization level; 1 compiles away DEBUG telemetry and asserts")
+    args = parser.parse_args()
+    libs = [os.path.abspath(lib) for lib in args.lib]
+
+    if args.command == "freeze":
+        manifest = write_manifest(libs, args.optimize)
+        if args.micropython:
+            build_firmware(manifest, os.path.abspath(args.micropython))
+        else:
+            print(f"Build it with: make -C <micropython>/ports/esp32 BOARD={BOARD} FROZEN_MANIFEST={manifest}")
+        return
+
+    output = build_mpy(libs, args.optimize)
+    if args.command == "deploy":
+        if not args.port:
+            parser.error("deploy needs --port")
+        deploy(output, args.port)
+
+if __name__ == "__main__":
+    main()
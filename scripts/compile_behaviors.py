@@ -0,0 +1,196 @@
+"""
+Compiles behavior scripts into the bytecode run by behavior.BehaviorInterpreter.
+
+    python scripts/compile_behaviors.py behaviors/*.box --output src/useless-box/behaviors
+
+Every script becomes a .bin program with the same name. One instruction per line,
+"#" starts a comment and "name:" defines a label:
+
+    print <message>
+    lid open|close <percentage>[..<percentage>] <duration ms>
+    switch extend|retract <percentage>[..<percentage>] <duration ms>
+    lid open ... then switch extend ...      (the arm starts once the lid is clear)
+    switch retract ... then lid close ...    (the lid starts closing once the arm is inside)
+    led on|off|toggle|blink_slow|blink_fast|breathe|strobe
+    wait <ms>
+    state IDLE|LID_OPEN|TEASING|SWITCH_OFF|STAGED
+    repeat <count> ... end
+    goto <label>
+    if proximity NO_DETECTION|FAR|CLOSE|VERY_CLOSE goto <label>
+    if switch on|off goto <label>
+    if lid open|closed goto <label>
+
+A percentage range picks a random percentage every time the instruction runs.
+"""
+import argparse
+import os
+import struct
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "src", "useless-box"))
+
+# Only the firmware modules that import nothing from the board
+import bytecode as bc
+from states import PATTERN_BLINK_FAST, PATTERN_BLINK_SLOW, PATTERN_BREATHE, PATTERN_STROBE, PROXIMITY_NAMES, STATE_NAMES
+
+MOTIONS = {
+    ("lid", "open"): bc.OP_LID_OPEN,
+    ("lid", "close"): bc.OP_LID_CLOSE,
+    ("switch", "extend"): bc.OP_SWITCH_EXTEND,
+    ("switch", "retract"): bc.OP_SWITCH_RETRACT,
+}
+COORDINATED = {
+    (bc.OP_LID_OPEN, bc.OP_SWITCH_EXTEND): bc.OP_OPEN_AND_EXTEND,
+    (bc.OP_SWITCH_RETRACT, bc.OP_LID_CLOSE): bc.OP_RETRACT_AND_CLOSE,
+}
+LED_MODES = {
+    "off": bc.LED_OFF,
+    "on": bc.LED_ON,
+    "toggle": bc.LED_TOGGLE,
+    "blink_slow": bc.LED_PATTERN | PATTERN_BLINK_SLOW,
+    "blink_fast": bc.LED_PATTERN | PATTERN_BLINK_FAST,
+    "breathe": bc.LED_PATTERN | PATTERN_BREATHE,
+    "strobe": bc.LED_PATTERN | PATTERN_STROBE,
+}
+STATES = {name: state for state, name in enumerate(STATE_NAMES)}  # UselessBoxController states
+CONDITIONS = {
+    "proximity": (bc.SENSOR_PROXIMITY, {name: state for state, name in enumerate(PROXIMITY_NAMES)}),
+    "switch": (bc.SENSOR_SWITCH, {"off": 0, "on": 1}),
+    "lid": (bc.SENSOR_LID, {"closed": 0, "open": 1}),
+}
+
+class CompileError(Exception):
+    def __init__(self, path, line, message):
+        super().__init__(f"{path}:{line}: {message}")
+
+def _number(text, low, high):
+    value = int(text)
+    if not low <= value <= high:
+        raise ValueError(f"{value} is not between {low} and {high}")
+    return value
+
+def _percentages(text):
+    low, _, high = text.partition("..")
+    low = _number(low, 0, 100)
+    high = _number(high, 0, 100) if high else low
+    if high < low:
+        raise ValueError(f"empty range {text}")
+    return low, high
+
+def compile_source(source, path="<source>"):
+    """
+    Compiles the text of a behavior script.
+    :return: The program as bytes.
+    """
+    code = bytearray(bc.MAGIC)
+    labels = {}
+    fixups = []  # (offset of the target in code, label, line number)
+    repeats = []  # Offsets of the bodies of the open repeat blocks
+    number = 0
+
+    for number, raw in enumerate(source.splitlines(), 1):
+        line = raw.split("#", 1)[0].strip()
+        if not line:
+            continue
+        words = line.split()
+        try:
+            if len(words) == 1 and line.endswith(":"):
+                label = line[:-1]
+                if label in labels:
+                    raise ValueError(f"duplicate label {label}")
+                labels[label] = len(code)
+
+            elif words[0] == "print":
+                message = line[len("print"):].strip().encode("utf-8")
+                if len(message) > 255:
+                    raise ValueError("message is longer than 255 bytes")
+                code += bytes((bc.OP_PRINT, len(message))) + message
+
+            elif "then" in words:
+                split = words.index("then")
+                first, second = words[:split], words[split + 1:]
+                if len(first) != 4 or len(second) != 4 or (first[0], first[1]) not in MOTIONS or (second[0], second[1]) not in MOTIONS:
+                    raise ValueError("expected: <motion> then <motion>")
+                op = COORDINATED.get((MOTIONS[first[0], first[1]], MOTIONS[second[0], second[1]]))
+                if op is None:
+                    raise ValueError("only lid open then switch extend, or switch retract then lid close")
+                code.append(op)
+                for motion in (first, second):
+                    low, high = _percentages(motion[2])
+                    code += struct.pack("<BBH", low, high, _number(motion[3], 0, 0xFFFF))
+
+            elif (words[0], words[1] if len(words) > 1 else None) in MOTIONS:
+                if len(words) != 4:
+                    raise ValueError(f"expected: {words[0]} {words[1]} <percentage> <duration>")
+                low, high = _percentages(words[2])
+                code += struct.pack("<BBBH", MOTIONS[words[0], words[1]], low, high, _number(words[3], 0, 0xFFFF))
+
+            elif words[0] == "led" and len(words) == 2 and words[1] in LED_MODES:
+                code += bytes((bc.OP_LED, LED_MODES[words[1]]))
+
+            elif words[0] == "wait" and len(words) == 2:
+                code += struct.pack("<BH", bc.OP_WAIT, _number(words[1], 0, 0xFFFF))
+
+            elif words[0] == "state" and len(words) == 2 and words[1] in STATES:
+                code += bytes((bc.OP_STATE, STATES[words[1]]))
+
+            elif words[0] == "repeat" and len(words) == 2:
+                code += bytes((bc.OP_REPEAT, _number(words[1], 1, 255)))
+                repeats.append(len(code))
+
+            elif words == ["end"]:
+                if not repeats:
+                    raise ValueError("end without repeat")
+                code += struct.pack("<BH", bc.OP_LOOP, repeats.pop())
+
+            elif words[0] == "goto" and len(words) == 2:
+                code.append(bc.OP_JUMP)
+                fixups.append((len(code), words[1], number))
+                code += b"\0\0"
+
+            elif words[0] == "if" and len(words) == 5 and words[1] in CONDITIONS and words[3] == "goto":
+                sensor, values = CONDITIONS[words[1]]
+                if words[2] not in values:
+                    raise ValueError(f"{words[1]} can be {', '.join(values)}")
+                code += bytes((bc.OP_IF, sensor, values[words[2]]))
+                fixups.append((len(code), words[4], number))
+                code += b"\0\0"
+
+            else:
+                raise ValueError(f"unknown instruction: {line}")
+        except ValueError as error:
+            raise CompileError(path, number, error) from None
+
+    if repeats:
+        raise CompileError(path, number, "repeat without end")
+    labels.setdefault("end", len(code))  # "goto end" leaves the behavior
+    code.append(bc.OP_END)
+
+    for offset, label, number in fixups:
+        if label not in labels:
+            raise CompileError(path, number, f"unknown label {label}")
+        struct.pack_into("<H", code, offset, labels[label])
+    return bytes(code)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("scripts", nargs="+", help="behavior scripts (.box)")
+    parser.add_argument("--output", default=os.path.join(HERE, "..", "src", "useless-box", bc.BEHAVIOR_DIR),
+                        help="directory for the compiled programs")
+    args = parser.parse_args()
+
+    os.makedirs(args.output, exist_ok=True)
+    for path in args.scripts:
+        with open(path) as source:
+            try:
+                program = compile_source(source.read(), path)
+            except CompileError as error:
+                sys.exit(str(error))
+        name = os.path.splitext(os.path.basename(path))[0] + bc.EXTENSION
+        with open(os.path.join(args.output, name), "wb") as output:
+            output.write(program)
+        print(f"{path}: {len(program)} bytes")
+
+if __name__ == "__main__":
+    main()
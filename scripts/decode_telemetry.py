@@ -0,0 +1,136 @@
+"""
+Decodes the telemetry records of the useless-box firmware into text.
+
+    mpremote exec "import telemetry; telemetry.log.dump()" > dump.txt
+    python scripts/decode_telemetry.py dump.txt
+
+Reads the hex text printed by Telemetry.dump as well as a file written by Telemetry.save
+(copied off the board with `mpremote cp :telemetry.bin .`). Every record becomes one line
+with its time, level and event.
+"""
+import argparse
+import binascii
+import os
+import struct
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [os.path.join(HERE, "..", "sim"), os.path.join(HERE, "..", "src", "useless-box")]
+
+import simulator
+simulator.install()
+
+import telemetry
+from behavior import BEHAVIOR_NAMES
+from gestures import GESTURE_NAMES
+from led import PATTERN_NAMES
+from proximity import PROXIMITY_NAMES
+from states import STATE_NAMES
+
+TICKS_PERIOD = 1 << 30  # MicroPython's ticks_ms wraps around at this
+LEVEL_NAMES = {telemetry.DEBUG: "DEBUG", telemetry.INFO: "INFO", telemetry.WARNING: "WARNING"}
+
+def _angle(index):
+    return f"{index / 4:.2f}"
+
+# How to print each event's arguments, by event name (EVT_ left off)
+FORMATS = {
+    "PROXIMITY": lambda a, b, c: f"proximity {PROXIMITY_NAMES[a] if 0 <= a < len(PROXIMITY_NAMES) else a}",
+    "LED": lambda a, b, c: f"LED {PATTERN_NAMES[a].lower().replace('_', ' ') if 0 <= a < len(PATTERN_NAMES) else a}",
+    "LID_OPEN": lambda a, b, c: f"opening lid to {a}% over {b} ms",
+    "LID_CLOSE": lambda a, b, c: f"closing lid to {a}% over {b} ms",
+    "OVERLAP": lambda a, b, c: f"arms overlapped for {a} ms",
+    "ATTEMPT": lambda a, b, c: f"switch-off attempt {a}",
+    "SLEEP": lambda a, b, c: "light sleep",
+    "WAKE": lambda a, b, c: f"woken by the {'switch' if a == 1 else 'proximity sensor'}, resumed in {b} us",
+    "COLLECT": lambda a, b, c: f"collected garbage in {a} ms, {b} KB still allocated",
+    "SWITCH": lambda a, b, c: f"switch {'on' if a else 'off'}",
+    "STATE": lambda a, b, c: f"state {STATE_NAMES[a] if 0 <= a < len(STATE_NAMES) else a}",
+    "DELAY": lambda a, b, c: f"waiting {a} ms before switching off",
+    "SWITCH_OFF": lambda a, b, c: "switching off",
+    "SWITCHED_OFF": lambda a, b, c: f"switched off after {a} attempt(s)",
+    "STAGE": lambda a, b, c: "hand approaching fast, staging the arms",
+    "STAND_DOWN": lambda a, b, c: "no flip after all, standing down",
+    "GESTURE": lambda a, b, c: f"gesture {GESTURE_NAMES.get(a, a)}",
+    "TEASE": lambda a, b, c: f"teasing with the lid open {a}%",
+    "FAKEOUT": lambda a, b, c: "fake-out",
+    "PEEKABOO": lambda a, b, c: "peek-a-boo",
+    "THREATEN": lambda a, b, c: "threatening to switch off",
+    "CLOSE_LID": lambda a, b, c: "retracting the switch arm and closing the lid",
+    "KEEP_CLOSED": lambda a, b, c: "hand too close, keeping the lid closed",
+    "HOLD_BACK": lambda a, b, c: "hand very close, doing nothing this time",
+    "SWITCH_ON_TOO_LONG": lambda a, b, c: "switch on for a while, turning it off",
+    "INACTIVE": lambda a, b, c: "no interaction for a while, closing the lid",
+    "PANIC": lambda a, b, c: "panic mode",
+    "PUSH": lambda a, b, c: "extending the switch arm to turn off the toggle",
+    "TOGGLE_ANGLE": lambda a, b, c: f"switch toggled at {_angle(a)} degrees",
+    "HOME": lambda a, b, c: f"homing the servo on GPIO{a} to {_angle(b)} degrees",
+    "RESET": lambda a, b, c: f"resetting the servo on GPIO{a} to {_angle(b)} degrees",
+    "STILL_ON": lambda a, b, c: f"switch still on after attempt {a}",
+    "TOGGLE_MISSED": lambda a, b, c: f"switch did not toggle at {_angle(a)} degrees, forgetting the learned angle",
+    "SLOW_WAKE": lambda a, b, c: f"waking up took {a} us, over the {b} ms bound",
+    "UNPLANNED_COLLECT": lambda a, b, c: f"garbage collected during pass {a}, not at an idle point",
+    "PROFILE_LOADED": lambda a, b, c: f"loaded the calibration profile: switch arm extends to {_angle(a)} degrees, lid opens to {_angle(b)} degrees and is clear at {_angle(c)}",
+    "WIFI_CONNECTED": lambda a, b, c: f"WiFi connected after {a} attempt(s), the last took {b} ms{' from the cache' if c else ''}",
+    "WIFI_FAILED": lambda a, b, c: f"WiFi attempt {a} failed with status {b}, " + (f"retrying in {c} s" if c else "scanning instead of the cache"),
+    "WIFI_LOST": lambda a, b, c: f"WiFi link lost with status {a}",
+    "BEHAVIOR_MISSING": lambda a, b, c: f"behavior {BEHAVIOR_NAMES[a] if 0 <= a < len(BEHAVIOR_NAMES) else '(unknown)'} is not loaded",
+    "NO_BEHAVIORS": lambda a, b, c: "no behavior programs found",
+}
+
+EVENTS = {value: name[4:] for name, value in vars(telemetry).items() if name.startswith("EVT_")}
+
+def read(path):
+    """
+    Reads a saved or dumped telemetry file.
+    :return: (records written in total, record bytes).
+    """
+    with open(path, "rb") as file:
+        data = file.read()
+    if not data.startswith(telemetry.FILE_MAGIC):
+        # Hex text from Telemetry.dump, possibly with other REPL output around it
+        start = data.find(binascii.hexlify(telemetry.FILE_MAGIC))
+        if start < 0:
+            sys.exit(f"{path}: no telemetry found")
+        data = binascii.unhexlify(b"".join(data[start:].split()))
+    header_size = struct.calcsize(telemetry.HEADER_FORMAT)
+    _, record_size, records, total = struct.unpack_from(telemetry.HEADER_FORMAT, data)
+    if record_size != telemetry.RECORD_SIZE:
+        sys.exit(f"{path}: records of {record_size} bytes, this decoder reads {telemetry.RECORD_SIZE}")
+    return total, data[header_size:header_size + records * record_size]
+
+def decode(data):
+    """
+    Yields (milliseconds since the first record, level, event text) for every record.
+    """
+    first = previous = None
+    offset = 0
+    for time_ms, event, a, b, c in struct.iter_unpack(telemetry.RECORD_FORMAT, data):
+        if previous is not None and time_ms < previous:
+            offset += TICKS_PERIOD
+        previous = time_ms
+        time_ms += offset
+        if first is None:
+            first = time_ms
+        name = EVENTS.get(event)
+        format = FORMATS.get(name)
+        text = format(a, b, c) if format else f"{name or hex(event)} {a} {b} {c}"
+        yield time_ms - first, event >> 8, text
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("file", help="hex dump printed by Telemetry.dump, or a file written by Telemetry.save")
+    parser.add_argument("--level", choices=("DEBUG", "INFO", "WARNING"), default="DEBUG", help="hide records below this level")
+    args = parser.parse_args()
+
+    minimum = getattr(telemetry, args.level)
+    total, data = read(args.file)
+    records = len(data) // telemetry.RECORD_SIZE
+    if total > records:
+        print(f"# {total - records} older records were overwritten")
+    for time_ms, level, text in decode(data):
+        if level >= minimum:
+            print(f"{time_ms / 1000:10.3f}  {LEVEL_NAMES.get(level, level):<7}  {text}")
+
+if __name__ == "__main__":
+    main()
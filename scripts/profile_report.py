@@ -0,0 +1,94 @@
+"""
+Reports the stage timings of the useless-box firmware and flags the stages over budget.
+
+    mpremote exec "controller.profiler.dump()" > profile.txt
+    python scripts/profile_report.py profile.txt --budget i2c=600
+
+Reads the text printed by Profiler.dump (or saved by sim/run.py --profiler), possibly with other
+REPL output around it. Every stage gets its count, minimum, mean, maximum and an estimated 90th
+percentile from the histogram. A stage is over budget when its maximum is; the exit status is 1
+if any stage is, so the report can gate a bench run.
+"""
+import argparse
+import sys
+
+# Microseconds each stage may take. A pass that moves a servo blocks until the move ends, so the
+# actuation and pass budgets cover the longest behavior rather than the 200 ms loop period.
+BUDGETS_US = {
+    "switch": 100,
+    "sensor": 3000,
+    "logic": 1000,
+    "actuation": 2000000,
+    "led": 500,
+    "pass": 2000000,
+    "duty": 100,
+    "i2c": 1000,
+}
+
+def read(path):
+    """
+    Reads a dumped profile.
+    :return: (bucket upper bounds, {stage: (count, min_us, max_us, total_us, histogram)}).
+    """
+    with open(path) as file:
+        lines = iter(file.read().splitlines())
+    for line in lines:
+        if line.startswith("profile "):
+            limits = [int(limit) for limit in line.split()[1:]]
+            break
+    else:
+        sys.exit(f"{path}: no profile found")
+    stages = {}
+    for line in lines:
+        fields = line.split()
+        if len(fields) != 6 + len(limits) + 1:
+            break
+        name, count, minimum, maximum, total_s, total_us = fields[0], *map(int, fields[1:6])
+        stages[name] = (count, minimum, maximum, total_s * 1000000 + total_us, [int(n) for n in fields[6:]])
+    return limits, stages
+
+def percentile(limits, histogram, maximum, p):
+    """
+    Upper bound of the histogram bucket the p-th percentile falls in, capped at the maximum.
+    """
+    rank = p / 100 * sum(histogram)
+    seen = 0
+    for bucket, count in enumerate(histogram):
+        seen += count
+        if seen >= rank:
+            return min(limits[bucket], maximum) if bucket < len(limits) else maximum
+    return maximum
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("file", help="text printed by Profiler.dump")
+    parser.add_argument("--budget", action="append", default=[], metavar="STAGE=US", help="override a stage budget")
+    args = parser.parse_args()
+
+    budgets = dict(BUDGETS_US)
+    for budget in args.budget:
+        stage, _, us = budget.partition("=")
+        if stage not in budgets or not us.isdigit():
+            sys.exit(f"--budget {budget}: expected one of {', '.join(budgets)} = microseconds")
+        budgets[stage] = int(us)
+
+    limits, stages = read(args.file)
+    over = []
+    print(f"{'stage':<10} {'count':>8} {'min us':>9} {'mean us':>9} {'p90 us':>9} {'max us':>9} {'budget us':>10}")
+    for name, (count, minimum, maximum, total, histogram) in stages.items():
+        if not count:
+            continue
+        budget = budgets.get(name)
+        flag = ""
+        if budget is not None and maximum > budget:
+            within = sum(n for limit, n in zip(limits, histogram) if limit <= budget)
+            flag = f"  OVER BUDGET in up to {100 - within * 100 / count:.1f}% of runs"
+            over.append(name)
+        print(f"{name:<10} {count:>8} {minimum:>9} {total // count:>9} {percentile(limits, histogram, maximum, 90):>9} "
+              f"{maximum:>9} {budget if budget is not None else '-':>10}{flag}")
+    if over:
+        print(f"over budget: {', '.join(over)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
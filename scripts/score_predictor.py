@@ -0,0 +1,107 @@
+"""
+Replays recorded proximity traces through the approach predictor and scores its predictions.
+
+    python scripts/score_predictor.py trace.csv --aggressiveness 0.2 0.5 0.8
+
+A trace is a CSV file with the columns ms, proximity (raw reading) and switch (1 while on),
+as written by src/useless-box/tests/proximity_trace.py on the board or by
+sim/run.py --record-trace. A prediction followed by a flip within the stage hold time is a
+hit, any other prediction is a false alarm, and a flip without a prediction is a miss.
+"""
+import argparse
+import csv
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [os.path.join(HERE, "..", "sim"), os.path.join(HERE, "..", "src", "useless-box")]
+
+import simulator
+simulator.install()  # predictor uses the MicroPython ticks functions
+
+from controller import UselessBoxController
+from predictor import ApproachPredictor
+
+def load(path):
+    """
+    Reads a trace.
+    :return: List of (ms, proximity, switch) tuples.
+    """
+    with open(path) as file:
+        return [(int(row["ms"]), int(row["proximity"]), int(row["switch"])) for row in csv.DictReader(file)]
+
+def replay(samples, aggressiveness, interval_ms):
+    """
+    Feeds a trace to a new predictor, one reading every interval_ms as a controller would sample it.
+    :return: Times of the predictions and of the flips, in ms.
+    """
+    predictor = ApproachPredictor(aggressiveness)
+    predictions, flips = [], []
+    next_ms = None
+    switch = None
+    for ms, proximity, on in samples:
+        if switch is not None and on and not switch:
+            flips.append(ms)
+        switch = on
+        if next_ms is not None and ms < next_ms:
+            continue
+        next_ms = ms + interval_ms
+        if predictor.update(proximity, ms):
+            predictions.append(ms)
+    return predictions, flips
+
+def score(predictions, flips, hold_ms=UselessBoxController.STAGE_HOLD_MS):
+    """
+    Matches predictions to the flips that followed them.
+    :return: Dictionary with hits, misses, false alarms and the lead time of the hits.
+    """
+    leads = []
+    used = set()
+    for flip in flips:
+        matches = [p for p in predictions if flip - hold_ms <= p <= flip and p not in used]
+        if matches:
+            used.add(matches[0])
+            leads.append(flip - matches[0])
+    hits = len(leads)
+    leads.sort()
+    return {
+        "flips": len(flips),
+        "hits": hits,
+        "misses": len(flips) - hits,
+        "false_alarms": len(predictions) - hits,
+        "precision": hits / len(predictions) if predictions else None,
+        "recall": hits / len(flips) if flips else None,
+        "lead_ms_p50": leads[len(leads) // 2] if leads else None,
+        "lead_ms_min": leads[0] if leads else None,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("traces", nargs="+", help="CSV traces")
+    parser.add_argument("--aggressiveness", type=float, nargs="+", default=[0.25, 0.5, 0.75, 1.0])
+    parser.add_argument("--interval-ms", type=int, default=20,
+                        help="sampling interval of the controller, 20 for async and 200 for sync")
+    args = parser.parse_args()
+
+    traces = [load(path) for path in args.traces]
+    print(f"{'aggressiveness':>14} {'flips':>5} {'hits':>5} {'misses':>6} {'false':>5} {'precision':>9} {'recall':>6} {'lead p50':>8} {'lead min':>8}")
+    for aggressiveness in args.aggressiveness:
+        predictions, flips = [], []
+        offset = 0
+        for samples in traces:
+            found, flipped = replay(samples, aggressiveness, args.interval_ms)
+            predictions += [p + offset for p in found]
+            flips += [f + offset for f in flipped]
+            # Keeps the traces apart, so a prediction in one never matches a flip in the next
+            offset += samples[-1][0] + 10 * UselessBoxController.STAGE_HOLD_MS if samples else 0
+        total = score(predictions, flips)
+        print("{:>14} {flips:>5} {hits:>5} {misses:>6} {false_alarms:>5} {precision:>9} {recall:>6} {lead_ms_p50:>8} {lead_ms_min:>8}".format(
+            aggressiveness, **{key: _format(value) for key, value in total.items()}))
+
+def _format(value):
+    if value is None:
+        return "-"
+    return f"{value:.2f}" if isinstance(value, float) else value
+
+if __name__ == "__main__":
+    main()
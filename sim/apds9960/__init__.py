@@ -0,0 +1,237 @@
+"""
+Simulated APDS-9960: a register-level device on the virtual I2C bus with a scriptable
+proximity reading, and the subset of the uAPDS9960 driver API the firmware uses.
+"""
+from apds9960.const import *
+from simulator import board
+
+class VirtualAPDS9960:
+    def __init__(self):
+        self.registers = bytearray(256)
+        self.registers[APDS9960_REG_ID] = 0xab
+        self.registers[APDS9960_REG_PIHT] = 0xff
+        self.registers[APDS9960_REG_PPULSE] = 0x87  # 8 pulses of 16 us, as the driver sets it up
+        self.proximity = 0
+        self.int_pin = None  # Pin id of the active-low interrupt line, if wired
+        self.gestures = []  # Decoded directions waiting to be read
+        self.gesture_fifo = []  # Raw (up, down, left, right) datasets waiting to be read
+        self.proximity_reads = 0
+
+    def script(self, points):
+        """
+        Schedules proximity values: a list of (seconds, value) pairs.
+        """
+        for seconds, value in points:
+            board.clock.at(seconds, lambda value=value: self.set_proximity(value))
+
+    def script_gestures(self, points):
+        """
+        Schedules gestures: a list of (seconds, direction) pairs.
+        """
+        for seconds, direction in points:
+            board.clock.at(seconds, lambda direction=direction: self.push_gesture(direction))
+
+    def wire_interrupt(self, pin_id):
+        self.int_pin = pin_id
+        board.set_pin(pin_id, 1)
+
+    def set_proximity(self, value):
+        """
+        Sets the reading at the driver's default LED settings (100 mA, 8 pulses of 16 us).
+        """
+        self.proximity = max(0, min(255, int(value)))
+        self._evaluate_interrupt()
+
+    def reading(self):
+        """
+        The proximity reading at the current LED settings: it scales with the LED current and the
+        total pulse time.
+        """
+        drive = self.registers[APDS9960_REG_CONTROL] >> 6
+        pulse = self.registers[APDS9960_REG_PPULSE]
+        pulse_us = (4 << (pulse >> 6)) * ((pulse & 0b111111) + 1)
+        return min(255, self.proximity * (8 >> drive) * pulse_us // (8 * 128))
+
+    def push_gesture(self, direction, duration=0.2):
+        """
+        A hand makes a gesture over the sensor: the gesture engine, if enabled, fills the FIFO with
+        datasets interpolated between the direction's key frames, one per gesture cycle.
+        :param duration: Seconds the movement takes.
+        """
+        if not self.registers[APDS9960_REG_ENABLE] & APDS9960_BIT_GEN:
+            return
+        self.gestures.append(direction)
+        frames = _GESTURE_DATASETS.get(direction, ())
+        wait_ms = _GESTURE_WAIT_MS[self.registers[APDS9960_REG_GCONF2] & 0b111]
+        cycle = (wait_ms + _GESTURE_CYCLE_MS) / 1000
+        count = max(len(frames), int(duration / cycle))
+        start = board.clock.now()
+        for i in range(count):
+            position = i * (len(frames) - 1) / max(1, count - 1)
+            a, b = frames[int(position)], frames[min(len(frames) - 1, int(position) + 1)]
+            fraction = position - int(position)
+            dataset = tuple(int(x + (y - x) * fraction) for x, y in zip(a, b))
+            board.clock.at(start + (i + 1) * cycle, lambda dataset=dataset: self.push_gesture_dataset(dataset))
+
+    def push_gesture_dataset(self, dataset):
+        if len(self.gesture_fifo) >= _GESTURE_FIFO_DEPTH:
+            self.registers[APDS9960_REG_GSTATUS] |= APDS9960_BIT_GFOV
+            return
+        self.gesture_fifo.append(dataset)
+        self._drive_int()
+
+    def _evaluate_interrupt(self):
+        enable = self.registers[APDS9960_REG_ENABLE]
+        if enable & APDS9960_BIT_PIEN and enable & APDS9960_BIT_PEN:
+            low = self.registers[APDS9960_REG_PILT]
+            high = self.registers[APDS9960_REG_PIHT]
+            reading = self.reading()
+            if reading < low or reading > high:
+                self.registers[APDS9960_REG_STATUS] |= APDS9960_BIT_PINT
+        self._drive_int()
+
+    def _drive_int(self):
+        if self.int_pin is None:
+            return
+        asserted = self.registers[APDS9960_REG_STATUS] & APDS9960_BIT_PINT or (self.gesture_fifo and self.registers[APDS9960_REG_GCONF4] & 0b10)
+        board.set_pin(self.int_pin, 0 if asserted else 1)
+
+    def read_register(self, register):
+        if register == APDS9960_REG_PDATA:
+            self.proximity_reads += 1
+            return self.reading()
+        if register == APDS9960_REG_STATUS:
+            status = self.registers[register]
+            if self.registers[APDS9960_REG_ENABLE] & APDS9960_BIT_PEN:
+                status |= APDS9960_BIT_PVALID
+            return status
+        if register == APDS9960_REG_GFLVL:
+            return len(self.gesture_fifo)
+        if register == APDS9960_REG_GSTATUS:
+            return self.registers[register] | (APDS9960_BIT_GVALID if self.gesture_fifo else 0)
+        return self.registers[register]
+
+    def read_block(self, register, count):
+        if register == APDS9960_REG_GFIFO_U:
+            # FIFO bursts walk U, D, L, R per dataset and pop what was read
+            datasets = self.gesture_fifo[:count // 4]
+            self.pop_gesture_datasets(len(datasets))
+            data = bytearray(count)
+            for i, dataset in enumerate(datasets):
+                data[i * 4:i * 4 + 4] = bytes(dataset)
+            return bytes(data)
+        return bytes(self.read_register(register + i) for i in range(count))
+
+    def write_register(self, register, value):
+        if register in (APDS9960_REG_PICLEAR, APDS9960_REG_AICLEAR):
+            self.registers[APDS9960_REG_STATUS] &= ~APDS9960_BIT_PINT & 0xff
+            self._evaluate_interrupt()
+            return
+        self.registers[register] = value
+        if register in (APDS9960_REG_ENABLE, APDS9960_REG_PILT, APDS9960_REG_PIHT, APDS9960_REG_CONTROL, APDS9960_REG_PPULSE):
+            self._evaluate_interrupt()
+
+    def pop_gesture_datasets(self, count):
+        del self.gesture_fifo[:count]
+        if not self.gesture_fifo:
+            self.registers[APDS9960_REG_GSTATUS] &= ~APDS9960_BIT_GFOV & 0xff
+        self._drive_int()
+
+_GESTURE_FIFO_DEPTH = 32
+_GESTURE_WAIT_MS = (0, 2.8, 5.6, 8.4, 14, 22.4, 30.8, 39.2)  # GWTIME settings of GCONF2
+_GESTURE_CYCLE_MS = 1.4  # Pulses and conversion of one dataset
+
+# Key frames of the raw FIFO datasets (up, down, left, right) that make up a swipe in each direction
+_GESTURE_DATASETS = {
+    APDS9960_DIR_LEFT: [(60, 60, 20, 120), (80, 80, 60, 90), (60, 60, 120, 20)],
+    APDS9960_DIR_RIGHT: [(60, 60, 120, 20), (80, 80, 90, 60), (60, 60, 20, 120)],
+    APDS9960_DIR_UP: [(20, 120, 60, 60), (60, 90, 80, 80), (120, 20, 60, 60)],
+    APDS9960_DIR_DOWN: [(120, 20, 60, 60), (90, 60, 80, 80), (20, 120, 60, 60)],
+    APDS9960_DIR_NEAR: [(40, 40, 40, 40), (120, 120, 120, 120), (220, 220, 220, 220)],
+    APDS9960_DIR_FAR: [(220, 220, 220, 220), (120, 120, 120, 120), (40, 40, 40, 40)],
+}
+
+class uAPDS9960:
+    def __init__(self, bus, address=APDS9960_I2C_ADDR, valid_id=APDS9960_DEV_ID):
+        self.bus = bus
+        self.address = address
+        self.device = board.apds(address)
+        if self._read_byte_data(APDS9960_REG_ID) not in valid_id:
+            raise OSError("Device not found")
+
+    def _read_byte_data(self, register):
+        return self.bus.readfrom_mem(self.address, register, 1)[0]
+
+    def _write_byte_data(self, register, value):
+        self.bus.writeto_mem(self.address, register, bytes([value & 0xff]))
+
+    def _read_i2c_block_data(self, register, count):
+        return self.bus.readfrom_mem(self.address, register, count)
+
+    def _set_enable_bits(self, mask, enabled):
+        value = self._read_byte_data(APDS9960_REG_ENABLE)
+        value = value | mask if enabled else value & ~mask
+        self._write_byte_data(APDS9960_REG_ENABLE, value)
+
+    def enablePower(self):
+        self._set_enable_bits(APDS9960_BIT_PON, True)
+
+    def disablePower(self):
+        self._set_enable_bits(APDS9960_BIT_PON, False)
+
+    def enableProximitySensor(self, interrupts=False):
+        self._set_enable_bits(APDS9960_BIT_PIEN, interrupts)
+        self._set_enable_bits(APDS9960_BIT_PON | APDS9960_BIT_PEN, True)
+
+    def disableProximitySensor(self):
+        self._set_enable_bits(APDS9960_BIT_PEN | APDS9960_BIT_PIEN, False)
+
+    def readProximity(self):
+        return self._read_byte_data(APDS9960_REG_PDATA)
+
+    def setProximityIntLowThreshold(self, threshold):
+        self._write_byte_data(APDS9960_REG_PILT, threshold)
+
+    def setProximityIntHighThreshold(self, threshold):
+        self._write_byte_data(APDS9960_REG_PIHT, threshold)
+
+    def getProximityIntEnable(self):
+        return (self._read_byte_data(APDS9960_REG_ENABLE) & APDS9960_BIT_PIEN) != 0
+
+    def setProximityIntEnable(self, enable):
+        self._set_enable_bits(APDS9960_BIT_PIEN, enable)
+
+    def clearProximityInt(self):
+        self._write_byte_data(APDS9960_REG_PICLEAR, 0)
+
+    def setLEDDrive(self, drive):
+        value = self._read_byte_data(APDS9960_REG_CONTROL)
+        self._write_byte_data(APDS9960_REG_CONTROL, (value & 0b00111111) | (drive & 0b11) << 6)
+
+    def getLEDDrive(self):
+        return self._read_byte_data(APDS9960_REG_CONTROL) >> 6
+
+    def setProximityGain(self, gain):
+        value = self._read_byte_data(APDS9960_REG_CONTROL)
+        self._write_byte_data(APDS9960_REG_CONTROL, (value & 0b11110011) | (gain & 0b11) << 2)
+
+    def enableGestureSensor(self, interrupts=True):
+        self._write_byte_data(APDS9960_REG_GCONF4, 0b01 | (0b10 if interrupts else 0))
+        self._set_enable_bits(APDS9960_BIT_PON | APDS9960_BIT_PEN | APDS9960_BIT_GEN, True)
+
+    def setGestureWaitTime(self, time):
+        value = self._read_byte_data(APDS9960_REG_GCONF2)
+        self._write_byte_data(APDS9960_REG_GCONF2, (value & 0b11111000) | (time & 0b111))
+
+    def disableGestureSensor(self):
+        self._write_byte_data(APDS9960_REG_GCONF4, 0)
+        self._set_enable_bits(APDS9960_BIT_GEN, False)
+
+    def isGestureAvailable(self):
+        return (self._read_byte_data(APDS9960_REG_GSTATUS) & APDS9960_BIT_GVALID) != 0
+
+    def readGesture(self):
+        if not self.device.gestures:
+            return APDS9960_DIR_NONE
+        self.device.gesture_fifo = []
+        return self.device.gestures.pop(0)
@@ -0,0 +1,63 @@
+"""
+Register and constant names of the APDS-9960 library (liske/python-apds9960) used by the firmware.
+"""
+APDS9960_I2C_ADDR = 0x39
+APDS9960_DEV_ID = [0xab, 0x9c, 0xa8]
+
+APDS9960_REG_ENABLE = 0x80
+APDS9960_REG_PILT = 0x89
+APDS9960_REG_PIHT = 0x8b
+APDS9960_REG_PERS = 0x8c
+APDS9960_REG_PPULSE = 0x8e
+APDS9960_REG_CONTROL = 0x8f
+APDS9960_REG_CONFIG2 = 0x90
+APDS9960_REG_ID = 0x92
+APDS9960_REG_STATUS = 0x93
+APDS9960_REG_PDATA = 0x9c
+APDS9960_REG_GCONF2 = 0xa3
+APDS9960_REG_GCONF4 = 0xab
+APDS9960_REG_GFLVL = 0xae
+APDS9960_REG_GSTATUS = 0xaf
+APDS9960_REG_PICLEAR = 0xe5
+APDS9960_REG_AICLEAR = 0xe7
+APDS9960_REG_GFIFO_U = 0xfc
+APDS9960_REG_GFIFO_D = 0xfd
+APDS9960_REG_GFIFO_L = 0xfe
+APDS9960_REG_GFIFO_R = 0xff
+
+APDS9960_BIT_PON = 0b00000001
+APDS9960_BIT_PEN = 0b00000100
+APDS9960_BIT_PIEN = 0b00100000
+APDS9960_BIT_GEN = 0b01000000
+APDS9960_BIT_PVALID = 0b00000010
+APDS9960_BIT_PINT = 0b00100000
+APDS9960_BIT_GVALID = 0b00000001
+APDS9960_BIT_GFOV = 0b00000010
+
+APDS9960_DIR_NONE = 0
+APDS9960_DIR_LEFT = 1
+APDS9960_DIR_RIGHT = 2
+APDS9960_DIR_UP = 3
+APDS9960_DIR_DOWN = 4
+APDS9960_DIR_NEAR = 5
+APDS9960_DIR_FAR = 6
+APDS9960_DIR_ALL = 7
+
+APDS9960_LED_DRIVE_100MA = 0
+APDS9960_LED_DRIVE_50MA = 1
+APDS9960_LED_DRIVE_25MA = 2
+APDS9960_LED_DRIVE_12_5MA = 3
+
+APDS9960_PGAIN_1X = 0
+APDS9960_PGAIN_2X = 1
+APDS9960_PGAIN_4X = 2
+APDS9960_PGAIN_8X = 3
+
+APDS9960_MODE_POWER = 0
+APDS9960_MODE_AMBIENT_LIGHT = 1
+APDS9960_MODE_PROXIMITY = 2
+APDS9960_MODE_WAIT = 3
+APDS9960_MODE_AMBIENT_LIGHT_INT = 4
+APDS9960_MODE_PROXIMITY_INT = 5
+APDS9960_MODE_GESTURE = 6
+APDS9960_MODE_ALL = 7
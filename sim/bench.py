@@ -0,0 +1,564 @@
+"""
+Reaction-latency and loop-timing benchmarks for the useless-box controllers.
+
+    python sim/bench.py --controller sync --output bench-sync.json
+    python sim/bench.py --compare before.json after.json
+
+Every scenario runs on the simulated board with a fixed seed, so two runs of the same
+firmware produce the same JSON (apart from the host CPU timings in update_us) and a
+diff between commits shows only real changes.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import tempfile
+import time
+
+import run
+import scenarios
+from simulator import board, SimulationEnd
+
+# Raw APDS-9960 readings inside each ProximityState band of ProximitySensor
+HOVER_VALUES = {
+    "NO_DETECTION": 0,
+    "FAR": 60,
+    "CLOSE": 130,
+    "VERY_CLOSE": 220,
+}
+
+START_SECS = 2  # Leaves time for the arms to home after power-up
+OUTAGE_SECS = 60  # How long the access point is down at power-up in the wifi scenario
+
+def percentiles(values):
+    """
+    Nearest-rank p50/p95/p99, plus min, max and mean.
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+
+    def rank(p):
+        return ordered[min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered) + 0.5)) - 1))]
+
+    return {
+        "count": len(ordered),
+        "min": round(ordered[0], 3),
+        "p50": round(rank(50), 3),
+        "p95": round(rank(95), 3),
+        "p99": round(rank(99), 3),
+        "max": round(ordered[-1], 3),
+        "mean": round(sum(ordered) / len(ordered), 3),
+    }
+
+class Probe:
+    def __init__(self, controller):
+        """
+        Records the start time and host CPU cost of every controller pass, when the
+        switch arm reaches the toggle switch and when the lid closes.
+        """
+        self.controller = controller
+        self.pass_starts = []  # Virtual time (us) each pass started
+        self.pass_costs = []  # Host CPU time (us) of each pass
+        self.extended = []  # Virtual time (us) the switch arm reached the toggle switch
+        self.closed = []  # Virtual time (us) the lid closed
+        self.calls = {}
+
+        name = "drain" if hasattr(controller, "drain") else "update"
+        self._wrap_pass(name)
+
+        self.at_extended = False
+        self.is_closed = True
+        board.pwm_listeners.append(self._on_pwm_write)
+
+    def _wrap_pass(self, name):
+        original = getattr(self.controller, name)
+
+        def timed(*args, **kwargs):
+            self.pass_starts.append(board.clock.now_us)
+            started = time.perf_counter()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                self.pass_costs.append((time.perf_counter() - started) * 1000000)
+
+        setattr(self.controller, name, timed)
+
+    def count(self, key, *names):
+        """
+        Counts calls to any of the named controller methods under one key.
+        """
+        self.calls[key] = 0
+        for name in names:
+            if hasattr(self.controller, name):
+                setattr(self.controller, name, self._counted(key, getattr(self.controller, name)))
+
+    def count_behavior(self, key, behavior):
+        """
+        Counts runs of one of the compiled behavior programs.
+        """
+        self.calls[key] = 0
+        original = self.controller.play
+
+        def counted(name):
+            if name == behavior:
+                self.calls[key] += 1
+            return original(name)
+
+        self.controller.play = counted
+
+    def _counted(self, key, original):
+        def counted(*args, **kwargs):
+            self.calls[key] += 1
+            return original(*args, **kwargs)
+
+        return counted
+
+    def _on_pwm_write(self, pwm):
+        if pwm.pin_id == run.LID_PIN:
+            # The arms are only created on first use, so the lid angle is looked up on the write
+            is_closed = pwm.angle() >= self.controller.box.components.get("lid_arm").close_angle - 1
+            if is_closed and not self.is_closed:
+                self.closed.append(board.clock.now_us)
+            self.is_closed = is_closed
+            return
+        if pwm.pin_id != run.SWITCH_PIN:
+            return
+        # Pushes stop where the switch flips, so the full extended angle is not always reached
+        at_extended = pwm.angle() >= board.toggle.flip_angle
+        if at_extended and not self.at_extended:
+            self.extended.append(board.clock.now_us)
+        self.at_extended = at_extended
+
+    def periods_ms(self):
+        return [(b - a) / 1000 for a, b in zip(self.pass_starts, self.pass_starts[1:])]
+
+OPTIONS = {}  # Passed on to run.create_controller
+
+def start(kind, seed):
+    random.seed(seed)
+    with contextlib.redirect_stdout(io.StringIO()):
+        controller = run.create_controller(kind, **OPTIONS)
+    return controller, Probe(controller)
+
+def finish(controller, seconds):
+    board.clock.run_until(seconds)
+    with contextlib.redirect_stdout(io.StringIO()):
+        try:
+            controller.run()
+        except SimulationEnd:
+            pass
+
+def first_after(times, t):
+    for value in times:
+        if value >= t:
+            return value
+    return None
+
+def summary(probe, blocked_us, seconds):
+    periods = probe.periods_ms()
+    return {
+        "loop_period_ms": percentiles(periods),
+        "loop_jitter_ms": round(_stddev(periods), 3) if periods else None,
+        "update_us": percentiles(probe.pass_costs),
+        "duty_writes": {
+            "switch_arm": _writes(run.SWITCH_PIN),
+            "lid_arm": _writes(run.LID_PIN),
+        },
+        "blocked_ms": round(blocked_us / 1000, 1),
+        "lightsleep_ms": round(board.lightsleep_us / 1000, 1),
+        "servo_powered_ms": {
+            "switch_arm": _powered_ms(run.SWITCH_PIN),
+            "lid_arm": _powered_ms(run.LID_PIN),
+        },
+        "power": probe.controller.power_manager.stats() if probe.controller.power_manager else None,
+        "stages": _stages(probe.controller),
+        "sensing": probe.controller.sampler.stats() if getattr(probe.controller, "sampler", None) else None,
+        "collisions": len(board.toggle.collisions),
+        "virtual_secs": seconds,
+        "i2c": _i2c(probe.controller),
+    }
+
+def _stages(controller):
+    """
+    Returns the count, mean and maximum of every stage the profiler timed, or None without one.
+    """
+    profiler = getattr(controller, "profiler", None)
+    if profiler is None:
+        return None
+    return {name: {key: stats[key] for key in ("count", "mean_us", "max_us")} for name, stats in profiler.stats().items()}
+
+def _i2c(controller):
+    """
+    The proximity sensor's own bus statistics over the whole run.
+    """
+    components = controller.box.components
+    if not components.is_created("proximity_sensor"):
+        return None
+    stats = components.get("proximity_sensor").stats()
+    return {key: round(value, 3) for key, value in stats.items()}
+
+def _writes(pin_id):
+    pwm = board.pwm(pin_id)
+    return sum(1 for _, duty in pwm.writes if duty is not None) if pwm else 0
+
+def _powered_ms(pin_id):
+    """
+    How long the servo got pulses: from each duty write until the channel was deinitialized.
+    """
+    pwm = board.pwm(pin_id)
+    if pwm is None:
+        return 0
+    powered_us, since = 0, None
+    for time_us, duty in pwm.writes:
+        if duty is None:
+            if since is not None:
+                powered_us += time_us - since
+            since = None
+        elif since is None:
+            since = time_us
+    if since is not None:
+        powered_us += board.clock.now_us - since
+    return round(powered_us / 1000)
+
+def _stddev(values):
+    mean = sum(values) / len(values)
+    return (sum((v - mean) ** 2 for v in values) / len(values)) ** 0.5
+
+def bench_single_flip(kind, seed, trials):
+    """
+    One flip per run: time from flipping the switch on until the arm reaches it, until the switch
+    is off and until the lid has closed again.
+    """
+    reaction, switch_off, cycle = [], [], []
+    probes, blocked = [], 0
+    for trial in range(trials):
+        controller, probe = start(kind, seed + trial)
+        board.toggle.flip_on_at(START_SECS)
+        finish(controller, START_SECS + 15)
+
+        flipped = board.toggle.flipped_on[0]
+        extended = first_after(probe.extended, flipped)
+        turned_off = first_after(board.toggle.flipped_off, flipped)
+        if extended is not None:
+            reaction.append((extended - flipped) / 1000)
+        if turned_off is not None:
+            switch_off.append((turned_off - flipped) / 1000)
+        closed = first_after(probe.closed, flipped)
+        if closed is not None:
+            cycle.append((closed - flipped) / 1000)
+        probes.append(probe)
+        blocked += board.clock.blocked_us
+
+    result = summary(probes[-1], blocked / trials, START_SECS + 15)
+    result.update({
+        "trials": trials,
+        "reaction_ms": percentiles(reaction),
+        "switch_off_ms": percentiles(switch_off),
+        "cycle_ms": percentiles(cycle),
+        "missed": trials - len(switch_off),
+        # Timing stats over every trial rather than the last one only
+        "loop_period_ms": percentiles([p for probe in probes for p in probe.periods_ms()]),
+        "update_us": percentiles([c for probe in probes for c in probe.pass_costs]),
+    })
+    return result
+
+def bench_rapid_flips(kind, seed, flips):
+    """
+    The user flips the switch back on as soon as the lid has closed after every switch-off,
+    which triggers panic mode when three switch-offs start within three seconds.
+    """
+    controller, probe = start(kind, seed)
+    if hasattr(controller, "play"):
+        probe.count_behavior("panics", "panic")
+    else:
+        probe.count("panics", "_handle_panic_mode")
+    toggle = board.toggle
+    toggle.flip_on_at(START_SECS)
+    handled = [0]  # Switch-offs a new flip has been scheduled for
+
+    def flip_again(pwm):
+        if pwm.pin_id != run.LID_PIN:
+            return
+        closed_angle = controller.box.components.get("lid_arm").close_angle - 1
+        if pwm.angle() >= closed_angle and len(toggle.flipped_off) > handled[0] and len(toggle.flipped_on) < flips:
+            handled[0] = len(toggle.flipped_off)
+            board.clock.at_us(board.clock.now_us + 100000, toggle.flip_on)
+
+    board.pwm_listeners.append(flip_again)
+    seconds = START_SECS + 20 * flips
+    finish(controller, seconds)
+
+    latencies = []
+    for flipped in toggle.flipped_on:
+        turned_off = first_after(toggle.flipped_off, flipped)
+        if turned_off is not None:
+            latencies.append((turned_off - flipped) / 1000)
+
+    result = summary(probe, board.clock.blocked_us, seconds)
+    result.update({
+        "flips": len(toggle.flipped_on),
+        "switch_off_ms": percentiles(latencies),
+        "panics": probe.calls["panics"],
+    })
+    return result
+
+def bench_boot(kind, seed):
+    """
+    The switch is on at power-up, and again after a soft reset: time spent constructing the
+    controller, and from the start of construction until the switch arm is extended.
+    """
+    result = {}
+    for mode in ("cold", "warm"):
+        random.seed(seed)
+        booted = board.clock.now_us
+        if mode == "warm":
+            board.toggle.flip_on()
+        with contextlib.redirect_stdout(io.StringIO()):
+            controller = run.create_controller(kind, soft_reset=mode == "warm", **OPTIONS)
+        if mode == "cold":
+            booted = 0
+            board.toggle.flip_on()
+        probe = Probe(controller)
+        constructed = board.clock.now_us
+        finish(controller, booted / 1000000 + 15)
+
+        extended = first_after(probe.extended, booted)
+        result[mode] = {
+            "init_ms": round((constructed - booted) / 1000, 3),
+            "ready_ms": round((extended - booted) / 1000, 3) if extended is not None else None,
+        }
+    return result
+
+def bench_wifi(kind, seed):
+    """
+    The switch is on at power-up while the WiFi manager connects in the background: with nothing
+    cached, with the connection cached by the first boot, and with the access point down for
+    OUTAGE_SECS. Then the access point drops for 10 s while connected.
+    """
+    result = {}
+    with tempfile.TemporaryDirectory() as directory:
+        options = dict(OPTIONS, wifi_cache=os.path.join(directory, "wifi.bin"))
+        for case, up in (("first_boot", True), ("cached_boot", True), ("outage_boot", False)):
+            random.seed(seed)
+            with contextlib.redirect_stdout(io.StringIO()):
+                controller = run.create_controller(kind, **dict(options, wifi="up" if up else "down"))
+            board.toggle.flip_on()
+            probe = Probe(controller)
+            if not up:
+                board.access_point.set_up_at(OUTAGE_SECS, True)
+            finish(controller, OUTAGE_SECS + 60)
+            extended = first_after(probe.extended, 0)
+            stats = run.wifi_manager.stats()
+            result[case] = {
+                "ready_ms": round(extended / 1000, 3) if extended is not None else None,
+                "connect_ms": stats["first_connect_ms"] - (0 if up else OUTAGE_SECS * 1000) if stats["first_connect_ms"] is not None else None,
+                "failures": stats["failures"],
+            }
+
+        random.seed(seed)
+        with contextlib.redirect_stdout(io.StringIO()):
+            controller = run.create_controller(kind, **dict(options, wifi="up"))
+        board.access_point.set_up_at(START_SECS + 10, False)
+        board.access_point.set_up_at(START_SECS + 20, True)
+        finish(controller, START_SECS + 60)
+        stats = run.wifi_manager.stats()
+        result["drop"] = {
+            "reconnect_ms": stats["connect_ms"],
+            "failures": stats["failures"],
+            "fast_connections": stats["fast_connections"],
+        }
+    return result
+
+def bench_hover(kind, seed, state, seconds):
+    """
+    A hand hovers at one proximity for a while, then leaves.
+    """
+    controller, probe = start(kind, seed)
+    board.apds().script([(START_SECS, HOVER_VALUES[state]), (START_SECS + seconds, 0)])
+    total = START_SECS + seconds + 10
+    finish(controller, total)
+    return summary(probe, board.clock.blocked_us, total)
+
+def bench_noisy_hover(kind, seed, seconds, level=100, noise=6, sample_ms=10):
+    """
+    A hand hovers right at the CLOSE threshold and the reading jitters around it, as a real
+    sensor does, then the hand leaves. Every state change the controller sees can start a behavior.
+    """
+    controller, probe = start(kind, seed)
+    rng = random.Random(seed)
+    steps = int(seconds * 1000 / sample_ms)
+    board.apds().script([(START_SECS + i * sample_ms / 1000, round(rng.gauss(level, noise))) for i in range(steps)]
+                        + [(START_SECS + seconds, 0)])
+    total = START_SECS + seconds + 10
+    finish(controller, total)
+    return summary(probe, board.clock.blocked_us, total)
+
+def bench_reach(kind, seed, trials, flip):
+    """
+    Hands reach for the switch (see scenarios.reach): with flip, time from the flip until the arm is
+    extended and until the switch is off; without, how often the box staged for a flip that never came.
+    """
+    reaction, switch_off = [], []
+    stagings = 0
+    probes, blocked = [], 0
+    for trial in range(trials):
+        controller, probe = start(kind, seed + trial)
+        probe.count("stagings", "_handle_stage", "_stage_async")
+        flipped, _ = scenarios.reach(board, START_SECS, random.Random(seed + trial), flip=flip)
+        finish(controller, START_SECS + 15)
+
+        if flipped is not None:
+            flipped = board.toggle.flipped_on[0]
+            extended = first_after(probe.extended, flipped)
+            turned_off = first_after(board.toggle.flipped_off, flipped)
+            if extended is not None:
+                reaction.append((extended - flipped) / 1000)
+            if turned_off is not None:
+                switch_off.append((turned_off - flipped) / 1000)
+        stagings += probe.calls["stagings"]
+        probes.append(probe)
+        blocked += board.clock.blocked_us
+
+    result = summary(probes[-1], blocked / trials, START_SECS + 15)
+    result.update({"trials": trials, "stagings": stagings})
+    if flip:
+        result.update({
+            "reaction_ms": percentiles(reaction),
+            "switch_off_ms": percentiles(switch_off),
+            "missed": trials - len(switch_off),
+        })
+    return result
+
+GESTURES = (1, 2, 3, 4, 5, 6)  # APDS9960_DIR_LEFT to APDS9960_DIR_FAR
+
+def bench_gestures(kind, seed, count=24, interval=4):
+    """
+    A hand in range makes a gesture every few seconds, cycling through the directions: how many
+    come out of the pipeline, decoded correctly, and how long after the movement ended.
+    """
+    options = dict(OPTIONS, gestures=True)
+    random.seed(seed)
+    with contextlib.redirect_stdout(io.StringIO()):
+        controller = run.create_controller(kind, **options)
+    probe = Probe(controller)
+    decoded = []
+    get_gesture = controller.box.get_gesture
+
+    def recorded(proximity):
+        gesture = get_gesture(proximity)
+        if gesture:
+            decoded.append((board.clock.now_us, gesture))
+        return gesture
+
+    controller.box.get_gesture = recorded
+    apds = board.apds()
+    apds.script([(START_SECS - 1, HOVER_VALUES["FAR"])])
+    sent = []
+    for i in range(count):
+        at = START_SECS + i * interval
+        sent.append((int((at + 0.2) * 1000000), GESTURES[i % len(GESTURES)]))
+        board.clock.at(at, lambda direction=sent[-1][1]: apds.push_gesture(direction, 0.2))
+    total = START_SECS + count * interval + 5
+    finish(controller, total)
+
+    correct, latency = 0, []
+    for ended, direction in sent:
+        match = first_after([t for t, _ in decoded], ended)
+        if match is not None and match - ended < interval * 1000000:
+            latency.append((match - ended) / 1000)
+            correct += dict(decoded)[match] == direction
+    result = summary(probe, board.clock.blocked_us, total)
+    pipeline = controller.box.components.get("gesture_sensor")
+    result.update({
+        "sent": count,
+        "decoded": len(decoded),
+        "correct": correct,
+        "overflows": pipeline.overflows,
+        "decode_latency_ms": percentiles(latency),
+    })
+    return result
+
+def benchmark(kind, seed, trials):
+    scenarios = {
+        "single_flip": bench_single_flip(kind, seed, trials),
+        "rapid_flips": bench_rapid_flips(kind, seed, 10),
+        "boot": bench_boot(kind, seed),
+        "reach_flip": bench_reach(kind, seed, trials, flip=True),
+        "reach_tease": bench_reach(kind, seed, trials, flip=False),
+    }
+    if OPTIONS.get("sensing_ms") is None:
+        # Gestures read the sensor bus from the controller, which the sensing thread does not share
+        scenarios["gestures"] = bench_gestures(kind, seed)
+    if OPTIONS.get("wifi") is not None:
+        scenarios["wifi"] = bench_wifi(kind, seed)
+    for state in HOVER_VALUES:
+        scenarios["hover_" + state] = bench_hover(kind, seed, state, 30)
+    scenarios["hover_noisy"] = bench_noisy_hover(kind, seed, 30)
+    return {"controller": kind, "seed": seed, "scenarios": scenarios}
+
+def _flatten(value, prefix=""):
+    if isinstance(value, dict):
+        for key, item in value.items():
+            yield from _flatten(item, prefix + "." + key if prefix else key)
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        yield prefix, value
+
+def compare(before, after):
+    """
+    Prints every metric that changed between two benchmark results.
+    """
+    old = dict(_flatten(before["scenarios"]))
+    new = dict(_flatten(after["scenarios"]))
+    for key in sorted(set(old) | set(new)):
+        a, b = old.get(key), new.get(key)
+        if a == b or key.endswith("update_us.count"):
+            continue
+        if a is None or b is None:
+            print(f"{key}: {a} -> {b}")
+        elif a == 0:
+            print(f"{key}: {a} -> {b}")
+        else:
+            print(f"{key}: {a} -> {b} ({(b - a) / abs(a) * 100:+.1f}%)")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--controller", choices=("sync", "async", "event"), default="sync")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--trials", type=int, default=50, help="runs of the single-flip scenario")
+    parser.add_argument("--hardware-timer", action="store_true", help="play asynchronous movements from a machine.Timer")
+    parser.add_argument("--hardware-i2c", action="store_true", help="use the I2C peripheral instead of SoftI2C")
+    parser.add_argument("--no-proximity-int", action="store_true", help="do not wire the APDS-9960 INT line")
+    parser.add_argument("--proximity-filter", choices=run.FILTERS, help="smooth the proximity readings before classifying them")
+    parser.add_argument("--predict", type=float, metavar="AGGRESSIVENESS", help="stage the arms for predicted flips (0 to 1)")
+    parser.add_argument("--profile", help="load a calibration profile, see run.py --calibrate")
+    parser.add_argument("--power-save", action="store_true", help="light-sleep while the box is idle (sync controller)")
+    parser.add_argument("--profiler", action="store_true", help="time the stages of every pass (sync controller)")
+    parser.add_argument("--sensing-thread", type=int, metavar="MS", help="sample the sensors on a thread at this period (sync controller)")
+    parser.add_argument("--wifi", choices=("up", "down"), help="connect to a simulated access point in the background in every scenario, and add the wifi scenario")
+    parser.add_argument("--output", help="write the JSON result to this file instead of stdout")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"), help="compare two JSON results")
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as before, open(args.compare[1]) as after:
+            compare(json.load(before), json.load(after))
+        return
+
+    OPTIONS.update(hardware_timer=args.hardware_timer, hardware_i2c=args.hardware_i2c, proximity_int=not args.no_proximity_int,
+                   proximity_filter=args.proximity_filter, predict=args.predict, profile=args.profile,
+                   power_save=args.power_save, profiler=args.profiler,
+                   sensing_ms=args.sensing_thread, wifi=args.wifi)
+    result = benchmark(args.controller, args.seed, args.trials)
+    result["options"] = OPTIONS
+    text = json.dumps(result, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w") as output:
+            output.write(text + "\n")
+    else:
+        print(text)
+
+if __name__ == "__main__":
+    main()
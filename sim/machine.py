@@ -0,0 +1,285 @@
+"""
+Simulated subset of MicroPython's machine module, backed by simulator.board.
+"""
+from simulator import board
+
+SLEEP = 2
+DEEPSLEEP = 4
+
+class VirtualPin:
+    def __init__(self, pin_id):
+        self.pin_id = pin_id
+        self.value = 0
+        self.mode = None
+        self.pull = None
+        self.handler = None
+        self.trigger = 0
+        self.wake = None
+        self.writes = []  # (time_us, value) for every output write
+
+    def drive(self, value):
+        value = 1 if value else 0
+        previous = self.value
+        self.value = value
+        if self.handler is None or previous == value:
+            return
+        if (value and self.trigger & Pin.IRQ_RISING) or (not value and self.trigger & Pin.IRQ_FALLING):
+            self.handler(Pin(self.pin_id))
+
+class Pin:
+    IN = 1
+    OUT = 3
+    OPEN_DRAIN = 7
+    PULL_UP = 2
+    PULL_DOWN = 1
+    IRQ_RISING = 1
+    IRQ_FALLING = 2
+    WAKE_LOW = 4
+    WAKE_HIGH = 5
+
+    def __init__(self, pin_id, mode=-1, pull=-1, value=None):
+        self.id = pin_id
+        self.state = board.pin(pin_id)
+        self.init(mode, pull, value)
+
+    def init(self, mode=-1, pull=-1, value=None):
+        if mode != -1:
+            self.state.mode = mode
+        if pull != -1:
+            self.state.pull = pull
+        if value is not None:
+            self.value(value)
+
+    def value(self, value=None):
+        if value is None:
+            return self.state.value
+        self.state.value = 1 if value else 0
+        self.state.writes.append((board.clock.now_us, self.state.value))
+
+    def __call__(self, value=None):
+        return self.value(value)
+
+    def on(self):
+        self.value(1)
+
+    def off(self):
+        self.value(0)
+
+    def irq(self, handler=None, trigger=IRQ_FALLING | IRQ_RISING, wake=None, hard=False):
+        self.state.handler = handler
+        self.state.trigger = trigger
+        self.state.wake = wake
+
+class VirtualPWM:
+    MIN_PULSE_US = 508  # Pulse width of a 0 degree SG90 position (duty 26 of 1024 at 50 Hz)
+    MAX_PULSE_US = 2402  # Pulse width of a 180 degree SG90 position (duty 123 of 1024 at 50 Hz)
+
+    def __init__(self, pin_id):
+        self.pin_id = pin_id
+        self.frequency = 5000
+        self.duty_u16_value = 0
+        self.active = True
+        self.writes = []  # (time_us, duty_u16) for every duty write
+
+    def write(self, duty_u16):
+        self.duty_u16_value = duty_u16
+        self.active = True
+        self.writes.append((board.clock.now_us, duty_u16))
+        for listener in board.pwm_listeners:
+            listener(self)
+
+    def pulse_us(self):
+        return self.duty_u16_value * 1000000 / self.frequency / 65535
+
+    def angle(self):
+        """
+        The SG90 angle the current pulse width corresponds to.
+        """
+        return (self.pulse_us() - self.MIN_PULSE_US) * 180 / (self.MAX_PULSE_US - self.MIN_PULSE_US)
+
+class PWM:
+    # The LEDC divider tops out at 1023 with a 14-bit duty, which at the 80 MHz APB clock is about 4.8 Hz
+    MIN_FREQ = 80000000 / (1023 * (1 << 14))
+
+    def __init__(self, pin, freq=None, duty=None, duty_u16=None, duty_ns=None):
+        pin_id = pin.id if isinstance(pin, Pin) else pin
+        if pin_id not in board.pwms:
+            board.pwms[pin_id] = VirtualPWM(pin_id)
+        self.state = board.pwms[pin_id]
+        self.init(freq, duty, duty_u16, duty_ns)
+
+    def init(self, freq=None, duty=None, duty_u16=None, duty_ns=None):
+        self.state.active = True
+        if freq is not None:
+            self.freq(freq)
+        if duty is not None:
+            self.duty(duty)
+        if duty_u16 is not None:
+            self.duty_u16(duty_u16)
+        if duty_ns is not None:
+            self.duty_ns(duty_ns)
+
+    def freq(self, value=None):
+        if value is None:
+            return self.state.frequency
+        if value < self.MIN_FREQ:
+            raise ValueError(f"frequency {value} Hz is below the {self.MIN_FREQ:.1f} Hz the ESP32-C3 LEDC can produce")
+        self.state.frequency = value
+
+    def duty(self, value=None):
+        if value is None:
+            return self.state.duty_u16_value >> 6
+        self.state.write(min(1023, max(0, int(value))) << 6)
+
+    def duty_u16(self, value=None):
+        if value is None:
+            return self.state.duty_u16_value
+        self.state.write(min(65535, max(0, int(value))))
+
+    def duty_ns(self, value=None):
+        period_ns = 1000000000 // self.state.frequency
+        if value is None:
+            return self.state.duty_u16_value * period_ns // 65535
+        self.state.write(min(65535, int(value) * 65535 // period_ns))
+
+    def deinit(self):
+        self.state.active = False
+        self.state.writes.append((board.clock.now_us, None))
+
+class SoftI2C:
+    MAX_FREQ = 150000  # Assumed top bit rate of the bit-banged bus on a 160 MHz ESP32-C3
+
+    def __init__(self, scl=None, sda=None, freq=400000, timeout=50000):
+        self.frequency = freq
+        self.transactions = 0
+        self.bytes = 0
+
+    def _device(self, address):
+        if address not in board.i2c_devices:
+            raise OSError(19)  # ENODEV, as MicroPython raises for a missing device
+        self.transactions += 1
+        return board.i2c_devices[address]
+
+    def _transfer(self, count):
+        """
+        Takes the bus time of a register transaction: start, address, register, repeated start,
+        address, count data bytes and stop, 9 clocks per byte.
+        """
+        self.bytes += count + 2
+        bits = 9 * (count + 3) + 3
+        board.clock.advance_us(bits * 1000000 / min(self.frequency, self.MAX_FREQ))
+
+    def scan(self):
+        return sorted(board.i2c_devices)
+
+    def readfrom_mem(self, address, register, count, addrsize=8):
+        device = self._device(address)
+        self._transfer(count)
+        return device.read_block(register, count)
+
+    def readfrom_mem_into(self, address, register, buffer, addrsize=8):
+        data = self.readfrom_mem(address, register, len(buffer))
+        buffer[:] = data
+
+    def writeto_mem(self, address, register, buffer, addrsize=8):
+        device = self._device(address)
+        self._transfer(len(buffer))
+        for i, value in enumerate(buffer):
+            device.write_register(register + i, value)
+
+class I2C(SoftI2C):
+    MAX_FREQ = 1000000  # The ESP32-C3 I2C peripheral runs at the requested rate
+
+    def __init__(self, id=0, scl=None, sda=None, freq=400000, timeout=50000):
+        super().__init__(scl=scl, sda=sda, freq=freq, timeout=timeout)
+        self.id = id
+
+class Timer:
+    ONE_SHOT = 0
+    PERIODIC = 1
+
+    def __init__(self, id=0, **kwargs):
+        self.id = id
+        self.generation = 0
+        if kwargs:
+            self.init(**kwargs)
+
+    def init(self, mode=PERIODIC, period=-1, freq=-1, callback=None):
+        self.deinit()
+        board.timers[self.id] = self
+        period_us = int(1000000 / freq) if freq > 0 else int(period * 1000)
+        generation = self.generation
+
+        def fire():
+            if generation != self.generation:
+                return
+            if mode == Timer.PERIODIC:
+                board.clock.at_us(board.clock.now_us + period_us, fire)
+            if callback is not None:
+                callback(self)
+
+        board.clock.at_us(board.clock.now_us + period_us, fire)
+
+    def deinit(self):
+        self.generation += 1
+        board.timers.pop(self.id, None)
+
+class RTC:
+    def __init__(self, id=0):
+        pass
+
+    def memory(self, data=None):
+        if data is None:
+            return board.rtc_memory
+        board.rtc_memory = bytes(data)
+
+def _wakes(pin):
+    if pin.wake is None or not pin.wake & SLEEP:
+        return False
+    return pin.value == (1 if pin.trigger == Pin.WAKE_HIGH else 0)
+
+def lightsleep(time_ms=None):
+    """
+    Sleeps until the given time, or until a pin set up with irq(wake=SLEEP) is at its wake level.
+    Scripted stimuli keep firing while the board sleeps.
+    """
+    clock = board.clock
+    start = clock.now_us
+    pins = [pin for pin in board.pins.values() if pin.wake is not None]
+    if time_ms is None and not pins:
+        raise OSError("lightsleep without a wake source")
+    end = None if time_ms is None else start + int(time_ms * 1000)
+    try:
+        while not any(_wakes(pin) for pin in pins):
+            next_us = clock.next_event_us()
+            if end is not None and (next_us is None or next_us > end):
+                clock.advance_us(end - clock.now_us)
+                break
+            if next_us is None:
+                # Nothing left that could wake the board
+                clock.advance_us((clock.end_us or clock.now_us) + 1 - clock.now_us)
+                break
+            clock.advance_us(next_us - clock.now_us, stop_at_event=True)
+    finally:
+        board.lightsleep_us += clock.now_us - start
+
+def idle():
+    pass
+
+def freq(value=None):
+    return 160000000
+
+def unique_id():
+    return b"\x00\x00\x00\x00\x00\x01"
+
+def reset_cause():
+    return 1
+
+def soft_reset():
+    raise SystemExit()
+
+def disable_irq():
+    return 0
+
+def enable_irq(state=0):
+    pass
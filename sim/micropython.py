@@ -0,0 +1,27 @@
+"""
+Simulated subset of MicroPython's micropython module.
+"""
+
+def const(value):
+    return value
+
+def native(function):
+    return function
+
+def viper(function):
+    return function
+
+def schedule(function, argument):
+    function(argument)
+
+def alloc_emergency_exception_buf(size):
+    pass
+
+def opt_level(level=None):
+    return 0
+
+def mem_info(verbose=False):
+    print("mem: simulated")
+
+def kbd_intr(char):
+    pass
@@ -0,0 +1,145 @@
+"""
+Simulated subset of MicroPython's network module on the ESP32-C3: the station interface, and one
+access point on the board (see Board.add_access_point) that can go down and come back.
+"""
+from simulator import board
+
+STA_IF = 0
+AP_IF = 1
+
+# Station statuses of the ESP32 port
+STAT_IDLE = 1000
+STAT_CONNECTING = 1001
+STAT_GOT_IP = 1010
+STAT_BEACON_TIMEOUT = 200
+STAT_NO_AP_FOUND = 201
+STAT_WRONG_PASSWORD = 202
+STAT_ASSOC_FAIL = 203
+STAT_HANDSHAKE_TIMEOUT = 204
+
+class VirtualAccessPoint:
+    LEASE = ("192.168.1.23", "255.255.255.0", "192.168.1.1", "192.168.1.1")  # Handed out by DHCP
+
+    def __init__(self, ssid, password, bssid=b"\x02\x00\x00\x00\x00\x01", channel=6, rssi=-60, up=True):
+        self.ssid = ssid
+        self.password = password
+        self.bssid = bssid
+        self.channel = channel
+        self.rssi = rssi
+        self.up = up
+
+    def set_up(self, up):
+        """
+        Turns the access point on or off; stations connected to it lose the link.
+        """
+        self.up = up
+        if not up:
+            for wlan in board.wlans.values():
+                if wlan.status == STAT_GOT_IP:
+                    wlan.attempt += 1
+                    wlan.status = STAT_BEACON_TIMEOUT
+
+    def set_up_at(self, seconds, up):
+        board.clock.at(seconds, lambda: self.set_up(up))
+
+class VirtualWLAN:
+    # Stand-in durations of the ESP32-C3 radio, not measured
+    SCAN_US = 1700000  # Active scan of the 13 channels
+    ASSOCIATE_US = 300000  # Authentication, association and the WPA2 handshake
+    DHCP_US = 1000000
+
+    def __init__(self):
+        self.active = False
+        self.status = STAT_IDLE
+        self.channel = 1
+        self.reconnects = -1
+        self.static = None  # ifconfig tuple, or None for DHCP
+        self.address = None  # ifconfig tuple while connected
+        self.busy_until_us = 0  # The thread that called scan is blocked until then
+        self.attempt = 0  # Counts connects and disconnects, so an abandoned connect does not complete
+        self.scans = 0
+        self.connects = 0
+
+    def connect(self, ssid, key, bssid=None):
+        ap = board.access_point
+        clock = board.clock
+        self.attempt += 1
+        self.connects += 1
+        self.status = STAT_CONNECTING
+        attempt = self.attempt
+        # The driver scans for the access point first, only on its channel if that and the BSSID are known
+        known = bssid is not None and ap is not None and self.channel == ap.channel
+        at_us = max(clock.now_us, self.busy_until_us) + (self.SCAN_US // 13 if known else self.SCAN_US)
+        if ap is None or not ap.up or ssid != ap.ssid or (bssid is not None and bssid != ap.bssid):
+            status = STAT_NO_AP_FOUND
+        else:
+            at_us += self.ASSOCIATE_US
+            if key != ap.password:
+                status = STAT_WRONG_PASSWORD
+            else:
+                status = STAT_GOT_IP
+                if self.static is None:
+                    at_us += self.DHCP_US
+
+        def finish():
+            if attempt != self.attempt:
+                return
+            if status == STAT_GOT_IP and not ap.up:
+                self.status = STAT_NO_AP_FOUND
+                return
+            self.status = status
+            if status == STAT_GOT_IP:
+                self.address = self.static or VirtualAccessPoint.LEASE
+
+        clock.at_us(at_us, finish)
+
+class WLAN:
+    def __init__(self, interface_id=STA_IF):
+        if interface_id not in board.wlans:
+            board.wlans[interface_id] = VirtualWLAN()
+        self.state = board.wlans[interface_id]
+
+    def active(self, value=None):
+        if value is None:
+            return self.state.active
+        self.state.active = bool(value)
+
+    def connect(self, ssid, key=None, bssid=None):
+        if not self.state.active:
+            raise OSError("STA must be active")
+        self.state.connect(ssid, key, bssid)
+
+    def disconnect(self):
+        self.state.attempt += 1
+        self.state.status = STAT_IDLE
+        self.state.address = None
+
+    def isconnected(self):
+        return self.state.status == STAT_GOT_IP
+
+    def status(self, param=None):
+        if param == "rssi":
+            return board.access_point.rssi
+        return self.state.status
+
+    def scan(self):
+        if not self.state.active:
+            raise OSError("STA must be active")
+        state = self.state
+        state.scans += 1
+        state.busy_until_us = max(board.clock.now_us, state.busy_until_us) + VirtualWLAN.SCAN_US
+        ap = board.access_point
+        if ap is None or not ap.up:
+            return []
+        return [(ap.ssid.encode(), ap.bssid, ap.channel, ap.rssi, 3, False)]
+
+    def ifconfig(self, config=None):
+        if config is None:
+            return self.state.address if self.isconnected() else ("0.0.0.0",) * 4
+        self.state.static = None if config == "dhcp" else tuple(config)
+
+    def config(self, *args, **kwargs):
+        if args:
+            return getattr(self.state, args[0])
+        for name, value in kwargs.items():
+            setattr(self.state, name, value)
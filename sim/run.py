@@ -0,0 +1,303 @@
+"""
+Runs the useless-box controller on the simulated board.
+
+    python sim/run.py --controller event --seconds 3600 --seed 1
+
+Prints how much virtual time ran, how long that took, and what the hardware did.
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [HERE, os.path.join(HERE, "..", "src", "useless-box")]
+
+import simulator
+simulator.install()
+
+from simulator import board, SimulationEnd
+import scenarios
+
+# Pins used by boot.py
+SWITCH_PIN = 0
+LID_PIN = 2
+SDA_PIN = 6
+SCL_PIN = 7
+TOGGLE_PIN = 21
+LED_PIN = 8
+PROXIMITY_INT_PIN = 5
+
+LID_CLEAR_ANGLE = 56  # Lid angle the simulated switch arm gets through at
+
+WIFI_SSID = "useless-box"
+WIFI_PASSWORD = "12345678"
+
+wifi_manager = None  # The WiFiManager started by create_controller, if any
+
+FILTERS = ("median", "ema", "one_euro")  # Choices for the proximity filter, see make_filter
+
+def make_filter(name):
+    """
+    Builds a proximity filter from filters with its default settings, or None for no filter.
+    """
+    import filters
+    if name is None:
+        return None
+    return {"median": filters.MedianFilter, "ema": filters.EmaFilter, "one_euro": filters.OneEuroFilter}[name]()
+
+def reset():
+    """
+    Starts over with a fresh board and motion scheduler, for another run in the same process.
+    """
+    board.reset()
+    import motion
+    motion.scheduler = motion.MotionScheduler()
+    import telemetry
+    telemetry.log.clear()
+
+def calibrate(path, lid_clear_angle=LID_CLEAR_ANGLE):
+    """
+    Runs the calibration sweeps on a fresh board, with a user who flips the switch back on a
+    second after the arm turns it off, and saves the profile.
+    :param path: File to save the profile to.
+    :param lid_clear_angle: Lid angle the simulated switch arm gets through at.
+    :return: The CalibrationProfile.
+    """
+    from calibration import Calibrator
+    from useless_box import UselessBox
+
+    reset()
+    toggle = board.add_toggle(TOGGLE_PIN, SWITCH_PIN)
+    toggle.block(LID_PIN, lid_clear_angle)
+
+    def flip_back():
+        toggle.flip_on()
+        board.clock.at_us(board.clock.now_us + 1000000, flip_back)
+
+    flip_back()
+    box = UselessBox(SWITCH_PIN, LID_PIN, SDA_PIN, SCL_PIN, TOGGLE_PIN)
+    return Calibrator(box).run(path)
+
+def create_controller(kind, inactivity_timeout=5, hardware_timer=False, hardware_i2c=False, proximity_int=True, proximity_filter=None, predict=None, gestures=False, profile=None, power_save=False, profiler=False, heap=False, sensing_ms=None, wifi=None, wifi_cache=None, soft_reset=False):
+    """
+    Builds one of the controllers on the simulated board.
+    :param kind: "sync", "async" or "event".
+    :param hardware_timer: Play asynchronous movements from a machine.Timer (see motion.use_hardware_timer).
+    :param hardware_i2c: Talk to the APDS-9960 over the I2C peripheral instead of SoftI2C.
+    :param proximity_int: Give the controller the APDS-9960 INT line.
+    :param proximity_filter: Name of the proximity filter, one of FILTERS, or None.
+    :param predict: Aggressiveness of the approach predictor (0 to 1), or None to run without one.
+    :param gestures: Read APDS-9960 gestures and play behaviors for them.
+    :param profile: Calibration profile the box loads, see calibrate; None runs uncalibrated.
+    :param power_save: Light-sleep while the box is idle, see power.PowerManager (sync controller only).
+    :param profiler: Time the stages of every pass, see profiler.Profiler (sync controller only).
+    :param heap: Collect garbage between passes and report the heap, see heap.HeapManager (sync controller only).
+    :param sensing_ms: Sample the sensors at this period on a sensing thread, see sampler.SensorSampler
+        (sync controller only), or None to sample them at the start of every pass.
+    :param wifi: "up" or "down" to start a wifi.WiFiManager before the controller, as boot.py can, with
+        the access point up or down; None for no WiFi. The manager is left in wifi_manager.
+    :param wifi_cache: File the WiFiManager caches the connection in, or None for no cache.
+    :param soft_reset: Keep the board as the previous controller left it, as after a soft reset,
+        instead of powering it up from scratch.
+    """
+    global wifi_manager
+    if wifi_manager is not None:
+        wifi_manager.stop()
+        wifi_manager = None
+    if soft_reset:
+        board.soft_reset()
+        import motion
+        motion.scheduler = motion.MotionScheduler()
+    else:
+        reset()
+        board.add_toggle(TOGGLE_PIN, SWITCH_PIN).block(LID_PIN, LID_CLEAR_ANGLE)
+        board.apds().wire_interrupt(PROXIMITY_INT_PIN)
+    if hardware_timer:
+        import motion
+        motion.use_hardware_timer()
+    import calibration
+    calibration.PROFILE_PATH = profile
+    if wifi is not None:
+        if board.access_point is None:
+            board.add_access_point(WIFI_SSID, WIFI_PASSWORD, up=wifi == "up")
+        from wifi import WiFiManager
+        wifi_manager = WiFiManager(WIFI_SSID, WIFI_PASSWORD, cache_path=wifi_cache)
+        wifi_on_clock(wifi_manager)
+        wifi_manager.start()
+
+    pins = dict(switch_pin=SWITCH_PIN, lid_pin=LID_PIN, sda_pin=SDA_PIN, scl_pin=SCL_PIN,
+                toggle_pin=TOGGLE_PIN, led_pin=LED_PIN, inactivity_timeout=inactivity_timeout,
+                proximity_int_pin=PROXIMITY_INT_PIN if proximity_int else None, hardware_i2c=hardware_i2c,
+                proximity_filter=make_filter(proximity_filter), gestures=gestures)
+    if predict is not None:
+        from predictor import ApproachPredictor
+        pins["approach_predictor"] = ApproachPredictor(predict)
+    if power_save:
+        if kind != "sync":
+            raise ValueError("Power saving is only available for the sync controller")
+        from power import PowerManager
+        pins["power_manager"] = PowerManager()
+    if profiler:
+        if kind != "sync":
+            raise ValueError("Stage profiling is only available for the sync controller")
+        from profiler import Profiler
+        pins["profiler"] = Profiler()
+    if heap:
+        if kind != "sync":
+            raise ValueError("Heap management is only available for the sync controller")
+        from heap import HeapManager
+        pins["heap_manager"] = HeapManager()
+    if sensing_ms is not None:
+        if kind != "sync":
+            raise ValueError("The sensing thread is only available for the sync controller")
+        pins["sensing_period_ms"] = sensing_ms
+    if kind == "sync":
+        from controller import UselessBoxController
+        controller = UselessBoxController(**pins)
+        if controller.sampler is not None:
+            sample_on_clock(controller.sampler)
+        return controller
+    if kind == "async":
+        from async_controller import AsyncUselessBoxController
+        return AsyncUselessBoxController(**pins)
+    if kind == "event":
+        from event_controller import EventDrivenUselessBoxController
+        return EventDrivenUselessBoxController(**pins)
+    raise ValueError("Unknown controller: " + kind)
+
+def sample_on_clock(sampler):
+    """
+    Runs a SensorSampler from virtual clock events instead of a thread. Every period an event takes a
+    sample; events fire inside the controller's sleeps and bus transfers, where the board's thread
+    gets to run while the controller waits.
+    """
+    def start():
+        sampler.started_ms = board.clock.ticks_ms()
+        sampler.running = True
+        tick(board.clock.now_us)
+
+    def tick(deadline_us):
+        if sampler.running:
+            sampler.sample()
+            next_us = deadline_us + sampler.period_ms * 1000
+            board.clock.at_us(next_us, lambda: tick(next_us))
+
+    sampler.start = start
+
+def wifi_on_clock(manager):
+    """
+    Runs a WiFiManager from virtual clock events instead of a thread. A scan blocks the WiFi thread
+    only, so it delays the manager's next step and not the controller.
+    """
+    def start():
+        manager.started_ms = board.clock.ticks_ms()
+        manager.running = True
+        step()
+
+    def step():
+        if manager.running:
+            delay_ms = manager.step()
+            board.clock.at_us(max(board.clock.now_us + delay_ms * 1000, manager.wlan.state.busy_until_us), step)
+
+    manager.start = start
+
+def run(controller, seconds, verbose=False):
+    """
+    Runs the controller until the virtual clock reaches the given time.
+    :return: Wall-clock seconds the run took.
+    """
+    board.clock.run_until(seconds)
+    output = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+    started = time.perf_counter()
+    with output:
+        try:
+            controller.run()
+        except SimulationEnd:
+            pass
+    return time.perf_counter() - started
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--controller", choices=("sync", "async", "event"), default="sync")
+    parser.add_argument("--seconds", type=float, default=600, help="virtual seconds to run")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--hardware-timer", action="store_true", help="play asynchronous movements from a machine.Timer")
+    parser.add_argument("--hardware-i2c", action="store_true", help="use the I2C peripheral instead of SoftI2C")
+    parser.add_argument("--no-proximity-int", action="store_true", help="do not wire the APDS-9960 INT line")
+    parser.add_argument("--proximity-filter", choices=FILTERS, help="smooth the proximity readings before classifying them")
+    parser.add_argument("--predict", type=float, metavar="AGGRESSIVENESS", help="stage the arms for predicted flips (0 to 1)")
+    parser.add_argument("--gestures", action="store_true", help="read APDS-9960 gestures")
+    parser.add_argument("--record-trace", metavar="CSV", help="write the proximity and switch trace for scripts/score_predictor.py")
+    parser.add_argument("--calibrate", metavar="PROFILE", help="run the calibration sweeps and save the profile, instead of a controller")
+    parser.add_argument("--profile", help="load a calibration profile")
+    parser.add_argument("--power-save", action="store_true", help="light-sleep while the box is idle (sync controller)")
+    parser.add_argument("--telemetry", metavar="FILE", help="save the firmware's telemetry records, see scripts/decode_telemetry.py")
+    parser.add_argument("--telemetry-level", choices=("DEBUG", "INFO", "WARNING"), default="INFO", help="lowest level recorded")
+    parser.add_argument("--profiler", metavar="FILE", help="time the stages of every pass (sync controller) and save the counters, see scripts/profile_report.py")
+    parser.add_argument("--heap", action="store_true", help="collect garbage between passes and report the heap (sync controller)")
+    parser.add_argument("--sensing-thread", type=int, metavar="MS", help="sample the sensors on a thread at this period (sync controller)")
+    parser.add_argument("--wifi", choices=("up", "down"), help="connect to a simulated access point in the background, which is up or down")
+    parser.add_argument("--wifi-cache", metavar="FILE", help="file the WiFi connection is cached in, as on the board's flash")
+    parser.add_argument("--verbose", action="store_true", help="show the firmware's print output")
+    args = parser.parse_args()
+
+    if args.calibrate:
+        output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+        with output:
+            profile = calibrate(args.calibrate)
+        print(f"{profile} in {board.clock.now():.1f} virtual seconds")
+        return
+
+    rng = random.Random(args.seed)
+    random.seed(args.seed)  # The firmware uses the random module directly
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        controller = create_controller(args.controller, hardware_timer=args.hardware_timer,
+                                       hardware_i2c=args.hardware_i2c, proximity_int=not args.no_proximity_int,
+                                       proximity_filter=args.proximity_filter, predict=args.predict,
+                                       gestures=args.gestures, profile=args.profile, power_save=args.power_save,
+                                       profiler=args.profiler is not None, heap=args.heap,
+                                       sensing_ms=args.sensing_thread, wifi=args.wifi, wifi_cache=args.wifi_cache)
+    import telemetry
+    telemetry.log.level = getattr(telemetry, args.telemetry_level)
+    visits = scenarios.visitors(board, args.seconds, rng)
+    trace = scenarios.record(board, args.record_trace, args.seconds) if args.record_trace else None
+    wall = run(controller, args.seconds, args.verbose)
+    if trace:
+        trace.close()
+    if args.telemetry:
+        telemetry.log.save(args.telemetry)
+    if args.profiler:
+        with open(args.profiler, "w") as file, contextlib.redirect_stdout(file):
+            controller.profiler.dump()
+
+    print(f"{board.clock.now():.0f} virtual seconds in {wall * 1000:.0f} ms ({board.clock.now() / wall:.0f}x)")
+    print(f"visits: {visits}, switch flips: {len(board.toggle.flipped_on)}, turned off by arm: {len(board.toggle.flipped_off)}, "
+          f"arm collisions with the lid: {len(board.toggle.collisions)}")
+    for pin_id, pwm in sorted(board.pwms.items()):
+        print(f"{'LED' if pin_id == LED_PIN else 'servo'} on GPIO{pin_id}: {len(pwm.writes)} duty writes")
+    print(f"blocked in sleep: {board.clock.blocked_us / 1000000:.1f} s, light sleep: {board.lightsleep_us / 1000000:.1f} s")
+    if controller.power_manager is not None:
+        controller.power_manager.report()
+    if args.profiler:
+        controller.profiler.report()
+    if args.heap:
+        controller.heap_manager.report("at the end")
+    if controller.sampler is not None:
+        stats = controller.sampler.stats()
+        print(f"sensing thread: {stats['samples_per_sec']} samples per second, {stats['overruns']} overruns, "
+              f"samples {stats['age_ms_mean']} ms old on average and up to {stats['age_ms_max']} ms when taken")
+    if wifi_manager is not None:
+        stats = wifi_manager.stats()
+        print(f"WiFi {stats['state']}: first connected after {stats['first_connect_ms']} ms, {stats['connections']} connections "
+              f"({stats['fast_connections']} from the cache), {stats['failures']} failed attempts, {stats['drops']} dropped links")
+    if controller.box.components.is_created("planner"):
+        print("time saved by moving both arms at once:")
+        controller.box.planner.report()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Scripted stimuli for the simulated board.
+"""
+
+SAMPLE_SECS = 0.02  # Resolution of scripted hand movements
+
+def visitors(board, seconds, rng, start=5):
+    """
+    Scripts people walking up to the box at random intervals: the hand approaches,
+    sometimes flips the switch, hovers for a while and leaves, see reach.
+    :param board: The simulator board, with a toggle and APDS-9960 attached.
+    :param seconds: Length of the script in virtual seconds.
+    :param rng: A random.Random instance, so runs are repeatable.
+    :return: The number of visits scripted.
+    """
+    t = start
+    visits = 0
+    while True:
+        t += rng.uniform(20, 120)
+        if t + 10 > seconds:
+            return visits
+        visits += 1
+        _, t = reach(board, t, rng, flip=rng.random() < 0.5)
+
+def reach(board, t, rng, flip=True, contact=235):
+    """
+    Scripts one hand movement towards the toggle switch. The hand slows down at the end of the
+    movement, but the reading still rises fastest near the sensor, since it falls off with
+    the square of the distance.
+    :param t: Start of the movement, in seconds.
+    :param flip: The hand flips the switch at the end of the movement; otherwise it stops
+        short of the switch, as when teasing the box.
+    :param contact: Raw reading with the hand at the switch, 2 cm from the sensor.
+    :return: The time the switch is flipped, or None, and the time the hand is gone.
+    """
+    apds = board.apds()
+    duration = rng.uniform(0.5, 1.2)
+    start = 15  # cm
+    end = 2 if flip else rng.uniform(2.3, 3.3)  # A reading of 180 to 85
+    points = []
+    steps = int(duration / SAMPLE_SECS)
+    for i in range(1, steps + 1):
+        u = i / steps
+        distance = start + (end - start) * (1 - (1 - u) ** 2)
+        points.append((t + i * SAMPLE_SECS, contact * (2 / distance) ** 2 + rng.gauss(0, 3)))
+    stop = t + steps * SAMPLE_SECS
+    flipped = stop + rng.uniform(0.05, 0.2) if flip else None
+    if flipped is not None:
+        board.clock.at(flipped, board.toggle.flip_on)
+
+    leave = stop + rng.uniform(0.5, 3)
+    peak = contact * (2 / end) ** 2
+    for i in range(1, 26):
+        points.append((leave + i * SAMPLE_SECS, peak * (1 - i / 25)))
+    apds.script(points)
+    return flipped, leave + 25 * SAMPLE_SECS
+
+def record(board, path, seconds, interval=SAMPLE_SECS):
+    """
+    Writes the raw proximity reading and the switch state every interval to a CSV trace,
+    the format scripts/score_predictor.py replays.
+    :return: The open file, to close once the run is over.
+    """
+    output = open(path, "w")
+    output.write("ms,proximity,switch\n")
+
+    def sample():
+        output.write(f"{board.clock.now_us // 1000},{board.apds().proximity},{1 if board.toggle.is_on() else 0}\n")
+        if board.clock.now() + interval <= seconds:
+            board.clock.at(board.clock.now() + interval, sample)
+
+    board.clock.at(0, sample)
+    return output
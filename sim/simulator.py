@@ -0,0 +1,330 @@
+"""
+Virtual hardware and virtual time for running the useless-box firmware on CPython.
+
+Put this directory in front of src/useless-box on sys.path and call install() before
+importing any firmware module. The stand-in machine, micropython and apds9960 modules
+all talk to the shared `board`, and every sleep advances `board.clock` instead of
+waiting, so hours of controller behavior run in a fraction of a second.
+"""
+import asyncio
+import gc
+import heapq
+import math
+import selectors
+import time
+
+class SimulationEnd(Exception):
+    """
+    Raised from a sleep once the virtual clock reaches its end time.
+    """
+
+class VirtualClock:
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.now_us = 0
+        self.end_us = None
+        self.events = []  # Heap of (time_us, sequence, callback)
+        self.sequence = 0
+        self.blocked_us = 0  # Time spent inside blocking sleeps
+
+    def now(self):
+        return self.now_us / 1000000
+
+    def ticks_ms(self):
+        return self.now_us // 1000
+
+    def ticks_us(self):
+        return self.now_us
+
+    def run_until(self, seconds):
+        """
+        Makes any sleep past the given virtual time raise SimulationEnd.
+        """
+        self.end_us = int(seconds * 1000000)
+
+    def at(self, seconds, callback):
+        """
+        Schedules a callback at an absolute virtual time, in seconds.
+        """
+        self.at_us(int(seconds * 1000000), callback)
+
+    def at_us(self, time_us, callback):
+        self.sequence += 1
+        heapq.heappush(self.events, (max(time_us, self.now_us), self.sequence, callback))
+
+    def next_event_us(self):
+        return self.events[0][0] if self.events else None
+
+    def advance_us(self, delta_us, stop_at_event=False):
+        """
+        Moves the clock forward, firing scheduled callbacks on the way.
+        :param delta_us: Microseconds to advance.
+        :param stop_at_event: Stop right after the first callback instead of advancing the full delta.
+        """
+        target = self.now_us + max(0, int(delta_us))
+        while self.events and self.events[0][0] <= target:
+            time_us, _, callback = heapq.heappop(self.events)
+            self._move_to(time_us)
+            callback()
+            if stop_at_event:
+                return
+        self._move_to(target)
+
+    def _move_to(self, time_us):
+        if self.end_us is not None and time_us > self.end_us:
+            self.now_us = self.end_us
+            raise SimulationEnd()
+        self.now_us = max(self.now_us, time_us)
+
+    def sleep(self, seconds):
+        self.sleep_us(seconds * 1000000)
+
+    def sleep_ms(self, ms):
+        self.sleep_us(ms * 1000)
+
+    def sleep_us(self, us):
+        self.blocked_us += max(0, int(us))
+        self.advance_us(us)
+
+class VirtualToggle:
+    def __init__(self, board, pin_id, arm_pin_id, flip_angle=160, on_level=0):
+        """
+        The physical toggle switch: flipped on by the user, flipped off when the switch arm pushes it.
+        :param pin_id: The GPIO pin the switch is wired to.
+        :param arm_pin_id: The GPIO pin of the switch arm servo.
+        :param flip_angle: Arm angle at which the lever flips.
+        :param on_level: Pin level while the switch is on (ToggleSwitch treats a low pin as on).
+        """
+        self.board = board
+        self.pin_id = pin_id
+        self.arm_pin_id = arm_pin_id
+        self.flip_angle = flip_angle
+        self.on_level = on_level
+        self.flipped_on = []  # Times (us) the user flipped the switch on
+        self.flipped_off = []  # Times (us) the arm flipped the switch off
+        self.lid_pin_id = None  # See block
+        self.lid_clear_angle = None
+        self.outside_angle = None
+        self.collisions = []  # Times (us) the switch arm was outside the box while the lid was not clear
+        board.set_pin(pin_id, 1 - on_level)
+        board.pwm_listeners.append(self._on_pwm_write)
+
+    def is_on(self):
+        return self.board.pin(self.pin_id).value == self.on_level
+
+    def flip_on(self):
+        if not self.is_on():
+            self.flipped_on.append(self.board.clock.now_us)
+            self.board.set_pin(self.pin_id, self.on_level)
+
+    def flip_on_at(self, seconds):
+        self.board.clock.at(seconds, self.flip_on)
+
+    def block(self, lid_pin_id, clear_angle, outside_angle=100):
+        """
+        Makes the lid stop the switch arm unless it is open at least to the given angle.
+        :param lid_pin_id: The GPIO pin of the lid servo.
+        :param clear_angle: Lid servo angle the switch arm gets through at; lower angles are more open.
+        :param outside_angle: Switch arm angle from which on the arm is outside the box. Any write
+            that puts the arm there while the lid is not clear is recorded as a collision.
+        """
+        self.lid_pin_id = lid_pin_id
+        self.lid_clear_angle = clear_angle
+        self.outside_angle = outside_angle
+
+    def _lid_clear(self):
+        if self.lid_pin_id is None:
+            return True
+        lid = self.board.pwm(self.lid_pin_id)
+        return lid is not None and lid.angle() <= self.lid_clear_angle
+
+    def _arm_outside(self):
+        arm = self.board.pwm(self.arm_pin_id)
+        return arm is not None and arm.angle() >= self.outside_angle
+
+    def _on_pwm_write(self, pwm):
+        if self.lid_pin_id is not None and pwm.pin_id in (self.arm_pin_id, self.lid_pin_id):
+            if self._arm_outside() and not self._lid_clear():
+                self.collisions.append(self.board.clock.now_us)
+        if pwm.pin_id == self.arm_pin_id and self.is_on() and pwm.angle() >= self.flip_angle and self._lid_clear():
+            self.flipped_off.append(self.board.clock.now_us)
+            self.board.set_pin(self.pin_id, 1 - self.on_level)
+
+class Board:
+    def __init__(self):
+        self.clock = VirtualClock()
+        self.reset()
+
+    def reset(self):
+        """
+        Forgets all virtual hardware and rewinds the clock, for a fresh run.
+        """
+        self.clock.reset()
+        self.pins = {}
+        self.pwms = {}
+        self.i2c_devices = {}
+        self.timers = {}
+        self.lightsleep_us = 0
+        self.pwm_listeners = []  # Called with the VirtualPWM after every duty write
+        self.toggle = None
+        self.rtc_memory = b""  # RTC user memory, kept across soft_reset
+        self.access_point = None  # See add_access_point
+        self.wlans = {}  # VirtualWLAN of every network interface, kept across soft_reset
+
+    def soft_reset(self):
+        """
+        Like machine.soft_reset: stops timers and listeners but keeps the clock running, the pin levels,
+        the servo positions, the RTC memory and the WiFi connection.
+        """
+        self.timers = {}
+        self.pwm_listeners = [self.toggle._on_pwm_write] if self.toggle else []
+
+    def pin(self, pin_id):
+        from machine import VirtualPin
+        if pin_id not in self.pins:
+            self.pins[pin_id] = VirtualPin(pin_id)
+        return self.pins[pin_id]
+
+    def set_pin(self, pin_id, value):
+        """
+        Drives an input pin from outside, firing its IRQ on an edge.
+        """
+        self.pin(pin_id).drive(value)
+
+    def set_pin_at(self, seconds, pin_id, value):
+        self.clock.at(seconds, lambda: self.set_pin(pin_id, value))
+
+    def pwm(self, pin_id):
+        return self.pwms.get(pin_id)
+
+    def add_toggle(self, pin_id, arm_pin_id, flip_angle=160):
+        self.toggle = VirtualToggle(self, pin_id, arm_pin_id, flip_angle)
+        return self.toggle
+
+    def add_access_point(self, ssid, password, up=True):
+        from network import VirtualAccessPoint
+        self.access_point = VirtualAccessPoint(ssid, password, up=up)
+        return self.access_point
+
+    def apds(self, address=0x39):
+        from apds9960 import VirtualAPDS9960
+        if address not in self.i2c_devices:
+            self.i2c_devices[address] = VirtualAPDS9960()
+        return self.i2c_devices[address]
+
+board = Board()
+
+class _VirtualSelector(selectors.BaseSelector):
+    """
+    Selector that never waits on file descriptors: a timeout advances the virtual clock.
+    """
+    def __init__(self):
+        self.keys = {}
+
+    def register(self, fileobj, events, data=None):
+        fd = fileobj if isinstance(fileobj, int) else fileobj.fileno()
+        key = selectors.SelectorKey(fileobj, fd, events, data)
+        self.keys[fd] = key
+        return key
+
+    def unregister(self, fileobj):
+        fd = fileobj if isinstance(fileobj, int) else fileobj.fileno()
+        return self.keys.pop(fd)
+
+    def select(self, timeout=None):
+        clock = board.clock
+        if timeout is None:
+            if clock.next_event_us() is None:
+                # Nothing left that could wake the loop: idle through to the end of the run
+                clock.now_us = clock.end_us if clock.end_us is not None else clock.now_us
+                raise SimulationEnd()
+            clock.advance_us(clock.next_event_us() - clock.now_us, stop_at_event=True)
+        elif timeout > 0:
+            # Stop early on a scripted stimulus, so IRQ-driven wakeups get a realistic latency
+            clock.advance_us(math.ceil(timeout * 1000000), stop_at_event=True)
+        return []
+
+    def get_map(self):
+        return self.keys
+
+    def close(self):
+        self.keys = {}
+
+class VirtualEventLoop(asyncio.SelectorEventLoop):
+    def __init__(self):
+        super().__init__(_VirtualSelector())
+
+    def time(self):
+        return board.clock.now()
+
+class _VirtualEventLoopPolicy(asyncio.DefaultEventLoopPolicy):
+    def new_event_loop(self):
+        return VirtualEventLoop()
+
+class ThreadSafeFlag:
+    """
+    Stand-in for MicroPython's asyncio.ThreadSafeFlag.
+    """
+    def __init__(self):
+        self.event = asyncio.Event()
+
+    def set(self):
+        self.event.set()
+
+    def clear(self):
+        self.event.clear()
+
+    async def wait(self):
+        await self.event.wait()
+        self.event.clear()
+
+async def _sleep_ms(ms):
+    await asyncio.sleep(ms / 1000)
+
+async def _wait_for_ms(awaitable, timeout):
+    return await asyncio.wait_for(awaitable, timeout / 1000)
+
+# MicroPython heap figures reported by gc. They are fixed stand-ins: CPython's own allocations
+# say nothing about the board's heap, so the firmware's allocation is measured on the board.
+HEAP_FREE = 150000
+HEAP_ALLOC = 20000
+
+def _ticks_diff(a, b):
+    return a - b
+
+def _ticks_add(a, b):
+    return a + b
+
+_installed = False
+
+def install():
+    """
+    Patches the time and asyncio modules with their MicroPython extensions, backed by the virtual clock,
+    and gives the gc module MicroPython's heap functions.
+    """
+    global _installed
+    if _installed:
+        return
+    _installed = True
+
+    clock = board.clock
+    time.sleep = clock.sleep
+    time.sleep_ms = clock.sleep_ms
+    time.sleep_us = clock.sleep_us
+    time.time = clock.now
+    time.ticks_ms = clock.ticks_ms
+    time.ticks_us = clock.ticks_us
+    time.ticks_cpu = clock.ticks_us
+    time.ticks_diff = _ticks_diff
+    time.ticks_add = _ticks_add
+
+    gc.mem_free = lambda: HEAP_FREE
+    gc.mem_alloc = lambda: HEAP_ALLOC
+    gc.threshold = lambda amount=None: -1 if amount is None else None
+
+    asyncio.sleep_ms = _sleep_ms
+    asyncio.wait_for_ms = _wait_for_ms
+    asyncio.ThreadSafeFlag = ThreadSafeFlag
+    asyncio.set_event_loop_policy(_VirtualEventLoopPolicy())
@@ -2,19 +2,26 @@ from time import sleep
 from sg90 import SG90Servo
 
 class LidArm:
-    def __init__(self, pin, close_angle=90, open_angle=30):
+    def __init__(self, pin, close_angle=90, open_angle=30, clear_angle=50, home=True):
         """
         Initializes the lid arm.
         :param pin: The GPIO pin connected to the lid arm servo.
         :param close_angle: The angle corresponding to the closed position.
         :param open_angle: The angle corresponding to the fully open position.
+        :param clear_angle: The angle from which on the lid is open far enough for the switch arm to pass.
+        :param home: Reset the arm now; UselessBox homes both arms together instead.
         """
-        self.servo = SG90Servo(pin, default_angle=close_angle)
+        self.servo = SG90Servo(pin, default_angle=close_angle, home=home)
         self.close_angle = close_angle
         self.open_angle = open_angle
-        self.reset()
+        self.clear_angle = clear_angle
+        if home:
+            self.reset()
 
-    def _percentage_to_angle(self, percentage):
+    def percentage_to_angle(self, percentage):
+        """
+        Converts how far the lid is open (0 = closed, 100 = fully open) to the servo angle.
+        """
         return self.close_angle - (self.close_angle - self.open_angle) * percentage / 100
 
     def open(self, percentage=100, duration=500):
@@ -23,26 +30,46 @@ class LidArm:
         :param percentage: Percentage of how much to open the lid (0 = fully closed, 100 = fully open).
         :param duration: Duration in milliseconds for the movement.
         """
-        angle = self._percentage_to_angle(percentage)
+        angle = self.percentage_to_angle(percentage)
         self.servo.move_smoothly(target_angle=angle, duration_full_range=duration)
 
+    async def open_async(self, percentage=100, duration=500):
+        """
+        Opens the lid to the specified percentage without blocking other tasks.
+        :param percentage: Percentage of how much to open the lid (0 = fully closed, 100 = fully open).
+        :param duration: Duration in milliseconds for the movement.
+        """
+        angle = self.percentage_to_angle(percentage)
+        await self.servo.move_to(angle, duration)
+
     def close(self, percentage=100, duration=500):
         """
         Closes the lid to the specified percentage.
         :param percentage: Percentage of how much to close the lid (100 = fully closed, 0 = fully open).
         :param duration: Duration in milliseconds for the movement.
         """
-        angle = self._percentage_to_angle(100 - percentage)
+        angle = self.percentage_to_angle(100 - percentage)
         self.servo.move_smoothly(target_angle=angle, duration_full_range=duration)
 
+    async def close_async(self, percentage=100, duration=500):
+        """
+        Closes the lid to the specified percentage without blocking other tasks.
+        :param percentage: Percentage of how much to close the lid (100 = fully closed, 0 = fully open).
+        :param duration: Duration in milliseconds for the movement.
+        """
+        angle = self.percentage_to_angle(100 - percentage)
+        await self.servo.move_to(angle, duration)
+
     def is_open(self):
-        return self.servo.current_angle < 50
+        """
+        Checks if the lid is open far enough for the switch arm to pass.
+        """
+        return self.servo.current_angle <= self.clear_angle
 
     def reset(self):
         """
         Resets the lid arm to the closed position instantly.
         """
-        print("Resetting lid arm to closed position.")
         self.servo.reset()  # Reset the servo to its default (closed) angle
 
 # Example usage
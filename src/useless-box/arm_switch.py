@@ -1,20 +1,38 @@
-from time import sleep
+from time import sleep, sleep_ms
 from sg90 import SG90Servo
+from telemetry import log, EVT_TOGGLE_ANGLE, EVT_TOGGLE_MISSED
+
+try:
+    import asyncio
+except ImportError:
+    import uasyncio as asyncio
 
 class SwitchArm:
-    def __init__(self, pin, retracted_angle=40, extended_angle=175):
+    TOGGLE_MARGIN = 8  # Degrees a push extends past the learned toggle angle
+    HOLD_MS = 500  # How long a push that ended with the switch still on waits for it to flip
+    POLL_MS = 20  # Toggle switch sampling interval while holding
+
+    def __init__(self, pin, retracted_angle=40, extended_angle=175, clear_angle=90, home=True):
         """
         Initializes the switch arm.
         :param pin: The GPIO pin connected to the switch arm servo.
         :param retracted_angle: The angle corresponding to the retracted position.
         :param extended_angle: The angle corresponding to the extended (fully switched off) position.
+        :param clear_angle: The angle up to which the arm stays inside the box, clear of the closing lid.
+        :param home: Reset the arm now; UselessBox homes both arms together instead.
         """
-        self.servo = SG90Servo(pin, default_angle=retracted_angle)
+        self.servo = SG90Servo(pin, default_angle=retracted_angle, home=home)
         self.retracted_angle = retracted_angle
         self.extended_angle = extended_angle
-        self.reset()
+        self.clear_angle = clear_angle
+        self.toggle_angle = None  # Arm angle the toggle switch last flipped off at, learned by push
+        if home:
+            self.reset()
 
-    def _percentage_to_angle(self, percentage):
+    def percentage_to_angle(self, percentage):
+        """
+        Converts the extension (0 = retracted, 100 = fully extended) to the servo angle.
+        """
         return self.retracted_angle + (self.extended_angle - self.retracted_angle) * percentage / 100
 
     def extend(self, percentage=100, duration=500):
@@ -23,8 +41,90 @@ class SwitchArm:
         :param percentage: Percentage of extention (0 = fully retracted, 100 = fully extended).
         :param duration: Duration in milliseconds for the movement.
         """
-        angle = self._percentage_to_angle(percentage)
-        self.servo.move_smoothly(target_angle=angle, duration_full_range=duration, steps=100)
+        angle = self.percentage_to_angle(percentage)
+        self.servo.move_smoothly(target_angle=angle, duration_full_range=duration)
+
+    async def extend_async(self, percentage=100, duration=500):
+        """
+        Extends the switch arm to the specified percentage without blocking other tasks.
+        :param percentage: Percentage of extention (0 = fully retracted, 100 = fully extended).
+        :param duration: Duration in milliseconds for the movement.
+        """
+        angle = self.percentage_to_angle(percentage)
+        await self.servo.move_to(angle, duration)
+
+    def push_angle(self):
+        """
+        Angle a push extends to: just past the learned toggle angle, or fully extended until one is learned.
+        """
+        if self.toggle_angle is None:
+            return self.extended_angle
+        return min(self.extended_angle, self.toggle_angle + self.TOGGLE_MARGIN)
+
+    def push(self, toggle_switch, duration=500):
+        """
+        Extends the switch arm until the toggle switch reads off, sampling it between servo steps,
+        and stops there instead of finishing the stroke. Retract right after to reverse the arm.
+        :param toggle_switch: The ToggleSwitch to turn off.
+        :param duration: Duration in milliseconds for a full extension.
+        :return: True if the switch is off.
+        """
+        stopped = self.servo.move_smoothly(self.push_angle(), duration, until=toggle_switch.is_off)
+        return self.finish_push(toggle_switch, stopped)
+
+    async def push_async(self, toggle_switch, duration=500):
+        """
+        Extends the switch arm until the toggle switch reads off without blocking other tasks, see push.
+        :param toggle_switch: The ToggleSwitch to turn off.
+        :param duration: Duration in milliseconds for a full extension.
+        :return: True if the switch is off.
+        """
+        stopped = await self.servo.move_to(self.push_angle(), duration, until=toggle_switch.is_off)
+        return await self.finish_push_async(toggle_switch, stopped)
+
+    def finish_push(self, toggle_switch, stopped):
+        """
+        Ends a stroke towards push_angle: learns the angle the switch toggled at, or holds the arm
+        while the switch is still on. For strokes not started by push, see ArmPlanner.
+        :param toggle_switch: The ToggleSwitch being turned off.
+        :param stopped: The stroke stopped early because the switch read off.
+        :return: True if the switch is off.
+        """
+        if stopped:
+            return self._learn(self.servo.current_angle)
+
+        for _ in range(self.HOLD_MS // self.POLL_MS):
+            if toggle_switch.is_off():
+                return self._learn(self.servo.current_angle)
+            sleep_ms(self.POLL_MS)
+        return self._missed()
+
+    async def finish_push_async(self, toggle_switch, stopped):
+        """
+        Ends a stroke towards push_angle without blocking other tasks, see finish_push.
+        """
+        if stopped:
+            return self._learn(self.servo.current_angle)
+
+        for _ in range(self.HOLD_MS // self.POLL_MS):
+            if toggle_switch.is_off():
+                return self._learn(self.servo.current_angle)
+            await asyncio.sleep_ms(self.POLL_MS)
+        return self._missed()
+
+    def _learn(self, angle):
+        log.record(EVT_TOGGLE_ANGLE, self.servo.angle_to_index(angle))
+        # The angle is the first step the switch read off at, so it overshoots by up to one step; keep the lowest
+        if self.toggle_angle is None or angle < self.toggle_angle:
+            self.toggle_angle = angle
+        return True
+
+    def _missed(self):
+        if self.toggle_angle is not None:
+            # The switch or the arm has moved; the next push goes all the way again
+            log.record(EVT_TOGGLE_MISSED, self.servo.angle_to_index(self.servo.current_angle))
+            self.toggle_angle = None
+        return False
 
     def retract(self, percentage=100, duration=500):
         """
@@ -32,14 +132,22 @@ class SwitchArm:
         :param percentage: Percentage of retraction (0 = fully extended, 100 = fully retracted).
         :param duration: Duration in milliseconds for the movement.
         """
-        angle = self._percentage_to_angle(100 - percentage)
-        self.servo.move_smoothly(target_angle=angle, duration_full_range=duration, steps=100)
+        angle = self.percentage_to_angle(100 - percentage)
+        self.servo.move_smoothly(target_angle=angle, duration_full_range=duration)
+
+    async def retract_async(self, percentage=100, duration=500):
+        """
+        Retracts the switch arm to the specified percentage without blocking other tasks.
+        :param percentage: Percentage of retraction (0 = fully extended, 100 = fully retracted).
+        :param duration: Duration in milliseconds for the movement.
+        """
+        angle = self.percentage_to_angle(100 - percentage)
+        await self.servo.move_to(angle, duration)
 
     def reset(self):
         """
         Resets the switch arm to the retracted position instantly.
         """
-        print("Resetting switch arm to retracted position.")
         self.servo.reset()  # Reset the servo to its default (retracted) angle
 
 # Example usage
@@ -51,5 +159,14 @@ if __name__ == "__main__":
     sleep(1)
     switch_arm.retract()
 
+    # Push the toggle switch off, twice to use the learned angle
+    from switch import ToggleSwitch
+    toggle_switch = ToggleSwitch(21)
+    for _ in range(2):
+        while not toggle_switch.is_on():
+            sleep_ms(50)
+        switch_arm.push(toggle_switch)
+        switch_arm.retract()
+
     # Test resetting
     switch_arm.reset()
@@ -0,0 +1,242 @@
+import time
+import behavior
+from apds9960.const import APDS9960_DIR_NONE
+from controller import EV_GESTURE, EV_PREDICTED, EV_SWITCH_ON, EV_TIMER, UselessBoxController, random_delay
+from telemetry import (log, EVT_ATTEMPT, EVT_BEHAVIOR_MISSING, EVT_CLOSE_LID, EVT_FAKEOUT, EVT_PEEKABOO, EVT_PROXIMITY, EVT_STAGE,
+                       EVT_STATE, EVT_STILL_ON, EVT_SWITCH, EVT_SWITCHED_OFF, EVT_SWITCH_OFF)
+
+try:
+    import asyncio
+except ImportError:
+    import uasyncio as asyncio
+
+class AsyncUselessBoxController(UselessBoxController):
+    POLL_INTERVAL_MS = 20  # Sensor polling interval while behaviors run in the background
+    GESTURE_DRAIN_MS = POLL_INTERVAL_MS
+
+    def __init__(self, switch_pin, lid_pin, sda_pin, scl_pin, toggle_pin, led_pin, inactivity_timeout=5, proximity_int_pin=None, hardware_i2c=False, proximity_filter=None, approach_predictor=None, gestures=False):
+        """
+        Runs the UselessBoxController behaviors on the asyncio motion engine.
+        Behaviors run as background tasks, so the sensors keep being sampled during a move
+        and a switch flip interrupts whatever the box is doing.
+        Parameters are the same as for UselessBoxController.
+        """
+        super().__init__(switch_pin, lid_pin, sda_pin, scl_pin, toggle_pin, led_pin, inactivity_timeout, proximity_int_pin, hardware_i2c, proximity_filter, approach_predictor, gestures)
+        self.behavior = None  # Task of the behavior currently running
+        self.switching_off = False
+        self.switch_off_pending = False
+        self.behaviors = behavior.load_all()  # Compiled programs by name, see scripts/compile_behaviors.py
+        self.interpreter = behavior.BehaviorInterpreter(self)
+
+    def run(self):
+        """
+        Main method to run the interactive sequences based on user input.
+        """
+        self.box.home(wait=False)  # The arms settle while the loop already samples the sensors
+        asyncio.run(self.run_async())
+
+    async def run_async(self):
+        while True:
+            self.update()
+            await asyncio.sleep_ms(self.POLL_INTERVAL_MS)
+
+    def is_busy(self):
+        """
+        Checks if a behavior is currently running.
+        """
+        return self.behavior is not None and not self.behavior.done()
+
+    def _start(self, coroutine):
+        """
+        Starts a behavior as a background task, cancelling the one currently running.
+        """
+        if self.is_busy():
+            self.behavior.cancel()
+        self.behavior = asyncio.create_task(coroutine)
+
+    def update(self):
+        """
+        Samples the toggle switch and proximity sensor and starts behaviors. Does not block.
+        """
+        proximity = self.box.get_proximity()
+        self.react(self.box.get_switch_state(), proximity, self.box.get_gesture(proximity))
+
+    def react(self, current_switch, proximity, gesture=APDS9960_DIR_NONE):
+        """
+        Starts behaviors for a switch state and proximity reading. Does not block. The reading is dispatched
+        through the state machine of UselessBoxController, whose actions start the behaviors as tasks here.
+        While one runs, only turning the switch on is dispatched.
+        :param current_switch: True if the toggle switch is on.
+        :param proximity: The current ProximityState.
+        :param gesture: A gesture completed since the last call, see UselessBox.get_gesture.
+        """
+        predicted = self._approach_predicted()
+
+        if proximity != self.last_proximity:
+            if __debug__:
+                log.record(EVT_PROXIMITY, proximity)
+
+        if current_switch != self.last_switch_state:
+            log.record(EVT_SWITCH, 1 if current_switch else 0)
+
+            if current_switch:
+                self.last_on_time = time.time()
+
+        if self.state != self.last_state:
+            log.record(EVT_STATE, self.state)
+
+        self.last_state = self.state
+
+        self.switch_state = current_switch
+        self.proximity = proximity
+        self.gesture = gesture
+        if current_switch and not self.last_switch_state:
+            # Interrupts whatever is running, see _on_switch_on
+            self.state = self.machine.dispatch(self.state, EV_SWITCH_ON)
+
+        elif self.is_busy():
+            pass
+
+        elif self.switch_off_pending:
+            self.switch_off_pending = False
+            if current_switch:
+                self._start(self._switch_off_async())
+
+        else:
+            if gesture != APDS9960_DIR_NONE:
+                event = EV_GESTURE
+            elif predicted:
+                event = EV_PREDICTED
+            else:
+                event = proximity
+            self.state = self.machine.dispatch(self.state, event)
+
+        if not self.is_busy():
+            self.state = self.machine.dispatch(self.state, EV_TIMER)
+            if not self.is_busy():
+                self.update_led_based_on_proximity(proximity)
+
+        self.last_switch_state = current_switch
+        self.last_proximity = proximity
+
+    # Actions of the state machine that differ from UselessBoxController's: they start the behavior as a
+    # background task and return, and the behavior scripts set the state they end in.
+
+    def _on_switch_on(self):
+        if self.switching_off:
+            # Let the running switch-off finish its stroke, then go again
+            self.switch_off_pending = True
+            return
+        # Interrupt any tease or peek-a-boo mid-move, or the staging move if the hand was quicker
+        staged = self.state == UselessBoxController.STAGED
+        self.led.on()
+        self._start(self._switch_off_async(with_delay=not staged, staged=staged))
+
+    def _handle_switch_off(self, staged=False):
+        self._start(self._switch_off_async(staged=staged))
+
+    def _handle_stage(self):
+        self._start(self._stage_async())
+
+    def _handle_peekaboo(self):
+        log.record(EVT_PEEKABOO)
+        self._start(self.play("peekaboo"))
+
+    def _handle_tease(self):
+        self._start(self.play("tease"))
+
+    def _handle_threaten(self):
+        self._start(self.play("threaten"))
+
+    def _handle_close_lid(self):
+        log.record(EVT_CLOSE_LID)
+        self._start(self.play("close_lid"))
+
+    def _handle_fakeout(self):
+        log.record(EVT_FAKEOUT)
+        self._start(self.play("fakeout"))
+
+    async def _random_delay_async(self):
+        """
+        Waits a random delay before switching off, see random_delay.
+        """
+        await asyncio.sleep(random_delay())
+
+    async def _stage_async(self):
+        """
+        Opens the lid and moves the switch arm close to the switch, see UselessBoxController._handle_stage.
+        """
+        log.record(EVT_STAGE)
+        await self.box.lid_arm.open_async(100, 300)
+        await self.box.switch_arm.extend_async(self.STAGE_PERCENTAGE, 300)
+        self.staged_ms = time.ticks_ms()
+
+    async def _switch_off_async(self, with_delay=False, staged=False):
+        """
+        Handles the switch toggle interaction, see UselessBoxController._handle_switch_off.
+        """
+        self.switching_off = True
+        try:
+            if with_delay:
+                await self._random_delay_async()
+
+            current_time = time.time()
+            if current_time - self.last_off_time < 3:
+                self.switch_off_count += 1
+            else:
+                self.switch_off_count = 1
+            self.last_off_time = current_time
+
+            if self.switch_off_count >= 3:
+                await self.play("panic")
+                self.switch_off_count = 0
+                return
+
+            log.record(EVT_SWITCH_OFF)
+            planner = self.box.planner
+            toggle_switch = self.box.toggle_switch
+            for attempt in range(3):
+                if __debug__:
+                    log.record(EVT_ATTEMPT, attempt + 1)
+                if attempt == 0:
+                    # Staged: finishes the lid if the flip came before the staging move did
+                    await planner.open_and_push_async(toggle_switch, 300 if staged else 500, 500)
+                else:
+                    await self.box.switch_arm.push_async(toggle_switch, 500)
+
+                if not self.box.get_switch_state():
+                    log.record(EVT_SWITCHED_OFF, attempt + 1)
+                    break
+                log.record(EVT_STILL_ON, attempt + 1)
+                await self.box.switch_arm.retract_async(100, 500)
+
+            await planner.retract_and_close_async(100, 500, 100, 500, "switch_off")
+            self.led.off()
+            self.state = UselessBoxController.IDLE
+        finally:
+            self.switching_off = False
+            self._reset_inactivity_timer()
+
+    async def play(self, name):
+        """
+        Runs one of the compiled behavior programs.
+        :param name: Name of the program, e.g. "peekaboo" for behaviors/peekaboo.bin.
+        """
+        program = self.behaviors.get(name)
+        if program is None:
+            log.record(EVT_BEHAVIOR_MISSING, behavior.BEHAVIOR_NAMES.index(name) if name in behavior.BEHAVIOR_NAMES else -1)
+            self.state = UselessBoxController.IDLE
+            return
+        await self.interpreter.run(program, name)
+
+if __name__ == "__main__":
+    controller = AsyncUselessBoxController(
+        switch_pin=0,
+        lid_pin=2,
+        sda_pin=6,
+        scl_pin=7,
+        toggle_pin=21,
+        led_pin=8,
+        inactivity_timeout=5
+    )
+    controller.run()
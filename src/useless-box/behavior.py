@@ -0,0 +1,157 @@
+import os
+import random
+from bytecode import *
+from states import ProximityState
+from telemetry import log, EVT_NO_BEHAVIORS
+
+try:
+    import asyncio
+except ImportError:
+    import uasyncio as asyncio
+
+def load(path):
+    """
+    Reads a compiled behavior program.
+    :param path: Path of the .bin file.
+    :return: The program as bytes.
+    """
+    with open(path, "rb") as file:
+        program = file.read()
+    if program[:len(MAGIC)] != MAGIC:
+        raise ValueError("Not a behavior program: " + path)
+    return program
+
+def load_all(directory=None):
+    """
+    Reads every compiled behavior program in a directory.
+    :param directory: Directory holding the .bin files, BEHAVIOR_DIR by default.
+    :return: Dictionary of programs by name (the file name without extension).
+    """
+    if directory is None:
+        parent = __file__.rsplit("/", 1)
+        # Frozen modules live in ".frozen", the programs stay on the filesystem
+        directory = parent[0] + "/" + BEHAVIOR_DIR if len(parent) > 1 and parent[0] != ".frozen" else BEHAVIOR_DIR
+    programs = {}
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        log.record(EVT_NO_BEHAVIORS)
+        return programs
+    for name in names:
+        if name.endswith(EXTENSION):
+            programs[name[:-len(EXTENSION)]] = load(directory + "/" + name)
+    return programs
+
+class BehaviorInterpreter:
+    def __init__(self, controller):
+        """
+        Executes compiled behavior programs on the box of a controller.
+        :param controller: The AsyncUselessBoxController whose box, LED and state the programs drive.
+        """
+        self.controller = controller
+
+    @staticmethod
+    def _percentage(code, pc):
+        low, high = code[pc], code[pc + 1]
+        return low if low == high else random.randint(low, high)
+
+    def _sensor(self, sensor):
+        controller = self.controller
+        if sensor == SENSOR_PROXIMITY:
+            # The controller keeps sampling while a behavior runs, so no extra I2C read is needed
+            return ProximityState.NO_DETECTION if controller.last_proximity is None else controller.last_proximity
+        if sensor == SENSOR_SWITCH:
+            return 1 if controller.box.get_switch_state() else 0
+        if sensor == SENSOR_LID:
+            return 1 if controller.box.lid_arm.is_open() else 0
+        raise ValueError(f"Unknown sensor {sensor}")
+
+    async def run(self, program, name="behavior"):
+        """
+        Runs a program until OP_END. Servo moves and waits are awaited, so other tasks keep running.
+        :param program: The compiled program, see load.
+        :param name: Name the program's coordinated moves are reported under, see ArmPlanner.
+        """
+        box = self.controller.box
+        code = memoryview(program)
+        counters = []
+        pc = len(MAGIC)
+
+        while True:
+            op = code[pc]
+
+            if op <= OP_SWITCH_RETRACT:
+                if op == OP_END:
+                    return
+                percentage = self._percentage(code, pc + 1)
+                duration = code[pc + 3] | code[pc + 4] << 8
+                pc += 5
+                if op == OP_LID_OPEN:
+                    await box.lid_arm.open_async(percentage, duration)
+                elif op == OP_LID_CLOSE:
+                    await box.lid_arm.close_async(percentage, duration)
+                elif op == OP_SWITCH_EXTEND:
+                    await box.switch_arm.extend_async(percentage, duration)
+                else:
+                    await box.switch_arm.retract_async(percentage, duration)
+
+            elif op == OP_OPEN_AND_EXTEND or op == OP_RETRACT_AND_CLOSE:
+                first = self._percentage(code, pc + 1)
+                first_duration = code[pc + 3] | code[pc + 4] << 8
+                second = self._percentage(code, pc + 5)
+                second_duration = code[pc + 7] | code[pc + 8] << 8
+                pc += 9
+                if op == OP_OPEN_AND_EXTEND:
+                    await box.planner.open_and_extend_async(first, first_duration, second, second_duration, name)
+                else:
+                    await box.planner.retract_and_close_async(first, first_duration, second, second_duration, name)
+
+            elif op == OP_WAIT:
+                await asyncio.sleep_ms(code[pc + 1] | code[pc + 2] << 8)
+                pc += 3
+
+            elif op == OP_LED:
+                led = self.controller.led
+                mode = code[pc + 1]
+                if mode & LED_PATTERN:
+                    led.show(mode & (LED_PATTERN - 1))
+                elif mode == LED_ON:
+                    led.on()
+                elif mode == LED_OFF:
+                    led.off()
+                else:
+                    led.toggle()
+                pc += 2
+
+            elif op == OP_STATE:
+                self.controller.state = code[pc + 1]
+                pc += 2
+
+            elif op == OP_REPEAT:
+                counters.append(code[pc + 1])
+                pc += 2
+
+            elif op == OP_LOOP:
+                counters[-1] -= 1
+                if counters[-1] > 0:
+                    pc = code[pc + 1] | code[pc + 2] << 8
+                else:
+                    counters.pop()
+                    pc += 3
+
+            elif op == OP_JUMP:
+                pc = code[pc + 1] | code[pc + 2] << 8
+
+            elif op == OP_IF:
+                if self._sensor(code[pc + 1]) == code[pc + 2]:
+                    pc = code[pc + 3] | code[pc + 4] << 8
+                else:
+                    pc += 5
+
+            elif op == OP_PRINT:
+                length = code[pc + 1]
+                print(str(bytes(code[pc + 2:pc + 2 + length]), "utf-8"))
+                pc += 2 + length
+
+            else:
+                raise ValueError(f"Unknown opcode {op} at {pc}")
@@ -1,8 +1,10 @@
 # boot.py -- run on boot-up
-#import wifi
+#from wifi import WiFiManager
 from controller import UselessBoxController
 
-# wifi.connect_to_wifi("ssid", "password")
+# Connects in the background, so the box starts at once whether or not the network is up
+# wifi_manager = WiFiManager("ssid", "password")
+# wifi_manager.start()
 
 controller = UselessBoxController(
     switch_pin=0,
@@ -0,0 +1,41 @@
+"""
+Format of the compiled behavior programs, shared by behavior.py and scripts/compile_behaviors.py,
+so this module imports nothing from the board.
+"""
+try:
+    from micropython import const
+except ImportError:
+    def const(value):
+        return value
+
+MAGIC = b"UB\x01"  # Header of every program: "UB" and the format version
+
+# Opcodes. u8 is one byte, u16 two bytes little-endian, target is a u16 offset from the start of the program.
+OP_END = const(0)  # End of the program
+OP_LID_OPEN = const(1)  # u8 min percentage, u8 max percentage, u16 duration
+OP_LID_CLOSE = const(2)  # u8 min percentage, u8 max percentage, u16 duration
+OP_SWITCH_EXTEND = const(3)  # u8 min percentage, u8 max percentage, u16 duration
+OP_SWITCH_RETRACT = const(4)  # u8 min percentage, u8 max percentage, u16 duration
+OP_LED = const(5)  # u8 LED_OFF, LED_ON, LED_TOGGLE, or LED_PATTERN plus one of the led PATTERN_ constants
+OP_WAIT = const(6)  # u16 milliseconds
+OP_STATE = const(7)  # u8 controller state
+OP_REPEAT = const(8)  # u8 count; the body runs up to the matching OP_LOOP
+OP_LOOP = const(9)  # target of the first instruction of the body
+OP_JUMP = const(10)  # target
+OP_IF = const(11)  # u8 sensor, u8 value, target; jumps if the sensor reads value
+OP_PRINT = const(12)  # u8 length, then the message in UTF-8
+OP_OPEN_AND_EXTEND = const(13)  # Lid u8 min, u8 max percentage, u16 duration, then the same for the switch arm
+OP_RETRACT_AND_CLOSE = const(14)  # Switch arm u8 min, u8 max percentage, u16 duration, then the same for the lid
+
+LED_OFF = const(0)
+LED_ON = const(1)
+LED_TOGGLE = const(2)
+LED_PATTERN = const(0x10)
+
+SENSOR_PROXIMITY = const(0)  # Value is the ProximityState
+SENSOR_SWITCH = const(1)  # Value is 1 when the toggle switch is on
+SENSOR_LID = const(2)  # Value is 1 when the lid is open
+
+BEHAVIOR_DIR = "behaviors"  # Next to this module
+BEHAVIOR_NAMES = ("close_lid", "fakeout", "panic", "peekaboo", "tease", "threaten")  # Programs the controllers play, by telemetry id
+EXTENSION = ".bin"
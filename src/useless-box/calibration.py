@@ -0,0 +1,166 @@
+import struct
+from time import sleep_ms
+from proximity import ProximityState
+from sg90 import SG90Servo
+
+PROFILE_PATH = "calibration.bin"  # On the board's flash, next to boot.py; None to ignore any profile
+
+class CalibrationProfile:
+    MAGIC = 0x4355  # "UC"
+    FORMAT = "<6H"  # Magic, then the duty table index of every angle
+
+    def __init__(self, retracted_angle=40, extended_angle=175, close_angle=90, open_angle=30, clear_angle=50):
+        """
+        Servo endpoints of one box. The defaults are the uncalibrated endpoints of SwitchArm and LidArm.
+        :param retracted_angle: Switch arm angle clear of the lid.
+        :param extended_angle: Switch arm angle that still flips the toggle switch.
+        :param close_angle: Lid arm angle with the lid closed.
+        :param open_angle: Lid arm angle the lid opens to, a little past clear_angle.
+        :param clear_angle: Lid arm angle the switch arm got through at, see ArmPlanner.
+        """
+        self.retracted_angle = retracted_angle
+        self.extended_angle = extended_angle
+        self.close_angle = close_angle
+        self.open_angle = open_angle
+        self.clear_angle = clear_angle
+
+    def save(self, path=None):
+        """
+        Writes the profile as 12 bytes. Angles are kept at the duty table's 1/4 degree resolution.
+        :param path: File to write, PROFILE_PATH by default.
+        """
+        scale = SG90Servo.ANGLE_SCALE
+        with open(path or PROFILE_PATH, "wb") as file:
+            file.write(struct.pack(self.FORMAT, self.MAGIC,
+                                   int(self.retracted_angle * scale + 0.5), int(self.extended_angle * scale + 0.5),
+                                   int(self.close_angle * scale + 0.5), int(self.open_angle * scale + 0.5),
+                                   int(self.clear_angle * scale + 0.5)))
+
+    @classmethod
+    def load(cls, path=None):
+        """
+        Reads a profile written by save.
+        :param path: File to read, PROFILE_PATH by default.
+        :return: The CalibrationProfile, or None if the box has not been calibrated.
+        """
+        path = path or PROFILE_PATH
+        if path is None:
+            return None
+        try:
+            with open(path, "rb") as file:
+                data = file.read()
+        except OSError:
+            return None
+        if len(data) != struct.calcsize(cls.FORMAT) or struct.unpack_from("<H", data)[0] != cls.MAGIC:
+            print(f"Ignoring invalid calibration profile {path}")
+            return None
+        scale = SG90Servo.ANGLE_SCALE
+        return cls(*(index / scale for index in struct.unpack(cls.FORMAT, data)[1:]))
+
+    def __repr__(self):
+        return (f"CalibrationProfile(retracted_angle={self.retracted_angle}, extended_angle={self.extended_angle}, "
+                f"close_angle={self.close_angle}, open_angle={self.open_angle}, clear_angle={self.clear_angle})")
+
+class Calibrator:
+    STEP = 0.5  # Degrees per sweep step
+    STEP_MS = 40  # Wait per step, so the servo has caught up with the command when the switch is sampled
+    LID_STEP = 2  # Degrees the lid is opened further after every push that did not get through
+    PUSH_MS = 1000  # Duration of a full switch arm stroke while probing the lid, slow so a blocked arm does not hit hard
+    SWITCH_MARGIN = 3  # Degrees the extended angle is set past the angle the switch toggled at
+    LID_MARGIN = 4  # Degrees the open angle is set past the smallest opening the arm got through
+    CLEAR_MS = 1000  # How long no hand has to be in range before a sweep starts
+
+    def __init__(self, box):
+        """
+        Finds the shortest strokes of a box's arms. The switch arm is swept towards the toggle switch
+        in fine steps until the switch reads off, with the lid fully open. Then the lid is opened a
+        little further after every slow push until the switch arm gets through and flips the switch.
+        Sweeps only start while the proximity sensor sees no hand, so no hand is in the arm's way.
+        :param box: The UselessBox to calibrate.
+        """
+        self.box = box
+        self.limits = CalibrationProfile()  # The uncalibrated endpoints bound the sweeps
+
+    def run(self, path=None):
+        """
+        Calibrates both arms, saves the profile and applies it to the arms.
+        The user is asked to flip the toggle switch on twice.
+        :param path: File to save the profile to, PROFILE_PATH by default.
+        :return: The CalibrationProfile, or None if the switch could not be reached or the switch arm did not get
+            through at any lid opening. Nothing is saved then.
+        """
+        limits = self.limits
+        switch_arm = self.box.switch_arm
+        lid_servo = self.box.lid_arm.servo
+        switch_arm.servo.move_smoothly(limits.retracted_angle, 500)
+        lid_servo.move_smoothly(limits.open_angle, 1000)
+
+        self._wait_for_switch_on()
+        toggle_angle = self._sweep(switch_arm.servo, limits.extended_angle)
+        switch_arm.servo.move_smoothly(limits.retracted_angle, 500)
+        if toggle_angle is None:
+            print(f"The switch arm did not reach the switch by {limits.extended_angle} degrees, calibration failed.")
+            lid_servo.move_smoothly(limits.close_angle, 1000)
+            return None
+        extended_angle = min(limits.extended_angle, toggle_angle + self.SWITCH_MARGIN)
+        print(f"Switch toggled at {toggle_angle} degrees, extending to {extended_angle} degrees.")
+
+        clear_angle = None
+        self._wait_for_switch_on()
+        angle = limits.close_angle - self.LID_STEP
+        while angle > limits.open_angle:
+            lid_servo.move_smoothly(angle, 1000)
+            reached = switch_arm.servo.move_smoothly(extended_angle, self.PUSH_MS, until=self.box.toggle_switch.is_off)
+            switch_arm.servo.move_smoothly(limits.retracted_angle, 500)
+            if reached:
+                clear_angle = angle
+                break
+            angle -= self.LID_STEP
+        lid_servo.move_smoothly(limits.close_angle, 1000)
+        if clear_angle is None:
+            print(f"The switch arm did not get through with the lid open to {angle + self.LID_STEP} degrees, calibration failed.")
+            return None
+        open_angle = max(limits.open_angle, clear_angle - self.LID_MARGIN)
+        print(f"Switch arm got through with the lid at {clear_angle} degrees, opening to {open_angle} degrees.")
+
+        profile = CalibrationProfile(limits.retracted_angle, extended_angle, limits.close_angle, open_angle, clear_angle)
+        profile.save(path)
+        switch_arm.extended_angle = extended_angle
+        switch_arm.toggle_angle = None
+        self.box.lid_arm.open_angle = open_angle
+        self.box.lid_arm.clear_angle = clear_angle
+        print(f"Saved {profile}")
+        return profile
+
+    def _wait_for_switch_on(self):
+        toggle_switch = self.box.toggle_switch
+        if not toggle_switch.is_on():
+            print("Flip the switch on.")
+            while not toggle_switch.is_on():
+                sleep_ms(50)
+        clear_ms = 0
+        while clear_ms < self.CLEAR_MS:
+            sleep_ms(50)
+            clear_ms = clear_ms + 50 if self.box.get_proximity() == ProximityState.NO_DETECTION else 0
+
+    def _sweep(self, servo, limit):
+        """
+        Moves a servo towards a limit in STEP increments until the toggle switch reads off.
+        :return: The angle the switch read off at, or None if it was still on at the limit.
+        """
+        toggle_switch = self.box.toggle_switch
+        angle = servo.current_angle
+        while angle < limit:
+            angle = min(limit, angle + self.STEP)
+            servo.write_angle(angle)
+            sleep_ms(self.STEP_MS)
+            if toggle_switch.is_off():
+                return angle
+        return None
+
+# Example usage
+if __name__ == "__main__":
+    from useless_box import UselessBox
+
+    box = UselessBox(switch_pin=0, lid_pin=2, sda_pin=6, scl_pin=7, toggle_pin=21)
+    Calibrator(box).run()
@@ -1,22 +1,126 @@
 import random
 import time
+from micropython import const
+from apds9960.const import *
 from proximity import ProximityState
-from led import LED
+from telemetry import (log, EVT_ATTEMPT, EVT_CLOSE_LID, EVT_DELAY, EVT_FAKEOUT, EVT_GESTURE, EVT_HOLD_BACK, EVT_INACTIVE,
+                       EVT_KEEP_CLOSED, EVT_PANIC, EVT_PROXIMITY, EVT_STAGE, EVT_STAND_DOWN, EVT_STATE,
+                       EVT_STILL_ON, EVT_SWITCH, EVT_SWITCHED_OFF, EVT_SWITCH_OFF, EVT_SWITCH_ON_TOO_LONG,
+                       EVT_TEASE, EVT_THREATEN)
+from led import LED, PATTERN_BLINK_FAST, PATTERN_BLINK_SLOW, PATTERN_BREATHE, PATTERN_OFF, PATTERN_STROBE
+from profiler import STAGE_ACTUATION, STAGE_DUTY, STAGE_LED, STAGE_LOGIC, STAGE_PASS, STAGE_SENSOR, STAGE_SWITCH
+from statemachine import StateMachine
+from states import STATE_IDLE, STATE_LID_OPEN, STATE_TEASING, STATE_SWITCH_OFF, STATE_STAGED, STATE_COUNT, STATE_NAMES
 from useless_box import UselessBox
 
+# Events of one pass, the first that applies; without any other, the proximity is the event.
+# The proximity events are the ProximityState ints.
+EV_NO_DETECTION = const(0)
+EV_FAR = const(1)
+EV_CLOSE = const(2)
+EV_VERY_CLOSE = const(3)
+EV_PREDICTED = const(4)  # The approach predictor expects a flip
+EV_GESTURE = const(5)  # A gesture completed
+EV_SWITCH_ON = const(6)  # The toggle switch was turned on
+EV_TIMER = const(7)  # Dispatched after every pass's event, for the timeouts
+EVENT_COUNT = const(8)
+
+EVENT_NAMES = ("NO_DETECTION", "FAR", "CLOSE", "VERY_CLOSE", "PREDICTED", "GESTURE", "SWITCH_ON", "TIMER")
+
+def _transitions():
+    """
+    Returns the transitions of UselessBoxController, see StateMachine.
+    """
+    transitions = []
+    for state in range(STATE_COUNT):
+        # Turning the switch on interrupts anything
+        transitions.append((state, EV_SWITCH_ON, None, "_on_switch_on", STATE_IDLE))
+
+    # Staged, the box only waits for the flip, and stands down once the hand leaves or the hold is over
+    for event in (EV_NO_DETECTION, EV_FAR, EV_CLOSE, EV_VERY_CLOSE, EV_PREDICTED, EV_GESTURE):
+        transitions.append((STATE_STAGED, event, "_stage_over", "_on_stand_down", STATE_IDLE))
+
+    transitions += [
+        (STATE_IDLE, EV_GESTURE, "_gesture_threatens", "_on_gesture", STATE_LID_OPEN),
+        (STATE_IDLE, EV_GESTURE, None, "_on_gesture", STATE_IDLE),
+        (STATE_IDLE, EV_PREDICTED, None, "_on_stage", STATE_STAGED),
+        (STATE_IDLE, EV_VERY_CLOSE, "_roll_peekaboo", "_on_peekaboo", STATE_IDLE),
+        (STATE_IDLE, EV_VERY_CLOSE, "_roll_threaten", "_on_threaten", STATE_LID_OPEN),
+        (STATE_IDLE, EV_VERY_CLOSE, None, "_on_hold_back", STATE_IDLE),
+        (STATE_IDLE, EV_CLOSE, "_roll_fakeout", "_on_fakeout", STATE_IDLE),
+        (STATE_IDLE, EV_CLOSE, None, "_on_tease", STATE_IDLE),
+        (STATE_IDLE, EV_TIMER, "_switch_on_too_long", "_on_switch_on_too_long", STATE_IDLE),
+        (STATE_LID_OPEN, EV_TIMER, "_inactive", "_on_inactive", STATE_IDLE),
+    ]
+
+    for state in (STATE_LID_OPEN, STATE_TEASING, STATE_SWITCH_OFF):
+        transitions += [
+            # Only closing the lid interrupts the box when it is not idle
+            (state, EV_GESTURE, "_gesture_closes_lid", "_on_gesture", STATE_IDLE),
+            (state, EV_GESTURE, None, "_on_gesture", None),
+            (state, EV_FAR, None, "_on_return_to_idle", STATE_IDLE),
+            (state, EV_VERY_CLOSE, None, "_on_keep_closed", STATE_IDLE),
+            # A predicted flip only stages the arms from idle; otherwise the proximity decides
+            (state, EV_PREDICTED, "_is_far", "_on_return_to_idle", STATE_IDLE),
+            (state, EV_PREDICTED, "_is_very_close", "_on_keep_closed", STATE_IDLE),
+        ]
+    return transitions
+
+TRANSITIONS = _transitions()
+
+def random_delay():
+    """
+    Picks the delay before switching off after the switch is turned on.
+    Short delays are more common, with longer delays being rarer.
+    :return: The delay in seconds, for the caller to sleep or await.
+    """
+    random_value = random.uniform(0, 1)
+    if random_value < 0.3:
+        chosen_delay = 0.5
+    elif random_value < 0.6:
+        chosen_delay = 1.0
+    elif random_value < 0.8:
+        chosen_delay = 1.5
+    elif random_value < 0.9:
+        chosen_delay = 2.0
+    elif random_value < 0.95:
+        chosen_delay = 3.0
+    else:
+        chosen_delay = 5.0
+
+    log.record(EVT_DELAY, int(chosen_delay * 1000))
+    return chosen_delay
+
 class UselessBoxController:
     PEEKABOO_PROBABILITY = 0.05  # Probability for peek-a-boo (5%)
     THREATEN_PROBABILITY = 0.2   # Probability for threatening movement (20%)
-    PEEKABOO_RARE_PROBABILITY = 0.01  # Probability when hand is very close (1%)
+    FAKEOUT_PROBABILITY = 0.3  # Probability for a fake-out instead of a tease when a hand is close (30%)
 
-    IDLE = 0
-    LID_OPEN = 1
-    TEASING = 2
-    SWITCH_OFF = 3
+    IDLE = STATE_IDLE
+    LID_OPEN = STATE_LID_OPEN
+    TEASING = STATE_TEASING
+    SWITCH_OFF = STATE_SWITCH_OFF
+    STAGED = STATE_STAGED
 
     MAX_SWITCH_ON_TIME_SECS = 10
-
-    def __init__(self, switch_pin, lid_pin, sda_pin, scl_pin, toggle_pin, led_pin, inactivity_timeout=5):
+    STAGE_PERCENTAGE = 60  # Switch arm extension while staged, short of touching the switch
+    STAGE_HOLD_MS = 2000  # How long to stay staged waiting for the flip
+    GESTURE_DRAIN_MS = 200  # One gesture FIFO drain per update
+
+    # LED pattern of each ProximityState
+    PROXIMITY_PATTERNS = (PATTERN_OFF, PATTERN_OFF, PATTERN_BLINK_FAST, PATTERN_BLINK_SLOW)
+
+    # Behavior played for each gesture
+    GESTURE_BEHAVIORS = {
+        APDS9960_DIR_LEFT: "tease",
+        APDS9960_DIR_RIGHT: "fakeout",
+        APDS9960_DIR_UP: "peekaboo",
+        APDS9960_DIR_DOWN: "close_lid",
+        APDS9960_DIR_NEAR: "threaten",
+        APDS9960_DIR_FAR: "close_lid",
+    }
+
+    def __init__(self, switch_pin, lid_pin, sda_pin, scl_pin, toggle_pin, led_pin, inactivity_timeout=5, proximity_int_pin=None, hardware_i2c=False, proximity_filter=None, approach_predictor=None, gestures=False, power_manager=None, profiler=None, heap_manager=None, sensing_period_ms=None):
         """
         Initializes the UselessBoxController with the necessary components.
         :param switch_pin: GPIO pin connected to the switch arm servo.
@@ -26,8 +130,22 @@ class UselessBoxController:
         :param toggle_pin: GPIO pin connected to the toggle switch.
         :param led_pin: GPIO pin connected to the LED.
         :param inactivity_timeout: Time in seconds before the lid closes automatically if no interaction occurs.
+        :param proximity_int_pin: GPIO pin connected to the APDS-9960 INT line, so the sensor is only read when it signals a change.
+        :param hardware_i2c: Use the hardware I2C peripheral for the APDS-9960 instead of SoftI2C.
+        :param proximity_filter: A filter from filters that smooths the proximity readings before they are classified.
+        :param approach_predictor: An ApproachPredictor, to open the lid and stage the switch arm before the switch is flipped.
+        :param gestures: Read APDS-9960 gestures while a hand is near and play GESTURE_BEHAVIORS for them.
+        :param power_manager: A PowerManager, to light-sleep between passes while the box is idle.
+        :param profiler: A Profiler, to time the stages of every pass, the servo duty writes and the I2C transactions.
+        :param heap_manager: A HeapManager, to collect garbage between passes and report what the passes allocate.
+        :param sensing_period_ms: Sample the toggle switch and the proximity sensor on a thread of their own at this
+            period, see SensorSampler, instead of at the start of every pass. Not with gestures or a power_manager,
+            which use the sensor's bus from the controller.
         """
-        self.box = UselessBox(switch_pin, lid_pin, sda_pin, scl_pin, toggle_pin)
+        if sensing_period_ms is not None and (gestures or power_manager is not None):
+            raise ValueError("The sensing thread is the only user of the sensor bus: no gestures or power manager with it")
+        self.box = UselessBox(switch_pin, lid_pin, sda_pin, scl_pin, toggle_pin, proximity_int_pin, hardware_i2c, proximity_filter,
+                              self.GESTURE_DRAIN_MS if gestures else None)
         self.led = LED(led_pin)  # Initialize the onboard LED
         self.state = UselessBoxController.IDLE
         self.last_state = None
@@ -38,11 +156,33 @@ class UselessBoxController:
         self.switch_off_count = 0
         self.last_off_time = time.time()
         self.last_on_time = None
+        self.predictor = approach_predictor
+        self.predicted_ms = None  # sampled_ms of the last reading given to the predictor
+        self.staged_ms = 0
+        self.power_manager = power_manager
+        self.profiler = profiler
+        self.heap_manager = heap_manager
+        self.sampler = None
+        if sensing_period_ms is not None:
+            from sampler import SensorSampler  # Imports _thread, only when asked for
+            self.sampler = SensorSampler(self.box, sensing_period_ms)
+        # Inputs of the current pass, for the guards and actions of the state machine
+        self.switch_state = False
+        self.proximity = ProximityState.NO_DETECTION
+        self.gesture = APDS9960_DIR_NONE
+        self.machine = StateMachine(self, TRANSITIONS, STATE_NAMES, EVENT_NAMES)
 
     def run(self):
         """
         Main method to run the interactive sequences based on user input.
         """
+        self.box.home()  # Both arms at once, and not at all if they are home since a soft reset
+        if self.profiler is not None:
+            self.profiler.attach(self.box)
+        if self.sampler is not None:
+            self.sampler.start()
+        if self.heap_manager is not None:
+            self.heap_manager.boot()
         while True:
             self.update()
 
@@ -50,125 +190,201 @@ class UselessBoxController:
         """
         Updates the box's behavior based on the state of the toggle switch and proximity sensor.
         """
-        current_switch = self.box.get_switch_state()
-        proximity = self.box.get_proximity()
+        profiler = self.profiler
+        if profiler is not None:
+            started = lap = time.ticks_us()
+        sampler = self.sampler
+        if sampler is not None:
+            # The newest sample of the sensing thread, however long the last pass blocked
+            sampler.latest()
+            current_switch = sampler.switch
+        else:
+            current_switch = self.box.get_switch_state()
+        if profiler is not None:
+            lap = profiler.lap(STAGE_SWITCH, lap)
+        if sampler is not None:
+            proximity = sampler.proximity
+            predicted = self._approach_predicted()
+            gesture = APDS9960_DIR_NONE
+        else:
+            proximity = self.box.get_proximity()
+            predicted = self._approach_predicted()
+            gesture = self.box.get_gesture(proximity)
+        if profiler is not None:
+            lap = profiler.lap(STAGE_SENSOR, lap)
+            writes = profiler.counts[STAGE_DUTY]
 
         # Output proximity state only if it has changed
         if proximity != self.last_proximity:
-            print(f"Proximity state: {proximity}")
+            if __debug__:
+                log.record(EVT_PROXIMITY, proximity)
 
         # Output switch state only if it has changed
         if current_switch != self.last_switch_state:
-            print(f"Switch state: {'On' if current_switch else 'Off'}")
+            log.record(EVT_SWITCH, 1 if current_switch else 0)
 
             if current_switch:
                 self.last_on_time = time.time()
 
         if self.state != self.last_state:
-            print(f"State: {self.state}")
+            log.record(EVT_STATE, self.state)
 
         self.last_state = self.state
 
         # Check for interactions and update the state
         if current_switch and not self.last_switch_state:
-            self.state = UselessBoxController.SWITCH_OFF
-            self.led.on()  # Turn on the LED when the switch is turned on
-            self._random_delay()  # Introduce a random delay before switching off
-            self._handle_switch_off()
-            self._reset_inactivity_timer()
-
-        elif proximity == ProximityState.VERY_CLOSE and self.state == UselessBoxController.IDLE:
-            # Occasionally play peek-a-boo (5% chance)
-            if random.random() < UselessBoxController.PEEKABOO_PROBABILITY:
-                self.state = UselessBoxController.LID_OPEN
-                self._handle_peekaboo()
-                self._reset_inactivity_timer()
-            # Occasionally move the switch arm to a threatening position (20% chance)
-            elif random.random() < UselessBoxController.THREATEN_PROBABILITY:
-                print("Threatening to switch off!")
-                self._handle_threaten()
-                self._reset_inactivity_timer()
-            else:
-                print("Hand detected very close, but not playing peek-a-boo or threatening this time.")
-
-        elif proximity == ProximityState.CLOSE and self.state == UselessBoxController.IDLE:
-            if random.random() < 0.3:  # 30% chance of doing a fake-out
-                self._handle_fakeout()
-            else:
-                self.state = UselessBoxController.TEASING
-                self._handle_tease()
-            self._reset_inactivity_timer()
-
-        elif proximity == ProximityState.FAR and self.state != UselessBoxController.IDLE:
-            self.state = UselessBoxController.IDLE
-            self.led.off()  # Turn off the LED when returning to idle
-            self._handle_close_lid()
-            self._reset_inactivity_timer()
-
-        # If proximity is very close, ensure the lid stays closed and occasionally blink the LED
-        elif proximity == ProximityState.VERY_CLOSE:
-            if self.state != UselessBoxController.IDLE:
-                print("Hand too close, keeping the lid closed.")
-                self._handle_close_lid()
-                self.led.off()
-            # Occasionally do a peek-a-boo, even when proximity is very close, and blink the LED
-            elif random.random() < UselessBoxController.PEEKABOO_RARE_PROBABILITY:
-                self.led.toggle()  # Blink the LED occasionally
-                self.state = UselessBoxController.LID_OPEN
-                self._handle_peekaboo()
-                self._reset_inactivity_timer()
-
-        # If the switch is turned on for a long time, switch off automatically
-        if current_switch and self.state == UselessBoxController.IDLE and self.last_on_time is not None and time.time() - self.last_on_time > self.MAX_SWITCH_ON_TIME_SECS:
-            print("Switch has been on for a while. Turning it off automatically.")
-            self._handle_switch_off()
-
-        # Close the lid if it is open and there has been no interaction for the specified inactivity period
-        if time.time() - self.last_interaction_time > self.inactivity_timeout:
-            if self.state == UselessBoxController.LID_OPEN:
-                print("No interaction detected for a while. Closing the lid.")
-                self._handle_close_lid()
-
+            event = EV_SWITCH_ON
+        elif gesture != APDS9960_DIR_NONE:
+            event = EV_GESTURE
+        elif predicted:
+            event = EV_PREDICTED
+        else:
+            event = proximity
+        self.switch_state = current_switch
+        self.proximity = proximity
+        self.gesture = gesture
+        self.state = self.machine.dispatch(self.state, event)
+        self.state = self.machine.dispatch(self.state, EV_TIMER)
+
+        if profiler is not None:
+            lap = profiler.lap(STAGE_ACTUATION if profiler.counts[STAGE_DUTY] != writes else STAGE_LOGIC, lap)
         self.update_led_based_on_proximity(proximity)  # Update LED pattern based on proximity
+        if profiler is not None:
+            profiler.lap(STAGE_LED, lap)
+            profiler.lap(STAGE_PASS, started)
 
         self.last_switch_state = current_switch
         self.last_proximity = proximity
-        time.sleep(0.2)  # Small delay for responsiveness
+        if self.heap_manager is not None:
+            self.heap_manager.idle()  # Moves block until they end, so none plays between passes
+        if self.power_manager is None:
+            time.sleep_ms(200)  # Small delay for responsiveness
+        else:
+            idle = self.state == UselessBoxController.IDLE and not current_switch and proximity == ProximityState.NO_DETECTION
+            self.power_manager.pause(self.box, 200, idle)
 
-    def _random_delay(self):
+    # Guards of the state machine
+
+    def _stage_over(self):
+        return self.proximity <= ProximityState.FAR or time.ticks_diff(time.ticks_ms(), self.staged_ms) > self.STAGE_HOLD_MS
+
+    def _gesture_threatens(self):
+        return self.GESTURE_BEHAVIORS.get(self.gesture) == "threaten"
+
+    def _gesture_closes_lid(self):
+        return self.GESTURE_BEHAVIORS.get(self.gesture) == "close_lid"
+
+    def _roll_peekaboo(self):
+        return random.random() < self.PEEKABOO_PROBABILITY
+
+    def _roll_threaten(self):
+        return random.random() < self.THREATEN_PROBABILITY
+
+    def _roll_fakeout(self):
+        return random.random() < self.FAKEOUT_PROBABILITY
+
+    def _is_far(self):
+        return self.proximity == ProximityState.FAR
+
+    def _is_very_close(self):
+        return self.proximity == ProximityState.VERY_CLOSE
+
+    def _switch_on_too_long(self):
+        return self.switch_state and self.last_on_time is not None and time.time() - self.last_on_time > self.MAX_SWITCH_ON_TIME_SECS
+
+    def _inactive(self):
+        return time.time() - self.last_interaction_time > self.inactivity_timeout
+
+    # Actions of the state machine. The machine sets the next state, so they leave self.state alone.
+
+    def _on_switch_on(self):
+        staged = self.state == UselessBoxController.STAGED
+        self.led.on()  # Turn on the LED when the switch is turned on
+        if not staged:
+            self._random_delay()  # Introduce a random delay before switching off
+        self._handle_switch_off(staged)
+        self._reset_inactivity_timer()
+
+    def _on_stand_down(self):
+        log.record(EVT_STAND_DOWN)
+        self._handle_close_lid()
+        self._reset_inactivity_timer()
+
+    def _on_gesture(self):
+        self._handle_gesture(self.gesture)
+        self._reset_inactivity_timer()
+
+    def _on_stage(self):
+        self._handle_stage()
+
+    def _on_peekaboo(self):
+        self._handle_peekaboo()
+        self._reset_inactivity_timer()
+
+    def _on_threaten(self):
+        log.record(EVT_THREATEN)
+        self._handle_threaten()
+        self._reset_inactivity_timer()
+
+    def _on_hold_back(self):
+        log.record(EVT_HOLD_BACK)
+
+    def _on_fakeout(self):
+        self._handle_fakeout()
+        self._reset_inactivity_timer()
+
+    def _on_tease(self):
+        self._handle_tease()
+        self._reset_inactivity_timer()
+
+    def _on_return_to_idle(self):
+        self.led.off()  # Turn off the LED when returning to idle
+        self._handle_close_lid()
+        self._reset_inactivity_timer()
+
+    def _on_keep_closed(self):
+        # A hand very close keeps the lid closed
+        log.record(EVT_KEEP_CLOSED)
+        self._handle_close_lid()
+        self.led.off()
+
+    def _on_switch_on_too_long(self):
+        log.record(EVT_SWITCH_ON_TOO_LONG)
+        self._handle_switch_off()
+
+    def _on_inactive(self):
+        log.record(EVT_INACTIVE)
+        self._handle_close_lid()
+
+    def _approach_predicted(self):
         """
-        Introduces a random delay before taking action after the switch is turned on.
-        Short delays are more common, with longer delays being rarer.
-        """
-        random_value = random.uniform(0, 1)
-        if random_value < 0.3:
-            chosen_delay = 0.5
-        elif random_value < 0.6:
-            chosen_delay = 1.0
-        elif random_value < 0.8:
-            chosen_delay = 1.5
-        elif random_value < 0.9:
-            chosen_delay = 2.0
-        elif random_value < 0.95:
-            chosen_delay = 3.0
-        else:
-            chosen_delay = 5.0
+        Gives the predictor the raw reading of the last proximity bus read, if it has not seen it yet.
+        :return: True if the predictor expects the switch to be flipped soon.
+        """
+        sensor = self.sampler if self.sampler is not None else self.box.proximity_sensor
+        if self.predictor is None or sensor.sampled_ms is None or sensor.sampled_ms == self.predicted_ms:
+            return False
+        self.predicted_ms = sensor.sampled_ms
+        return self.predictor.update(sensor.raw, sensor.sampled_ms)
 
-        print(f"Introducing a delay of {chosen_delay} seconds.")
-        time.sleep(chosen_delay)
+    def _random_delay(self):
+        """
+        Introduces a random delay before taking action after the switch is turned on, see random_delay.
+        """
+        time.sleep(random_delay())
 
     def update_led_based_on_proximity(self, proximity):
-        if proximity == ProximityState.VERY_CLOSE:
-            self.led.on() if time.time() % 1 < 0.5 else self.led.off()  # Blink slowly
-        elif proximity == ProximityState.CLOSE:
-            self.led.on() if time.time() % 0.2 < 0.1 else self.led.off()  # Blink quickly
-        else:
-            self.led.off()
+        """
+        Shows the LED pattern of the proximity, or breathes while staged. The LED runs the pattern on its
+        own, so the LED only changes when the pattern does, however long the passes take.
+        """
+        self.led.show(PATTERN_BREATHE if self.state == UselessBoxController.STAGED else self.PROXIMITY_PATTERNS[proximity])
 
-    def _handle_switch_off(self):
+    def _handle_switch_off(self, staged=False):
         """
         Handles the switch toggle interaction.
         Ensures the switch is actually turned off by the arm.
+        :param staged: The lid is already open and the arm close to the switch, see _handle_stage.
         """
         current_time = time.time()
         if current_time - self.last_off_time < 3:
@@ -182,92 +398,107 @@ class UselessBoxController:
             self.switch_off_count = 0
             return
 
-        print("Switch turned on, attempting to turn it off.")
-        self.box.open_lid(100, 500)
-        time.sleep(0.5)  # Small delay to give a visual effect of the lid opening
+        log.record(EVT_SWITCH_OFF)
+        planner = self.box.planner
 
         # Attempt to turn off the switch
         for attempt in range(3):
-            print(f"Attempt {attempt + 1} to switch off.")
-            self.box.switch_arm.extend(100, 500)  # Move the switch arm fully to turn the switch off
-            time.sleep(0.5)  # Hold position to ensure it engages
-            self.box.switch_arm.retract(100, 500)  # Retract the switch arm after switching off
+            if __debug__:
+                log.record(EVT_ATTEMPT, attempt + 1)
+            # Stops as soon as the switch reads off, or holds a moment at the end of the stroke
+            if attempt == 0 and not staged:
+                # The switch arm starts as soon as the lid is open far enough
+                planner.open_and_push(self.box.toggle_switch, 500, 500)
+            else:
+                self.box.switch_arm.push(self.box.toggle_switch, 500)
 
             # Recheck the switch state after attempting to turn it off
             if not self.box.get_switch_state():
-                print("Switch successfully turned off.")
+                log.record(EVT_SWITCHED_OFF, attempt + 1)
                 break
-            else:
-                print("Switch still on, retrying...")
+            log.record(EVT_STILL_ON, attempt + 1)
+            self.box.switch_arm.retract(100, 500)
 
-        self.box.close_lid(100, 500)  # Close the lid fully
+        # The lid starts closing as soon as the switch arm is back inside the box
+        planner.retract_and_close(100, 500, 100, 500, "switch_off")
         self.led.off()  # Turn off the LED after handling the toggle
-        self.state = UselessBoxController.IDLE
+
+    def _handle_stage(self):
+        """
+        Opens the lid and moves the switch arm close to the switch, because a hand is about to flip it.
+        """
+        log.record(EVT_STAGE)
+        self.box.open_lid(100, 300)
+        self.box.switch_arm.extend(self.STAGE_PERCENTAGE, 300)
+        self.staged_ms = time.ticks_ms()
+
+    def _handle_gesture(self, gesture):
+        """
+        Plays the behavior of a gesture. Only closing the lid interrupts the box when it is not idle.
+        """
+        behavior = self.GESTURE_BEHAVIORS.get(gesture)
+        log.record(EVT_GESTURE, gesture)
+        if behavior == "close_lid" or (behavior and self.state == UselessBoxController.IDLE):
+            getattr(self, "_handle_" + behavior)()
 
     def _handle_peekaboo(self):
         """
         Handles the peek-a-boo interaction.
         """
         self.box.play_peekaboo()
-        self.state = UselessBoxController.IDLE
 
     def _handle_tease(self):
         """
         Handles the teasing interaction with a random lid angle.
         """
         random_angle = random.randint(50, 100)  # Randomly choose an angle between 50% and 100%
-        print(f"Teasing with lid opening to {random_angle}%")
+        log.record(EVT_TEASE, random_angle)
         self.box.open_lid(random_angle, 500)
         time.sleep(0.5)
         self.box.close_lid(0, 500)
-        self.state = UselessBoxController.IDLE
     def _handle_threaten(self):
         """
         Handles the threatening movement of the switch arm.
         Ensures the lid is open before threatening.
         """
         if not self.box.lid_arm.is_open():  # Check if the lid is already open
-            self.box.open_lid(100, 500)  # Open the lid fully if it's not
-
-        self.box.switch_arm.extend(50, 300)  # Move arm halfway as if threatening to switch
+            # Open the lid fully, moving the arm halfway as if threatening to switch once the lid is clear
+            self.box.planner.open_and_extend(100, 500, 50, 300, "threaten")
+        else:
+            self.box.switch_arm.extend(50, 300)  # Move arm halfway as if threatening to switch
         time.sleep(0.5)
         self.box.switch_arm.retract(50, 300)
-        self.state = UselessBoxController.LID_OPEN  # Set state to LID_OPEN
 
     def _handle_close_lid(self):
         """
         Handles closing the lid when no hand is detected close or after inactivity.
         Ensures the switch arm is retracted before closing the lid.
         """
-        print("Retracting switch arm and closing lid.")
-        self.box.switch_arm.retract(100, 300)  # Ensure the switch arm is fully retracted
-        self.box.close_lid(100, 500)  # Fully close the lid (100%)
-        self.state = UselessBoxController.IDLE
+        log.record(EVT_CLOSE_LID)
+        # Ensure the switch arm is retracted before the lid closes fully
+        self.box.planner.retract_and_close(100, 300, 100, 500, "close_lid")
 
     def _handle_fakeout(self):
         """
         Handles a fake-out interaction where the lid opens slightly and then closes quickly.
         """
-        print("Fake-out! Opening lid slightly...")
+        log.record(EVT_FAKEOUT)
         self.box.open_lid(30, 300)  # Open lid to 30% quickly
         time.sleep(0.3)
-        print("Closing quickly!")
         self.box.close_lid(0, 200)  # Close lid quickly
-        self.state = UselessBoxController.IDLE
 
     def _handle_panic_mode(self):
         """
-        Handles a panic mode where the box rapidly opens and closes the lid while blinking the LED.
+        Handles a panic mode where the box rapidly opens and closes the lid while strobing the LED.
         """
-        print("Entering panic mode!")
+        log.record(EVT_PANIC)
+        self.led.show(PATTERN_STROBE)
         for _ in range(5):
             self.box.open_lid(100, 200)
-            self.led.toggle()
             time.sleep(0.2)
             self.box.close_lid(0, 200)
-            self.led.toggle()
             time.sleep(0.2)
-        self.state = UselessBoxController.IDLE
+        self.led.off()
 
     def _reset_inactivity_timer(self):
         """
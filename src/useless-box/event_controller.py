@@ -0,0 +1,168 @@
+from micropython import const
+from time import ticks_ms
+from apds9960.const import APDS9960_DIR_NONE
+from async_controller import AsyncUselessBoxController
+from events import EventQueue, TimerWheel, EVENT_NONE, EVENT_SWITCH, EVENT_PROXIMITY, EVENT_BEHAVIOR_DONE
+from proximity import ProximityState
+
+try:
+    import asyncio
+except ImportError:
+    import uasyncio as asyncio
+
+# Timer wheel slots
+TIMER_INACTIVITY = const(0)
+TIMER_SWITCH_ON = const(1)
+TIMER_TICK = const(2)
+TIMER_PROXIMITY_POLL = const(3)
+TIMER_GESTURE = const(4)
+TIMER_COUNT = const(5)
+
+class EventDrivenUselessBoxController(AsyncUselessBoxController):
+    TICK_MS = 200  # Random behaviors are rolled at the old polling rate while a hand is near
+    PROXIMITY_POLL_MS = 100  # Used when the sensor interrupt line is not wired
+    PROXIMITY_SETTLE_MS = 20  # Polling while the proximity filter has not caught up with the reading
+    GESTURE_DRAIN_MS = 50  # While a hand is in range
+
+    def __init__(self, switch_pin, lid_pin, sda_pin, scl_pin, toggle_pin, led_pin, inactivity_timeout=5, proximity_int_pin=None, hardware_i2c=False, proximity_filter=None, approach_predictor=None, gestures=False):
+        """
+        Runs the asynchronous controller from interrupts instead of polling.
+        The toggle switch and the APDS-9960 interrupt line push events into a ring buffer, deadlines
+        (inactivity, switch left on) live in a timer wheel, and the loop sleeps until either has
+        something to do. The LED runs its blink patterns on its own, so it needs no deadline.
+        Parameters are the same as for UselessBoxController; without proximity_int_pin the sensor is polled.
+        """
+        super().__init__(switch_pin, lid_pin, sda_pin, scl_pin, toggle_pin, led_pin, inactivity_timeout, proximity_int_pin, hardware_i2c, proximity_filter, approach_predictor, gestures)
+        self.proximity_int_pin = proximity_int_pin
+        self.events = EventQueue()
+        self.timers = TimerWheel(TIMER_COUNT)
+        self.wakeup = asyncio.ThreadSafeFlag()
+        self.proximity = ProximityState.NO_DETECTION
+        self.pending_gesture = APDS9960_DIR_NONE  # Completed gesture waiting for the next react
+
+    def _on_switch_irq(self, pin):
+        self.events.push(EVENT_SWITCH, pin.value())
+        self.wakeup.set()
+
+    def _on_proximity_irq(self, pin):
+        self.events.push(EVENT_PROXIMITY)
+        self.wakeup.set()
+
+    async def run_async(self):
+        self.box.toggle_switch.on_change(self._on_switch_irq)
+        if self.proximity_int_pin is not None:
+            self.box.proximity_sensor.enable_interrupt(self.proximity_int_pin, self._on_proximity_irq)
+        else:
+            self.timers.set(TIMER_PROXIMITY_POLL, self.PROXIMITY_POLL_MS)
+
+        self.proximity = self.box.get_proximity()
+        self._react()
+
+        while True:
+            self.drain()
+            timeout = self.timers.next_timeout(ticks_ms())
+            if timeout < 0:
+                await self.wakeup.wait()
+            elif timeout > 0:
+                try:
+                    await asyncio.wait_for_ms(self.wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+
+    def drain(self):
+        """
+        Handles all queued events and expired timers.
+        """
+        react = False
+
+        kind = self.events.pop()
+        while kind != EVENT_NONE:
+            if kind == EVENT_PROXIMITY:
+                self.proximity = self.box.get_proximity()
+            # Switch edges are handled by re-reading the pin level, so contact bounce collapses into one pass
+            react = True
+            kind = self.events.pop()
+
+        now = ticks_ms()
+        timer = self.timers.pop_expired(now)
+        while timer >= 0:
+            if timer == TIMER_GESTURE:
+                gesture = self.box.get_gesture(self.proximity)
+                if gesture != APDS9960_DIR_NONE:
+                    self.pending_gesture = gesture
+                    react = True
+            elif timer == TIMER_PROXIMITY_POLL:
+                proximity = self.box.get_proximity()
+                if proximity != self.proximity:
+                    self.proximity = proximity
+                    react = True
+            else:
+                react = True
+            timer = self.timers.pop_expired(now)
+
+        if not self.timers.is_set(TIMER_PROXIMITY_POLL):
+            # INT only falls once per crossing, so a reading still making its way through the filter is polled
+            if not self.box.proximity_sensor.settled:
+                self.timers.set(TIMER_PROXIMITY_POLL, self.PROXIMITY_SETTLE_MS)
+            elif self.proximity_int_pin is None:
+                self.timers.set(TIMER_PROXIMITY_POLL, self.PROXIMITY_POLL_MS)
+
+        if react:
+            self._react()
+        self._schedule()
+
+    def _react(self):
+        gesture = self.pending_gesture
+        self.pending_gesture = APDS9960_DIR_NONE
+        self.react(self.box.get_switch_state(), self.proximity, gesture)
+
+    def _schedule(self):
+        """
+        Arms the timers needed for the current switch state and proximity.
+        """
+        near = self.proximity == ProximityState.VERY_CLOSE or self.proximity == ProximityState.CLOSE
+        if near:
+            if not self.timers.is_set(TIMER_TICK):
+                self.timers.set(TIMER_TICK, self.TICK_MS)
+        else:
+            self.timers.cancel(TIMER_TICK)
+
+        # The gesture FIFO is drained while a hand is in range and until the gesture it started is read
+        if self.box.gesture_drain_ms is not None and (self.proximity != ProximityState.NO_DETECTION or self.box.components.get("gesture_sensor").streaming):
+            if not self.timers.is_set(TIMER_GESTURE):
+                self.timers.set(TIMER_GESTURE, self.GESTURE_DRAIN_MS)
+        else:
+            self.timers.cancel(TIMER_GESTURE)
+
+        if self.last_switch_state:
+            if not self.timers.is_set(TIMER_SWITCH_ON):
+                self.timers.set(TIMER_SWITCH_ON, (self.MAX_SWITCH_ON_TIME_SECS + 1) * 1000)
+        else:
+            self.timers.cancel(TIMER_SWITCH_ON)
+
+    def _start(self, coroutine):
+        super()._start(self._notify_when_done(coroutine))
+
+    async def _notify_when_done(self, coroutine):
+        try:
+            await coroutine
+        finally:
+            self.events.push(EVENT_BEHAVIOR_DONE)
+            self.wakeup.set()
+
+    def _reset_inactivity_timer(self):
+        super()._reset_inactivity_timer()
+        self.timers.set(TIMER_INACTIVITY, (self.inactivity_timeout + 1) * 1000)
+
+if __name__ == "__main__":
+    controller = EventDrivenUselessBoxController(
+        switch_pin=0,
+        lid_pin=2,
+        sda_pin=6,
+        scl_pin=7,
+        toggle_pin=21,
+        led_pin=8,
+        inactivity_timeout=5,
+        proximity_int_pin=None  # Set to the GPIO wired to the APDS-9960 INT line
+    )
+    controller.run()
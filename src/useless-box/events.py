@@ -0,0 +1,110 @@
+from array import array
+from micropython import const
+from time import ticks_ms, ticks_diff, ticks_add
+
+# Event kinds
+EVENT_NONE = const(0)
+EVENT_SWITCH = const(1)  # Toggle switch edge, value is the pin level
+EVENT_PROXIMITY = const(2)  # APDS-9960 interrupt line asserted
+EVENT_TIMER = const(3)  # Timer wheel deadline expired, value is the timer id
+EVENT_BEHAVIOR_DONE = const(4)  # A background behavior finished
+
+class EventQueue:
+    def __init__(self, size=16):
+        """
+        Fixed-size ring buffer of events, safe to push to from an interrupt handler.
+        Nothing is allocated after construction.
+        :param size: Maximum number of events waiting to be drained.
+        """
+        self.size = size
+        self.kinds = bytearray(size)
+        self.values = array('i', bytearray(4 * size))
+        self.times = array('i', bytearray(4 * size))
+        self.head = 0  # Next slot to write
+        self.tail = 0  # Next slot to read
+        self.dropped = 0
+        self.value = 0  # Value of the last popped event
+        self.time = 0  # Time (ticks_ms) of the last popped event
+
+    def push(self, kind, value=0):
+        """
+        Adds an event to the queue.
+        :param kind: One of the EVENT_* kinds.
+        :param value: Small integer payload.
+        :return: False if the queue was full and the event was dropped.
+        """
+        head = self.head
+        next_head = head + 1 if head + 1 < self.size else 0
+        if next_head == self.tail:
+            self.dropped += 1
+            return False
+        self.kinds[head] = kind
+        self.values[head] = value
+        self.times[head] = ticks_ms()
+        self.head = next_head
+        return True
+
+    def pop(self):
+        """
+        Removes the oldest event from the queue.
+        Its payload and timestamp are left in the value and time attributes.
+        :return: The event kind, or EVENT_NONE if the queue is empty.
+        """
+        tail = self.tail
+        if tail == self.head:
+            return EVENT_NONE
+        self.value = self.values[tail]
+        self.time = self.times[tail]
+        self.tail = tail + 1 if tail + 1 < self.size else 0
+        return self.kinds[tail]
+
+    def __len__(self):
+        return (self.head - self.tail) % self.size
+
+class TimerWheel:
+    def __init__(self, count):
+        """
+        A fixed set of one-shot deadlines, one slot per timer id.
+        :param count: Number of timer ids (0 to count - 1).
+        """
+        self.deadlines = array('i', bytearray(4 * count))
+        self.active = bytearray(count)
+
+    def set(self, timer, delay_ms):
+        """
+        Arms a timer, replacing any deadline it already had.
+        :param timer: The timer id.
+        :param delay_ms: Milliseconds from now until the timer expires.
+        """
+        self.deadlines[timer] = ticks_add(ticks_ms(), int(delay_ms))
+        self.active[timer] = 1
+
+    def cancel(self, timer):
+        self.active[timer] = 0
+
+    def is_set(self, timer):
+        return self.active[timer] == 1
+
+    def next_timeout(self, now):
+        """
+        Returns the milliseconds until the earliest deadline (0 if one already expired), or -1 if no timer is armed.
+        """
+        timeout = -1
+        for timer in range(len(self.active)):
+            if self.active[timer]:
+                remaining = ticks_diff(self.deadlines[timer], now)
+                if remaining <= 0:
+                    return 0
+                if timeout < 0 or remaining < timeout:
+                    timeout = remaining
+        return timeout
+
+    def pop_expired(self, now):
+        """
+        Disarms and returns the id of an expired timer, or -1 if none has expired.
+        """
+        for timer in range(len(self.active)):
+            if self.active[timer] and ticks_diff(self.deadlines[timer], now) <= 0:
+                self.active[timer] = 0
+                return timer
+        return -1
@@ -0,0 +1,137 @@
+import math
+from array import array
+from time import ticks_diff
+
+class SampleHistory:
+    def __init__(self, size):
+        """
+        Fixed-size ring buffer of 8 to 16-bit samples, allocated once.
+        :param size: Number of samples kept; older samples are overwritten.
+        """
+        self.samples = array('H', bytearray(2 * size))
+        self.size = size
+        self.count = 0
+        self.next = 0
+
+    def push(self, value):
+        self.samples[self.next] = value
+        self.next = (self.next + 1) % self.size
+        if self.count < self.size:
+            self.count += 1
+
+    def latest(self, age=0):
+        """
+        Returns a recent sample.
+        :param age: 0 for the newest sample, 1 for the one before, and so on.
+        """
+        if age >= self.count:
+            raise IndexError("Only {} samples".format(self.count))
+        return self.samples[(self.next - 1 - age) % self.size]
+
+    def copy_into(self, target):
+        """
+        Copies the samples, oldest first, into an array without allocating.
+        :return: The number of samples copied.
+        """
+        start = self.next - self.count
+        for i in range(self.count):
+            target[i] = self.samples[(start + i) % self.size]
+        return self.count
+
+    def clear(self):
+        self.count = 0
+        self.next = 0
+
+    def __len__(self):
+        return self.count
+
+class MedianFilter:
+    def __init__(self, window=3):
+        """
+        Median of the last samples: drops single-sample spikes, and steps pass through after window // 2 + 1 samples.
+        :param window: Number of samples, odd.
+        """
+        self.window = SampleHistory(window)
+        self.sorted = array('H', bytearray(2 * window))
+
+    def update(self, value, now_ms):
+        """
+        Adds a sample. All filters share this method, so ProximitySensor can take any of them.
+        :param value: The raw sample.
+        :param now_ms: time.ticks_ms() of the sample.
+        :return: The filtered value.
+        """
+        self.window.push(value)
+        count = self.window.copy_into(self.sorted)
+        ordered = self.sorted
+        # Insertion sort, the window is tiny
+        for i in range(1, count):
+            item = ordered[i]
+            j = i - 1
+            while j >= 0 and ordered[j] > item:
+                ordered[j + 1] = ordered[j]
+                j -= 1
+            ordered[j + 1] = item
+        return ordered[count // 2]
+
+    def reset(self):
+        self.window.clear()
+
+class EmaFilter:
+    def __init__(self, alpha=0.5):
+        """
+        Exponential moving average.
+        :param alpha: Weight of the newest sample (0 to 1); lower is smoother and slower.
+        """
+        self.alpha = alpha
+        self.value = None
+
+    def update(self, value, now_ms):
+        if self.value is None:
+            self.value = value
+        else:
+            self.value += self.alpha * (value - self.value)
+        return self.value
+
+    def reset(self):
+        self.value = None
+
+class OneEuroFilter:
+    def __init__(self, min_cutoff=1.0, beta=0.05, d_cutoff=1.0):
+        """
+        One-euro filter (Casiez et al.): a low-pass filter whose cutoff rises with the speed of the
+        signal, so a resting hand is smoothed heavily while an approaching hand is followed closely.
+        :param min_cutoff: Cutoff frequency in Hz while the reading does not change.
+        :param beta: How much the cutoff rises per unit/second of change.
+        :param d_cutoff: Cutoff frequency in Hz of the speed estimate.
+        """
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.d_cutoff = d_cutoff
+        self.reset()
+
+    def reset(self):
+        self.value = None
+        self.speed = 0
+        self.last_ms = None
+
+    @staticmethod
+    def _alpha(dt, cutoff):
+        tau = 1 / (2 * math.pi * cutoff)
+        return 1 / (1 + tau / dt)
+
+    def update(self, value, now_ms):
+        if self.value is None:
+            self.value = value
+            self.last_ms = now_ms
+            return self.value
+        dt = ticks_diff(now_ms, self.last_ms) / 1000
+        if dt <= 0:
+            return self.value
+        self.last_ms = now_ms
+
+        speed = (value - self.value) / dt
+        self.speed += self._alpha(dt, self.d_cutoff) * (speed - self.speed)
+        cutoff = self.min_cutoff + self.beta * abs(self.speed)
+        self.value += self._alpha(dt, cutoff) * (value - self.value)
+        return self.value
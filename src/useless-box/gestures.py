@@ -0,0 +1,144 @@
+from time import ticks_ms, ticks_diff
+from apds9960.const import *
+
+FIFO_DEPTH = 32  # Datasets of four bytes (up, down, left, right)
+DATASET_BYTES = 4
+WAIT_TIMES_MS = (0, 2.8, 5.6, 8.4, 14, 22.4, 30.8, 39.2)  # GWTIME settings of GCONF2
+CYCLE_MS = 1.4  # Gesture pulses and conversion of one dataset, without the wait time
+
+GESTURE_NAMES = {
+    APDS9960_DIR_LEFT: "left",
+    APDS9960_DIR_RIGHT: "right",
+    APDS9960_DIR_UP: "up",
+    APDS9960_DIR_DOWN: "down",
+    APDS9960_DIR_NEAR: "near",
+    APDS9960_DIR_FAR: "far",
+}
+
+def wait_time_for(drain_ms):
+    """
+    Picks the shortest gesture wait time that keeps the FIFO from overflowing between two drains.
+    :param drain_ms: Longest time between two drains.
+    :return: GWTIME setting, an index into WAIT_TIMES_MS.
+    """
+    for setting, wait_ms in enumerate(WAIT_TIMES_MS):
+        # Half the FIFO is the margin for a late drain
+        if (wait_ms + CYCLE_MS) * FIFO_DEPTH >= drain_ms * 2:
+            return setting
+    return len(WAIT_TIMES_MS) - 1
+
+class GesturePipeline:
+    THRESHOLD = 10  # A dataset counts when all four photodiodes read more than this
+    SENSITIVITY = 50  # Minimum change of the up/down or left/right ratio (in %) for a swipe
+    DEPTH_RATIO = 2  # Total reading growing (or shrinking) this much without a swipe is near (far)
+
+    def __init__(self, proximity_sensor, drain_ms=200):
+        """
+        Reads APDS-9960 gestures without blocking: the gesture FIFO is drained with one burst per
+        call to poll and decoded on the fly, without storing the datasets.
+        The sensor switches between its proximity and gesture engines by itself, entering gesture
+        mode while a hand is close; while datasets stream in, the proximity reading is frozen, so
+        UselessBox.get_proximity returns the last state instead of reading it.
+        :param proximity_sensor: The ProximitySensor, whose bus and driver are shared.
+        :param drain_ms: Longest expected time between calls to poll, to size the FIFO fill rate.
+        """
+        self.proximity_sensor = proximity_sensor
+        self.bus = proximity_sensor.bus
+        self.address = proximity_sensor.sensor.address
+        self.status = bytearray(2)  # GFLVL and GSTATUS, read in one burst
+        self.fifo = bytearray(FIFO_DEPTH * DATASET_BYTES)
+        # The burst reads as many bytes as the buffer holds, so there is a view for every FIFO level,
+        # made once instead of slicing one on every drain
+        fifo_view = memoryview(self.fifo)
+        self.fifo_views = tuple(fifo_view[:level * DATASET_BYTES] for level in range(FIFO_DEPTH + 1))
+
+        self.wait_time = wait_time_for(drain_ms)
+        self.gap_ms = max(50, 3 * int(WAIT_TIMES_MS[self.wait_time] + CYCLE_MS))  # No data this long ends a gesture
+        sensor = proximity_sensor.sensor
+        sensor.setGestureWaitTime(self.wait_time)
+        # Interrupts stay off, the INT line keeps signalling proximity changes only
+        sensor.enableGestureSensor(interrupts=False)
+
+        self.decoded = 0
+        self.overflows = 0
+        self.transactions = 0
+        self._reset()
+
+    def _reset(self):
+        self.datasets = 0
+        self.first_ud = self.first_lr = self.first_sum = 0
+        self.last_ud = self.last_lr = self.last_sum = 0
+        self.overflowed = False
+        self.last_data_ms = 0
+
+    @property
+    def streaming(self):
+        """
+        True while a gesture is being read, so the proximity engine is not running.
+        """
+        return self.datasets > 0
+
+    def poll(self):
+        """
+        Drains the gesture FIFO and finishes the gesture when no more datasets arrive.
+        :return: The APDS9960_DIR_* of a completed gesture, or APDS9960_DIR_NONE.
+        """
+        self.bus.readfrom_mem_into(self.address, APDS9960_REG_GFLVL, self.status)
+        self.transactions += 1
+        level = self.status[0]
+        now = ticks_ms()
+        if self.status[1] & APDS9960_BIT_GFOV:
+            # Datasets were lost, so the start or end of the movement is missing
+            self.overflowed = True
+
+        if level:
+            level = min(level, FIFO_DEPTH)
+            self.bus.readfrom_mem_into(self.address, APDS9960_REG_GFIFO_U, self.fifo_views[level])
+            self.transactions += 1
+            self._feed(level * DATASET_BYTES)
+            self.last_data_ms = now
+            return APDS9960_DIR_NONE
+
+        if self.datasets and ticks_diff(now, self.last_data_ms) >= self.gap_ms:
+            gesture = APDS9960_DIR_NONE if self.overflowed else self._decode()
+            if self.overflowed:
+                self.overflows += 1
+            elif gesture != APDS9960_DIR_NONE:
+                self.decoded += 1
+            self._reset()
+            return gesture
+        return APDS9960_DIR_NONE
+
+    def _feed(self, count):
+        fifo = self.fifo
+        threshold = self.THRESHOLD
+        for i in range(0, count, DATASET_BYTES):
+            up, down, left, right = fifo[i], fifo[i + 1], fifo[i + 2], fifo[i + 3]
+            if up <= threshold or down <= threshold or left <= threshold or right <= threshold:
+                continue
+            ud = (up - down) * 100 // (up + down)
+            lr = (left - right) * 100 // (left + right)
+            total = up + down + left + right
+            if not self.datasets:
+                self.first_ud, self.first_lr, self.first_sum = ud, lr, total
+            self.last_ud, self.last_lr, self.last_sum = ud, lr, total
+            self.datasets += 1
+
+    def _decode(self):
+        """
+        Compares the first and last dataset: the hand moved towards the photodiode that ended up
+        reading more, or straight towards or away from the sensor if none did.
+        """
+        if self.datasets < 2:
+            return APDS9960_DIR_NONE
+        ud = self.last_ud - self.first_ud
+        lr = self.last_lr - self.first_lr
+        if abs(ud) >= abs(lr) and abs(ud) >= self.SENSITIVITY:
+            return APDS9960_DIR_UP if ud > 0 else APDS9960_DIR_DOWN
+        if abs(lr) >= self.SENSITIVITY:
+            return APDS9960_DIR_LEFT if lr > 0 else APDS9960_DIR_RIGHT
+        if self.last_sum >= self.first_sum * self.DEPTH_RATIO:
+            return APDS9960_DIR_NEAR
+        if self.first_sum >= self.last_sum * self.DEPTH_RATIO:
+            return APDS9960_DIR_FAR
+        return APDS9960_DIR_NONE
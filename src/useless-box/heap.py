@@ -0,0 +1,123 @@
+import gc
+from time import ticks_ms, ticks_diff
+from telemetry import log, EVT_COLLECT, EVT_UNPLANNED_COLLECT
+
+class HeapManager:
+    COLLECT_AFTER_BYTES = 8192  # Collect at the next idle point once this much was allocated since the last collection
+
+    def __init__(self, report_after=1000, collect_after_bytes=COLLECT_AFTER_BYTES):
+        """
+        Keeps garbage collection out of servo moves, and measures what the controller allocates.
+        MicroPython collects when an allocation does not fit the heap, which can be in the middle of
+        a move. The controller calls idle between passes, when no move plays, and the heap is
+        collected there once collect_after_bytes were allocated, long before it fills up.
+        idle also adds up the bytes allocated per pass: the steady state should allocate none.
+        :param report_after: Print a heap report after this many passes, besides the one after boot, or 0 for none.
+        :param collect_after_bytes: Bytes allocated since the last collection before idle collects.
+        """
+        self.report_after = report_after
+        self.collect_after_bytes = collect_after_bytes
+        self.passes = 0
+        self.allocated = 0  # Bytes allocated by the passes since boot
+        self.collections = 0
+        self.collect_ms_max = 0
+        self.unplanned = 0  # Collections idle did not do, seen as the heap shrinking between two passes
+        self.last_alloc = 0
+        self.collected_alloc = 0  # gc.mem_alloc after the last collection
+
+    def boot(self):
+        """
+        Collects what booting left behind and prints the first report. Call it once the box is homed.
+        """
+        self.collect()
+        self.report("after boot")
+
+    def idle(self):
+        """
+        Counts a pass and collects if enough was allocated. Call it between passes, with no move playing.
+        """
+        self.passes += 1
+        allocated = gc.mem_alloc()
+        if allocated >= self.last_alloc:
+            self.allocated += allocated - self.last_alloc
+        else:
+            # Something collected during the pass: the heap filled up, or gc.threshold was reached
+            self.unplanned += 1
+            log.record(EVT_UNPLANNED_COLLECT, self.passes)
+            self.collected_alloc = allocated
+        self.last_alloc = allocated
+
+        if allocated - self.collected_alloc >= self.collect_after_bytes:
+            self.collect()
+            self.last_alloc = gc.mem_alloc()
+        if self.passes == self.report_after:
+            self.report(f"after {self.passes} passes")
+
+    def collect(self):
+        """
+        Collects now and records how long it took.
+        """
+        start = ticks_ms()
+        gc.collect()
+        elapsed_ms = ticks_diff(ticks_ms(), start)
+        self.collections += 1
+        self.collect_ms_max = max(self.collect_ms_max, elapsed_ms)
+        self.collected_alloc = gc.mem_alloc()
+        if __debug__:
+            log.record(EVT_COLLECT, elapsed_ms, min(self.collected_alloc // 1024, 32767))
+
+    @staticmethod
+    def largest_block():
+        """
+        Finds the largest allocatable block by trial allocations, and collects their garbage.
+        :return: Size of the largest free block in bytes.
+        """
+        low, high = 0, gc.mem_free()
+        while low < high:
+            size = (low + high + 1) // 2
+            try:
+                bytearray(size)
+                low = size
+            except MemoryError:
+                high = size - 1
+        gc.collect()
+        return low
+
+    def stats(self):
+        """
+        Returns the heap use and what the passes allocated.
+        :return: Dictionary with free and allocated bytes, the largest free block, the fragmentation
+            percentage (free memory not in the largest block), bytes allocated per pass, the number of
+            collections and the longest one in milliseconds, and the collections idle did not do.
+        """
+        gc.collect()
+        free = gc.mem_free()
+        largest = self.largest_block()
+        return {
+            "free": free,
+            "allocated": gc.mem_alloc(),
+            "largest_block": largest,
+            "fragmentation_pct": round(100 - largest * 100 / free, 1) if free else 0,
+            "bytes_per_pass": round(self.allocated / self.passes, 1) if self.passes else 0,
+            "collections": self.collections,
+            "collect_ms_max": self.collect_ms_max,
+            "unplanned_collections": self.unplanned,
+        }
+
+    def report(self, when):
+        """
+        Prints the heap use and what the passes allocated.
+        :param when: Printed with the report, e.g. "after boot".
+        """
+        stats = self.stats()
+        print(f"Heap {when}: {stats['free']} bytes free, {stats['allocated']} allocated, largest free block {stats['largest_block']} "
+              f"({stats['fragmentation_pct']}% fragmented). {stats['bytes_per_pass']} bytes allocated per pass over {self.passes} passes, "
+              f"{stats['collections']} collections of up to {stats['collect_ms_max']} ms, {stats['unplanned_collections']} unplanned")
+        # largest_block collected, and the report's own strings are not allocated by a pass
+        self.collected_alloc = self.last_alloc = gc.mem_alloc()
+
+if __name__ == "__main__":
+    manager = HeapManager(report_after=100)
+    manager.boot()
+    for i in range(100):
+        manager.idle()
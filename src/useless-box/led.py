@@ -1,35 +1,100 @@
-from machine import Pin
+from array import array
+from machine import Pin, PWM, Timer
+from micropython import const
+from states import (PATTERN_OFF, PATTERN_ON, PATTERN_BLINK_SLOW, PATTERN_BLINK_FAST, PATTERN_BREATHE, PATTERN_STROBE,
+                    PATTERN_NAMES)
+from telemetry import log, EVT_LED
+
+# PWM frequency in Hz and lit part of the period (out of 65535) of every pattern. The PWM channel
+# renders BLINK_FAST and the strobe on its own. The ESP32-C3 LEDC divider stops at 1023, which at
+# 80 MHz and 14 bits puts the lowest frequency at about 4.8 Hz. So the timer toggles BLINK_SLOW
+# on a lit 1 kHz channel, and it steps the brightness of BREATHE.
+PATTERNS = (
+    (1000, 0),  # OFF
+    (1000, 65535),  # ON
+    (1000, 65535),  # BLINK_SLOW: the timer turns it off and on every BLINK_SLOW_MS
+    (5, 32768),  # BLINK_FAST: 100 ms on, 100 ms off
+    (1000, 0),  # BREATHE
+    (10, 13107),  # STROBE: 20 ms flashes, 10 a second
+)
+
+BLINK_SLOW_MS = const(500)  # 500 ms on, 500 ms off
+BREATHE_PERIOD_MS = const(2000)
+BREATHE_STEPS = const(50)  # Brightness changes per breath, one per timer tick
 
 class LED:
-    def __init__(self, pin_number=8):
+    def __init__(self, pin_number=8, timer_id=2):
         """
-        Initializes the onboard LED.
+        Initializes the onboard LED on a PWM channel, so a pattern keeps running without the CPU once started.
         :param pin_number: The GPIO pin connected to the onboard LED (default is 8).
+        :param timer_id: The machine.Timer that runs the BLINK_SLOW and BREATHE patterns. The ESP32-C3 has the timers 0 and 2,
+            and motion.use_hardware_timer takes 0.
         """
-        self.led = Pin(pin_number, Pin.OUT)
+        self.pwm = PWM(Pin(pin_number, Pin.OUT), freq=1000, duty_u16=65535)  # Inverted pin, full duty is off
+        self.timer_id = timer_id
+        self.timer = None  # Created for the first BLINK_SLOW or BREATHE
+        self.pattern = PATTERN_OFF
         self.state = False  # False means off (LED is physically on)
 
+        # Duty of every BREATHE step, inverted; the brightness is squared so the breath looks even to the eye
+        self.breathe_duties = array('H', bytearray(2 * BREATHE_STEPS))
+        for step in range(BREATHE_STEPS):
+            level = 1 - abs(2 * step / BREATHE_STEPS - 1)
+            self.breathe_duties[step] = 65535 - int(65535 * level * level)
+        self.breathe_step = 0
+        self.blink_lit = False
+
+    def show(self, pattern):
+        """
+        Starts a pattern, unless it is already showing. The PWM channel, and for BLINK_SLOW and BREATHE
+        the timer, run it from then on, so calling this every pass costs one comparison.
+        :param pattern: One of the PATTERN_ constants.
+        """
+        if pattern == self.pattern:
+            return
+        if self.pattern == PATTERN_BREATHE or self.pattern == PATTERN_BLINK_SLOW:
+            self.timer.deinit()
+        frequency, lit = PATTERNS[pattern]
+        if frequency != PATTERNS[self.pattern][0]:
+            self.pwm.freq(frequency)
+        self.pwm.duty_u16(65535 - lit)
+        if pattern == PATTERN_BREATHE or pattern == PATTERN_BLINK_SLOW:
+            if self.timer is None:
+                self.timer = Timer(self.timer_id)
+            if pattern == PATTERN_BREATHE:
+                self.breathe_step = 0
+                self.timer.init(mode=Timer.PERIODIC, period=BREATHE_PERIOD_MS // BREATHE_STEPS, callback=self._breathe)
+            else:
+                self.blink_lit = True
+                self.timer.init(mode=Timer.PERIODIC, period=BLINK_SLOW_MS, callback=self._blink)
+        self.pattern = pattern
+        self.state = pattern != PATTERN_OFF
+        if __debug__:
+            log.record(EVT_LED, pattern)
+
+    def _blink(self, timer):
+        self.blink_lit = not self.blink_lit
+        self.pwm.duty_u16(0 if self.blink_lit else 65535)
+
+    def _breathe(self, timer):
+        self.pwm.duty_u16(self.breathe_duties[self.breathe_step])
+        self.breathe_step = (self.breathe_step + 1) % BREATHE_STEPS
+
     def on(self):
         """
         Turns the LED on (actually off because of the inversion).
         """
-        self.led.value(0)  # Inverted pin, 0 means on
-        if not self.state:
-            print("LED is ON (physically OFF)")
-        self.state = True
+        self.show(PATTERN_ON)
 
     def off(self):
         """
         Turns the LED off (actually on because of the inversion).
         """
-        self.led.value(1)  # Inverted pin, 1 means off
-        if self.state:
-            print("LED is OFF (physically ON)")
-        self.state = False
+        self.show(PATTERN_OFF)
 
     def toggle(self):
         """
-        Toggles the state of the LED.
+        Toggles the state of the LED. A pattern counts as on.
         """
         if self.state:
             self.off()
@@ -37,9 +102,13 @@ class LED:
             self.on()
 
 if __name__ == "__main__":
+    from time import sleep
+
     led = LED()
 
-    # Test the LED methods
-    led.on()    # This will turn the LED off physically (logically on)
-    led.off()   # This will turn the LED on physically (logically off)
-    led.toggle() # Toggles the LED state
+    # Every pattern for two seconds; nothing runs on the CPU in between
+    for pattern in range(len(PATTERN_NAMES)):
+        print(PATTERN_NAMES[pattern])
+        led.show(pattern)
+        sleep(2)
+    led.off()
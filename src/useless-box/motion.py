@@ -0,0 +1,151 @@
+from time import ticks_ms, ticks_diff
+
+try:
+    import asyncio
+except ImportError:
+    import uasyncio as asyncio
+
+class Motion:
+    def __init__(self, servo, target_angle, trajectory, until=None, done=None):
+        """
+        A single planned servo movement, advanced by the MotionScheduler.
+        :param servo: The SG90Servo to move.
+        :param target_angle: The angle to end the movement at.
+        :param trajectory: The Trajectory to play, see SG90Servo.plan.
+        :param until: Function without arguments checked every tick; the movement stops where it is once it returns True.
+        :param done: asyncio.Event set when the movement ends, for the tasks awaiting it. None when the caller
+            polls advance instead, as ArmPlanner's blocking loop does.
+        """
+        self.servo = servo
+        self.target_angle = target_angle
+        self.duties = trajectory.duties
+        self.delay = trajectory.delay
+        self.until = until
+        self.stopped = False  # Ended early by until
+        self.step = -1  # Index of the duty last written
+        self.start_time = ticks_ms()
+        self.done = done
+        servo.unsettle()
+
+    def advance(self, now):
+        """
+        Writes the servo position for the given time.
+        :param now: The current time in milliseconds (ticks_ms).
+        :return: True when the movement has reached its target angle.
+        """
+        if self.until is not None and self.step >= 0 and self.until():
+            # Checked before the next write, so the servo stops at the duty the condition was met at
+            self.stopped = True
+            self.stop()
+            return True
+
+        steps = len(self.duties)
+        step = ticks_diff(now, self.start_time) // self.delay if self.delay > 0 else steps
+        if step >= steps:
+            self.servo.write_duty(self.duties[steps - 1])
+            self.servo.settle(self.target_angle)
+            if self.done is not None:
+                self.done.set()
+            return True
+
+        # Integer-only while moving; the servo's angle is only updated when the motion ends
+        if step != self.step:
+            self.step = step
+            self.servo.write_duty(self.duties[step])
+        return False
+
+    def stop(self):
+        """
+        Ends the movement where it is.
+        """
+        if self.step >= 0:
+            self.servo.settle(self.servo.duty_to_angle(self.duties[self.step]))
+        if self.done is not None:
+            self.done.set()
+
+class MotionScheduler:
+    TICK_MS = 20  # One PWM period of the SG90 (50 Hz)
+
+    def __init__(self, tick_ms=TICK_MS):
+        """
+        Advances all active servo movements from one shared tick.
+        :param tick_ms: Interval in milliseconds between servo updates.
+        """
+        self.tick_ms = tick_ms
+        self.motions = []
+        self.task = None
+
+    def move(self, servo, target_angle, trajectory, until=None):
+        """
+        Starts moving a servo, replacing any movement already active on it.
+        :param servo: The SG90Servo to move.
+        :param target_angle: The angle to move the servo to.
+        :param trajectory: The Trajectory to play, see SG90Servo.plan.
+        :param until: Optional function ending the movement early, see Motion.
+        :return: The scheduled Motion.
+        """
+        self.stop(servo)
+        motion = Motion(servo, target_angle, trajectory, until, asyncio.Event())
+        if motion.advance(motion.start_time):
+            return motion
+
+        self.motions.append(motion)
+        if self.task is None:
+            self.task = asyncio.create_task(self._run())
+        return motion
+
+    def stop(self, servo):
+        """
+        Stops the active movement of a servo, leaving it at its current angle.
+        :param servo: The SG90Servo to stop.
+        """
+        for motion in self.motions:
+            if motion.servo is servo:
+                self.motions.remove(motion)
+                motion.stop()
+                return
+
+    def is_moving(self, servo):
+        for motion in self.motions:
+            if motion.servo is servo:
+                return True
+        return False
+
+    async def _run(self):
+        try:
+            while self.motions:
+                await asyncio.sleep_ms(self.tick_ms)
+                now = ticks_ms()
+                for motion in self.motions[:]:
+                    if motion.advance(now):
+                        self.motions.remove(motion)
+        finally:
+            self.task = None
+
+scheduler = MotionScheduler()
+
+def use_hardware_timer(timer_id=0):
+    """
+    Plays all servo movements from a machine.Timer callback instead of an asyncio task,
+    so step timing no longer depends on how busy the event loop is.
+    Call before starting any movement.
+    :param timer_id: The machine.Timer to use.
+    """
+    global scheduler
+    from sequencer import Sequencer
+    scheduler = Sequencer(timer_id)
+
+# Example usage
+if __name__ == "__main__":
+    from arm_lid import LidArm
+    from arm_switch import SwitchArm
+
+    async def demo():
+        lid_arm = LidArm(pin=2)
+        switch_arm = SwitchArm(pin=0)
+
+        # Both arms are advanced from the same tick
+        await asyncio.gather(lid_arm.open_async(), switch_arm.extend_async(30))
+        await asyncio.gather(switch_arm.retract_async(), lid_arm.close_async())
+
+    asyncio.run(demo())
@@ -0,0 +1,194 @@
+from time import ticks_ms, ticks_diff, sleep_ms
+from motion import Motion
+from telemetry import log, EVT_OVERLAP
+
+try:
+    import asyncio
+except ImportError:
+    import uasyncio as asyncio
+
+class ArmPlanner:
+    TICK_MS = 20  # One PWM period of the SG90 (50 Hz), as in the motion engine
+
+    def __init__(self, lid_arm, switch_arm):
+        """
+        Moves the lid and the switch arm together where their geometry allows it: the switch arm
+        starts as soon as the lid is open past lid_arm.clear_angle, and the lid starts closing as
+        soon as the switch arm is back inside the box, below switch_arm.clear_angle.
+        Every coordinated move records how much time the overlap saved over moving one arm after the other.
+        :param lid_arm: The LidArm.
+        :param switch_arm: The SwitchArm.
+        """
+        self.lid_arm = lid_arm
+        self.switch_arm = switch_arm
+        self.saved_ms = {}  # Routine name: [moves, milliseconds saved in total]
+
+    def open_and_extend(self, lid_percentage, lid_duration, arm_percentage, arm_duration, routine):
+        """
+        Opens the lid and extends the switch arm once the lid is clear.
+        :param lid_percentage: How far to open the lid (100 = fully open).
+        :param lid_duration: Duration in milliseconds for a full lid movement.
+        :param arm_percentage: How far to extend the switch arm (100 = fully extended).
+        :param arm_duration: Duration in milliseconds for a full switch arm movement.
+        :param routine: Name the saved time is reported under.
+        """
+        self._overlap(self._open(lid_percentage, lid_duration),
+                      self._extend(self.switch_arm.percentage_to_angle(arm_percentage), arm_duration),
+                      self._lid_clear, routine)
+
+    async def open_and_extend_async(self, lid_percentage, lid_duration, arm_percentage, arm_duration, routine):
+        """
+        Opens the lid and extends the switch arm once the lid is clear, without blocking other tasks.
+        """
+        await self._overlap_async(self._open(lid_percentage, lid_duration),
+                                  self._extend(self.switch_arm.percentage_to_angle(arm_percentage), arm_duration),
+                                  self._lid_clear, routine)
+
+    def open_and_push(self, toggle_switch, lid_duration=500, arm_duration=500, routine="switch_off"):
+        """
+        Opens the lid fully and pushes the toggle switch off once the lid is clear, see SwitchArm.push.
+        :return: True if the switch is off.
+        """
+        stopped = self._overlap(self._open(100, lid_duration),
+                                self._extend(self.switch_arm.push_angle(), arm_duration, toggle_switch.is_off),
+                                self._lid_clear, routine)
+        return self.switch_arm.finish_push(toggle_switch, stopped)
+
+    async def open_and_push_async(self, toggle_switch, lid_duration=500, arm_duration=500, routine="switch_off"):
+        """
+        Opens the lid fully and pushes the toggle switch off once the lid is clear, without blocking other tasks.
+        :return: True if the switch is off.
+        """
+        stopped = await self._overlap_async(self._open(100, lid_duration),
+                                            self._extend(self.switch_arm.push_angle(), arm_duration, toggle_switch.is_off),
+                                            self._lid_clear, routine)
+        return await self.switch_arm.finish_push_async(toggle_switch, stopped)
+
+    def retract_and_close(self, arm_percentage, arm_duration, lid_percentage, lid_duration, routine):
+        """
+        Retracts the switch arm and closes the lid as soon as the arm is inside the box.
+        :param arm_percentage: How far to retract the switch arm (100 = fully retracted).
+        :param arm_duration: Duration in milliseconds for a full switch arm movement.
+        :param lid_percentage: How far to close the lid (100 = fully closed).
+        :param lid_duration: Duration in milliseconds for a full lid movement.
+        :param routine: Name the saved time is reported under.
+        """
+        self._overlap(self._extend(self.switch_arm.percentage_to_angle(100 - arm_percentage), arm_duration),
+                      self._open(100 - lid_percentage, lid_duration),
+                      self._arm_clear, routine)
+
+    async def retract_and_close_async(self, arm_percentage, arm_duration, lid_percentage, lid_duration, routine):
+        """
+        Retracts the switch arm and closes the lid as soon as the arm is inside the box, without blocking other tasks.
+        """
+        await self._overlap_async(self._extend(self.switch_arm.percentage_to_angle(100 - arm_percentage), arm_duration),
+                                  self._open(100 - lid_percentage, lid_duration),
+                                  self._arm_clear, routine)
+
+    def report(self):
+        """
+        Prints the time saved by overlapping the arms, per routine.
+        """
+        for routine, (moves, saved_ms) in sorted(self.saved_ms.items()):
+            print(f"{routine}: {moves} moves, {saved_ms} ms saved, {saved_ms // moves} ms per move")
+
+    def _open(self, percentage, duration):
+        return self.lid_arm.servo, self.lid_arm.percentage_to_angle(percentage), duration, None
+
+    def _extend(self, angle, duration, until=None):
+        return self.switch_arm.servo, angle, duration, until
+
+    def _lid_clear(self, angle):
+        return angle <= self.lid_arm.clear_angle
+
+    def _arm_clear(self, angle):
+        return angle <= self.switch_arm.clear_angle
+
+    @staticmethod
+    def _angle(motion):
+        """
+        Angle of the duty a Motion or sequencer Channel wrote last; the servo's angle is only updated at the end.
+        """
+        if motion.step < 0:
+            return motion.servo.current_angle
+        return motion.servo.duty_to_angle(motion.duties[motion.step])
+
+    def _record(self, routine, overlap_ms):
+        entry = self.saved_ms.get(routine)
+        if entry is None:
+            entry = self.saved_ms[routine] = [0, 0]
+        entry[0] += 1
+        entry[1] += max(0, overlap_ms)
+        if __debug__:
+            log.record(EVT_OVERLAP, max(0, overlap_ms))
+
+    def _overlap(self, lead, follow, ready, routine):
+        """
+        Plays the lead move and starts the follow move once ready returns True for the lead's
+        angle, or once the lead has finished. Both servos are advanced from one blocking loop.
+        :param lead: (servo, angle, duration, until) of the move to start with.
+        :param follow: (servo, angle, duration, until) of the move to start once ready.
+        :param ready: Function of the lead's current angle.
+        :return: True if the follow move was stopped by its until function.
+        """
+        first = self._start(lead)
+        now = first.start_time
+        first_done = first.advance(now)
+        first_end = now
+        second = None
+        second_done = False
+        while True:
+            if second is None and (first_done or ready(self._angle(first))):
+                second = self._start(follow)
+                second_start = second.start_time
+                second_done = second.advance(second_start)
+            if first_done and second_done:
+                break
+            sleep_ms(self.TICK_MS)
+            now = ticks_ms()
+            if not first_done:
+                first_done = first.advance(now)
+                first_end = now
+            if second is not None and not second_done:
+                second_done = second.advance(now)
+
+        self._record(routine, ticks_diff(first_end, second_start))
+        return second.stopped
+
+    async def _overlap_async(self, lead, follow, ready, routine):
+        """
+        Like _overlap, but the moves are played by the motion engine while this task waits.
+        """
+        import motion
+
+        first = self._schedule(motion.scheduler, lead)
+        second = None
+        try:
+            while second is None:
+                if first.done.is_set() or ready(self._angle(first)):
+                    second = self._schedule(motion.scheduler, follow)
+                    second_start = ticks_ms()
+                else:
+                    await asyncio.sleep_ms(self.TICK_MS)
+            await first.done.wait()
+            first_end = ticks_ms()
+            await second.done.wait()
+        finally:
+            # Cancelled: stop both arms where they are, as SG90Servo.move_to does
+            for moving in (first, second):
+                if moving is not None and not moving.done.is_set():
+                    motion.scheduler.stop(moving.servo)
+
+        self._record(routine, ticks_diff(first_end, second_start))
+        return second.stopped
+
+    @staticmethod
+    def _start(move):
+        servo, angle, duration, until = move
+        return Motion(servo, angle, servo.plan(angle, duration), until)
+
+    @staticmethod
+    def _schedule(scheduler, move):
+        servo, angle, duration, until = move
+        scheduler.stop(servo)  # Settles a motion in progress first, so the plan starts where the servo is
+        return scheduler.move(servo, angle, servo.plan(angle, duration), until)
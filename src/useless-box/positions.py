@@ -0,0 +1,48 @@
+import struct
+from machine import RTC
+
+class PositionStore:
+    MAGIC = 0x5542  # "UB"
+    NONE = 0xFFFF  # Slot without a known position
+
+    def __init__(self, slots=2):
+        """
+        Keeps the last settled servo positions in RTC memory, which survives a soft reset
+        and deep sleep but not a power cycle.
+        :param slots: Number of servos to keep positions for.
+        """
+        self.rtc = RTC()
+        # Magic, then one duty table index per slot
+        self.buffer = bytearray(2 + 2 * slots)
+        data = self.rtc.memory()
+        if len(data) == len(self.buffer) and struct.unpack_from("<H", data)[0] == self.MAGIC:
+            self.buffer[:] = data
+        else:
+            struct.pack_into("<H", self.buffer, 0, self.MAGIC)
+            for slot in range(slots):
+                struct.pack_into("<H", self.buffer, 2 + 2 * slot, self.NONE)
+
+    def load(self, slot):
+        """
+        Returns the duty table index a servo was last settled at, or None after a power cycle.
+        :param slot: The servo's slot.
+        """
+        index = struct.unpack_from("<H", self.buffer, 2 + 2 * slot)[0]
+        return None if index == self.NONE else index
+
+    def save(self, slot, index):
+        """
+        Records where a servo settled.
+        :param slot: The servo's slot.
+        :param index: Duty table index of its position, see SG90Servo.angle_to_index.
+        """
+        struct.pack_into("<H", self.buffer, 2 + 2 * slot, index)
+        self.rtc.memory(self.buffer)
+
+    def forget(self, slot):
+        """
+        Marks a servo's position as unknown, while it moves. Only writes RTC memory if it was known.
+        :param slot: The servo's slot.
+        """
+        if self.load(slot) is not None:
+            self.save(slot, self.NONE)
@@ -0,0 +1,173 @@
+import machine
+from machine import Pin
+from time import ticks_ms, ticks_us, ticks_diff, sleep_ms
+from apds9960.const import *
+from telemetry import log, EVT_SLEEP, EVT_SLOW_WAKE, EVT_WAKE
+
+class PowerManager:
+    IDLE_AFTER_MS = 1000  # Idle this long before sleeping, well past the servos' settle time
+    RESTORE_MS = 5  # One proximity cycle at full LED power before the controller reads the sensor again
+    DEFAULT_PULSES = 8  # Proximity pulses set up by the APDS-9960 driver (PPULSE 0x87: 8 pulses of 16 us)
+
+    def __init__(self, max_wake_latency_ms=100, idle_after_ms=IDLE_AFTER_MS, idle_led_drive=APDS9960_LED_DRIVE_50MA, idle_pulses=4):
+        """
+        Light-sleeps the board while the box is idle: the switch off, the lid closed and nobody near.
+        Before sleeping, both servos stop getting pulses and the APDS-9960 proximity LED is turned
+        down. The toggle switch and the sensor's INT line wake the board; without the INT line, the
+        sensor is polled from sleep every max_wake_latency_ms.
+        :param max_wake_latency_ms: Longest time from a wake source changing until the controller runs again.
+        :param idle_after_ms: How long the box has to be idle before it sleeps.
+        :param idle_led_drive: APDS9960_LED_DRIVE_* of the proximity LED while asleep.
+        :param idle_pulses: Proximity LED pulses per reading while asleep (1-64).
+        """
+        self.max_wake_latency_ms = max_wake_latency_ms
+        self.idle_after_ms = idle_after_ms
+        self.idle_led_drive = idle_led_drive
+        self.idle_pulses = idle_pulses
+        # Sleep per sensor poll without the INT line, shortened by the measured resume time after the first wake
+        self.poll_ms = max(1, max_wake_latency_ms - 2 * self.RESTORE_MS)
+        # The reading falls with the LED current and the number of pulses
+        self.idle_scale = (8 >> idle_led_drive) * idle_pulses / (8 * self.DEFAULT_PULSES)
+        self.reading = bytearray(1)
+        self.idle_since = None
+
+        # Instrumentation, see stats
+        self.started_ms = ticks_ms()
+        self.asleep_us = 0
+        self.sleeps = 0
+        self.switch_wakes = 0
+        self.proximity_wakes = 0
+        self.polls = 0
+        self.resume_us_max = 0
+
+    def pause(self, box, ms, idle):
+        """
+        Waits between two controller passes: sleep_ms while the box is busy, light sleep once it has
+        been idle for idle_after_ms.
+        :param box: The UselessBox.
+        :param ms: Time to wait while the box is busy.
+        :param idle: True if the box has nothing to do until the switch or the proximity changes.
+        """
+        if not idle:
+            self.idle_since = None
+            sleep_ms(ms)
+            return
+        now = ticks_ms()
+        if self.idle_since is None:
+            self.idle_since = now
+        if ticks_diff(now, self.idle_since) < self.idle_after_ms:
+            sleep_ms(ms)
+            return
+        self.sleep(box)
+
+    def sleep(self, box):
+        """
+        Light-sleeps until the toggle switch changes or a hand comes into range.
+        :param box: The UselessBox.
+        """
+        sensor = box.proximity_sensor
+        toggle_pin = box.toggle_switch.pin
+        int_pin = sensor.int_pin
+        wake_threshold = max(1, int(sensor.far_threshold * self.idle_scale))
+
+        box.switch_arm.servo.detach()
+        box.lid_arm.servo.detach()
+        self._set_led(sensor, self.idle_led_drive, self.idle_pulses)
+        # Wake on whichever level the switch is not at now
+        level = toggle_pin.value()
+        toggle_pin.irq(trigger=Pin.WAKE_LOW if level else Pin.WAKE_HIGH, wake=machine.SLEEP)
+        if int_pin is not None:
+            # Any reading at FAR or closer, at the lowered LED power, asserts INT
+            sensor.sensor.setProximityIntLowThreshold(0)
+            sensor.sensor.setProximityIntHighThreshold(wake_threshold - 1)
+            sensor.sensor.clearProximityInt()
+            int_pin.irq(trigger=Pin.WAKE_LOW, wake=machine.SLEEP)
+
+        self.sleeps += 1
+        if __debug__:
+            log.record(EVT_SLEEP)
+        while True:
+            start = ticks_us()
+            try:
+                if int_pin is not None:
+                    machine.lightsleep()
+                else:
+                    machine.lightsleep(self.poll_ms)
+            finally:
+                woke = ticks_us()
+                self.asleep_us += ticks_diff(woke, start)
+            if toggle_pin.value() != level:
+                self.switch_wakes += 1
+                cause = 1
+                break
+            if int_pin is not None:
+                if not int_pin.value():
+                    self.proximity_wakes += 1
+                    cause = 2
+                    break
+            else:
+                self.polls += 1
+                sensor.bus.readfrom_mem_into(sensor.sensor.address, APDS9960_REG_PDATA, self.reading)
+                if self.reading[0] >= wake_threshold:
+                    self.proximity_wakes += 1
+                    cause = 2
+                    break
+
+        toggle_pin.irq(handler=None)
+        if int_pin is not None:
+            int_pin.irq(handler=None)
+        self._set_led(sensor, APDS9960_LED_DRIVE_100MA, self.DEFAULT_PULSES)
+        # The next read re-arms the thresholds of the current state and clears the wake interrupt
+        sensor.band = None
+        sensor.settled = False
+        sleep_ms(self.RESTORE_MS)
+        self.idle_since = None
+        resume_us = ticks_diff(ticks_us(), woke)
+        if __debug__:
+            log.record(EVT_WAKE, cause, min(resume_us, 32767))
+        if resume_us > self.resume_us_max:
+            self.resume_us_max = resume_us
+            resume_ms = (resume_us + 999) // 1000
+            if resume_ms >= self.max_wake_latency_ms:
+                log.record(EVT_SLOW_WAKE, min(resume_us, 32767), self.max_wake_latency_ms)
+            self.poll_ms = max(1, self.max_wake_latency_ms - resume_ms)
+
+    def _set_led(self, sensor, drive, pulses):
+        sensor.sensor.setLEDDrive(drive)
+        # 16 us pulses, as set up by the driver
+        sensor.bus.writeto_mem(sensor.sensor.address, APDS9960_REG_PPULSE, bytes((0x80 | (pulses - 1),)))
+
+    def worst_wake_latency_ms(self):
+        """
+        Longest time from a wake source changing until the controller runs: the resume time, plus
+        one polling period when the sensor has no INT line.
+        """
+        return self.resume_us_max / 1000 + (self.poll_ms if self.polls else 0)
+
+    def stats(self):
+        """
+        Returns how much of the time since the manager was created the board was awake.
+        :return: Dictionary with the awake percentage (duty cycle), awake seconds per hour, the number
+            of sleeps, wakes by cause and sensor polls, and the worst wake latency in milliseconds.
+        """
+        elapsed_ms = ticks_diff(ticks_ms(), self.started_ms)
+        asleep_ms = self.asleep_us // 1000
+        duty = (elapsed_ms - asleep_ms) / elapsed_ms if elapsed_ms > 0 else 1
+        return {
+            "duty_cycle_pct": round(duty * 100, 1),
+            "awake_secs_per_hour": round(duty * 3600),
+            "sleeps": self.sleeps,
+            "switch_wakes": self.switch_wakes,
+            "proximity_wakes": self.proximity_wakes,
+            "polls": self.polls,
+            "wake_latency_ms_max": round(self.worst_wake_latency_ms(), 1),
+        }
+
+    def report(self):
+        """
+        Prints the estimated duty cycle and awake time per hour.
+        """
+        stats = self.stats()
+        print(f"Awake {stats['duty_cycle_pct']}% of the time, {stats['awake_secs_per_hour']} s per hour. "
+              f"{stats['sleeps']} sleeps, woken {stats['switch_wakes']} times by the switch and {stats['proximity_wakes']} times by a hand, "
+              f"wake latency up to {stats['wake_latency_ms_max']} ms")
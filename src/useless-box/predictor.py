@@ -0,0 +1,90 @@
+from array import array
+from time import ticks_diff
+
+class ApproachPredictor:
+    WINDOW = 8  # Samples the approach speed is fitted over
+    WINDOW_MS = 400  # Older samples are ignored, a hand crosses the sensor range in about a second
+
+    def __init__(self, aggressiveness=0.5, contact=230, release=50):
+        """
+        Predicts when a hand is about to flip the toggle switch from how fast the raw APDS-9960
+        reading rises, so the box can get ready before the switch is on.
+        :param aggressiveness: 0 to 1. Higher values predict earlier and for slower hands, which
+            catches more flips at the cost of more false alarms.
+        :param contact: Raw reading when the hand is at the toggle switch.
+        :param release: A new prediction is only made once the reading has dropped below this.
+        """
+        self.contact = contact
+        self.release = release
+        self.set_aggressiveness(aggressiveness)
+        self.times = array('i', bytearray(4 * self.WINDOW))
+        self.values = array('H', bytearray(2 * self.WINDOW))
+        self.reset()
+
+    def set_aggressiveness(self, aggressiveness):
+        """
+        Derives the prediction thresholds from one setting between 0 (cautious) and 1 (eager).
+        """
+        self.aggressiveness = aggressiveness
+        self.lead_ms = int(250 + 750 * aggressiveness)  # Predict when contact is at most this far away
+        self.min_speed = 400 - 300 * aggressiveness  # Counts per second; slower hands are just hovering
+        self.min_value = int(150 - 100 * aggressiveness)  # Teasing hands also get this close, flipping ones get closer
+
+    def reset(self):
+        self.count = 0
+        self.next = 0
+        self.armed = True
+        self.speed = 0
+        self.time_to_contact_ms = None
+
+    def update(self, value, now_ms):
+        """
+        Adds a raw reading.
+        :param value: Raw proximity reading (0-255).
+        :param now_ms: time.ticks_ms() of the reading.
+        :return: True when this reading predicts a flip; only once per approach.
+        """
+        self.times[self.next] = now_ms
+        self.values[self.next] = value
+        self.next = (self.next + 1) % self.WINDOW
+        if self.count < self.WINDOW:
+            self.count += 1
+
+        if not self.armed:
+            if value < self.release:
+                self.armed = True
+            return False
+
+        self.speed = self._speed(now_ms)
+        if self.speed < self.min_speed or value < self.min_value:
+            self.time_to_contact_ms = None
+            return False
+        self.time_to_contact_ms = max(0, int((self.contact - value) * 1000 / self.speed))
+        if self.time_to_contact_ms <= self.lead_ms:
+            self.armed = False
+            return True
+        return False
+
+    def _speed(self, now_ms):
+        """
+        Least-squares slope of the recent readings in counts per second.
+        """
+        n = 0
+        sum_t = sum_v = sum_tt = sum_tv = 0
+        for i in range(self.count):
+            age = ticks_diff(now_ms, self.times[i])
+            if age > self.WINDOW_MS:
+                continue
+            t = -age / 1000
+            v = self.values[i]
+            n += 1
+            sum_t += t
+            sum_v += v
+            sum_tt += t * t
+            sum_tv += t * v
+        if n < 2:
+            return 0
+        denominator = n * sum_tt - sum_t * sum_t
+        if denominator <= 0:
+            return 0
+        return (n * sum_tv - sum_t * sum_v) / denominator
@@ -0,0 +1,206 @@
+from array import array
+from micropython import const
+from time import ticks_us, ticks_diff
+
+# Stages timed by the profiler. The first six are the parts of one UselessBoxController.update pass.
+STAGE_SWITCH = const(0)  # Toggle switch read
+STAGE_SENSOR = const(1)  # Proximity read, approach prediction and gesture drain
+STAGE_LOGIC = const(2)  # State logic of a pass that moved no servo
+STAGE_ACTUATION = const(3)  # State logic of a pass that moved a servo, blocking until the move ended
+STAGE_LED = const(4)  # update_led_based_on_proximity
+STAGE_PASS = const(5)  # The whole pass, without the pause after it
+STAGE_DUTY = const(6)  # One servo PWM duty write
+STAGE_I2C = const(7)  # One I2C transaction with the APDS-9960
+STAGE_COUNT = const(8)
+
+STAGE_NAMES = ("switch", "sensor", "logic", "actuation", "led", "pass", "duty", "i2c")
+
+# Upper bound in microseconds of every histogram bucket but the last, which takes the rest
+BUCKET_LIMITS_US = (10, 30, 100, 300, 1000, 3000, 10000, 30000, 100000, 300000, 1000000)
+BUCKET_COUNT = const(12)
+
+MIN_UNSET = const(0x3fffffff)  # Largest small int, so comparing with it allocates nothing
+
+class Profiler:
+    def __init__(self):
+        """
+        Times the stages of the controller loop, the servo duty writes and the I2C transactions into
+        preallocated counters: count, minimum, maximum, total (for the mean) and a histogram per stage.
+        Recording only updates integers in arrays and allocates nothing, so it also works in the
+        timer interrupt that plays servo moves.
+        Read the counters over the REPL with report, or print them with dump and check them against
+        the stage budgets on the computer with scripts/profile_report.py.
+        A controller without a profiler only pays a `profiler is not None` test per stage.
+        """
+        self.counts = array('i', bytearray(4 * STAGE_COUNT))
+        self.minimum = array('i', bytearray(4 * STAGE_COUNT))
+        self.maximum = array('i', bytearray(4 * STAGE_COUNT))
+        # Total time as whole seconds plus microseconds, so neither grows past a small int
+        self.total_s = array('i', bytearray(4 * STAGE_COUNT))
+        self.total_us = array('i', bytearray(4 * STAGE_COUNT))
+        self.histogram = array('i', bytearray(4 * STAGE_COUNT * BUCKET_COUNT))
+        self.clear()
+
+    def clear(self):
+        """
+        Resets every counter.
+        """
+        for stage in range(STAGE_COUNT):
+            self.counts[stage] = self.maximum[stage] = self.total_s[stage] = self.total_us[stage] = 0
+            self.minimum[stage] = MIN_UNSET
+        for bucket in range(STAGE_COUNT * BUCKET_COUNT):
+            self.histogram[bucket] = 0
+
+    def add(self, stage, elapsed_us):
+        """
+        Counts one run of a stage.
+        :param stage: One of the STAGE_* ids.
+        :param elapsed_us: How long it took in microseconds.
+        """
+        self.counts[stage] += 1
+        if elapsed_us < self.minimum[stage]:
+            self.minimum[stage] = elapsed_us
+        if elapsed_us > self.maximum[stage]:
+            self.maximum[stage] = elapsed_us
+        total = self.total_us[stage] + elapsed_us
+        if total >= 1000000:
+            self.total_s[stage] += total // 1000000
+            total %= 1000000
+        self.total_us[stage] = total
+        bucket = 0
+        while bucket < BUCKET_COUNT - 1 and elapsed_us > BUCKET_LIMITS_US[bucket]:
+            bucket += 1
+        self.histogram[stage * BUCKET_COUNT + bucket] += 1
+
+    def lap(self, stage, start):
+        """
+        Counts a stage that started at start and ended now.
+        :param stage: One of the STAGE_* ids.
+        :param start: ticks_us when the stage started.
+        :return: ticks_us now, the start of the next stage.
+        """
+        now = ticks_us()
+        self.add(stage, ticks_diff(now, start))
+        return now
+
+    def attach(self, box):
+        """
+        Times every duty write of both servos and every I2C transaction of the proximity sensor,
+        by wrapping the PWM and bus objects. Call it after the arms are created.
+        :param box: The UselessBox.
+        """
+        for arm in (box.switch_arm, box.lid_arm):
+            if not isinstance(arm.servo.servo, TimedPWM):
+                arm.servo.servo = TimedPWM(self, arm.servo.servo)
+        sensor = box.proximity_sensor
+        if not isinstance(sensor.bus, TimedI2C):
+            sensor.bus = TimedI2C(self, sensor.bus)
+            sensor.sensor.bus = sensor.bus
+        if box.components.is_created("gesture_sensor"):
+            box.components.get("gesture_sensor").bus = sensor.bus
+
+    def mean_us(self, stage):
+        count = self.counts[stage]
+        return (self.total_s[stage] * 1000000 + self.total_us[stage]) // count if count else 0
+
+    def stats(self):
+        """
+        Returns the counters of the stages that ran.
+        :return: Dictionary by stage name of count, min_us, max_us, mean_us and the histogram counts.
+        """
+        result = {}
+        for stage in range(STAGE_COUNT):
+            if self.counts[stage]:
+                start = stage * BUCKET_COUNT
+                result[STAGE_NAMES[stage]] = {
+                    "count": self.counts[stage],
+                    "min_us": self.minimum[stage],
+                    "max_us": self.maximum[stage],
+                    "mean_us": self.mean_us(stage),
+                    "histogram": list(self.histogram[start:start + BUCKET_COUNT]),
+                }
+        return result
+
+    def report(self):
+        """
+        Prints a table of the stages that ran.
+        """
+        print("{:<10} {:>8} {:>9} {:>9} {:>9}".format("stage", "count", "min us", "mean us", "max us"))
+        for stage in range(STAGE_COUNT):
+            if self.counts[stage]:
+                print("{:<10} {:>8} {:>9} {:>9} {:>9}".format(STAGE_NAMES[stage], self.counts[stage], self.minimum[stage],
+                                                              self.mean_us(stage), self.maximum[stage]))
+
+    def dump(self):
+        """
+        Prints every counter, one stage per line, e.g. on the REPL after stopping the controller with
+        Ctrl-C: `controller.profiler.dump()`. scripts/profile_report.py reads the printed text.
+        """
+        print("profile", " ".join(str(limit) for limit in BUCKET_LIMITS_US))
+        for stage in range(STAGE_COUNT):
+            start = stage * BUCKET_COUNT
+            print(STAGE_NAMES[stage], self.counts[stage], self.minimum[stage] if self.counts[stage] else 0,
+                  self.maximum[stage], self.total_s[stage], self.total_us[stage],
+                  " ".join(str(count) for count in self.histogram[start:start + BUCKET_COUNT]))
+
+class TimedPWM:
+    """
+    Wraps a servo PWM to time its duty writes.
+    """
+    def __init__(self, profiler, pwm):
+        self.profiler = profiler
+        self.pwm = pwm
+
+    def duty_u16(self, value=None):
+        if value is None:
+            return self.pwm.duty_u16()
+        start = ticks_us()
+        self.pwm.duty_u16(value)
+        self.profiler.add(STAGE_DUTY, ticks_diff(ticks_us(), start))
+
+    def freq(self, *args):
+        return self.pwm.freq(*args)
+
+    def init(self, **kwargs):
+        self.pwm.init(**kwargs)
+
+    def deinit(self):
+        self.pwm.deinit()
+
+class TimedI2C:
+    """
+    Wraps an I2C bus to time its memory transactions, the only ones the APDS-9960 code makes.
+    """
+    def __init__(self, profiler, bus):
+        self.profiler = profiler
+        self.bus = bus
+
+    def readfrom_mem_into(self, addr, memaddr, buf):
+        start = ticks_us()
+        self.bus.readfrom_mem_into(addr, memaddr, buf)
+        self.profiler.add(STAGE_I2C, ticks_diff(ticks_us(), start))
+
+    def readfrom_mem(self, addr, memaddr, nbytes):
+        start = ticks_us()
+        data = self.bus.readfrom_mem(addr, memaddr, nbytes)
+        self.profiler.add(STAGE_I2C, ticks_diff(ticks_us(), start))
+        return data
+
+    def writeto_mem(self, addr, memaddr, buf):
+        start = ticks_us()
+        self.bus.writeto_mem(addr, memaddr, buf)
+        self.profiler.add(STAGE_I2C, ticks_diff(ticks_us(), start))
+
+    def scan(self):
+        return self.bus.scan()
+
+if __name__ == "__main__":
+    from time import sleep_ms
+
+    profiler = Profiler()
+    for ms in (1, 5, 20):
+        start = ticks_us()
+        sleep_ms(ms)
+        profiler.lap(STAGE_PASS, start)
+    profiler.report()
+    profiler.dump()
@@ -1,16 +1,16 @@
-from machine import Pin, SoftI2C
+from machine import Pin, I2C, SoftI2C
+from time import ticks_ms, ticks_us, ticks_diff
 from apds9960.const import *
 from apds9960 import uAPDS9960 as APDS9960
-
-# Simple class to simulate an enumeration
-class ProximityState:
-    VERY_CLOSE = "VERY_CLOSE"
-    CLOSE = "CLOSE"
-    FAR = "FAR"
-    NO_DETECTION = "NO_DETECTION"
+from filters import SampleHistory
+from states import ProximityState, PROXIMITY_NAMES
 
 class ProximitySensor:
-    def __init__(self, sda_pin, scl_pin, very_close_threshold=200, close_threshold=100, far_threshold=50):
+    BURST_LENGTH = APDS9960_REG_PDATA - APDS9960_REG_STATUS + 1  # STATUS up to PDATA in one read
+    HISTORY_SIZE = 32
+
+    def __init__(self, sda_pin, scl_pin, very_close_threshold=200, close_threshold=100, far_threshold=50, int_pin=None, hardware_i2c=False, freq=400000,
+                 sample_filter=None, hysteresis=8, dwell_ms=0):
         """
         Initializes the APDS9960 proximity sensor.
         :param sda_pin: The GPIO pin used for the I2C data line (SDA).
@@ -18,8 +18,21 @@ class ProximitySensor:
         :param very_close_threshold: The threshold value for "very close" proximity.
         :param close_threshold: The threshold value for "close" proximity.
         :param far_threshold: The threshold value for "far" proximity.
+        :param int_pin: GPIO pin connected to the (active low) INT line of the sensor. When set, the bus
+            is only read when the sensor signals that the reading left the current ProximityState.
+        :param hardware_i2c: Use the I2C peripheral instead of bit-banged SoftI2C.
+        :param freq: I2C clock frequency in Hz.
+        :param sample_filter: A MedianFilter, EmaFilter or OneEuroFilter from filters the readings go
+            through before they are classified, or None to classify every reading as it is.
+        :param hysteresis: How far below a threshold the filtered reading has to drop to leave its
+            state, either one value for all thresholds or a (far, close, very close) tuple.
+            Approaching states are entered at the thresholds themselves.
+        :param dwell_ms: Minimum time in a state before the next change is accepted.
         """
-        self.bus = SoftI2C(sda=Pin(sda_pin), scl=Pin(scl_pin))
+        if hardware_i2c:
+            self.bus = I2C(0, sda=Pin(sda_pin), scl=Pin(scl_pin), freq=freq)
+        else:
+            self.bus = SoftI2C(sda=Pin(sda_pin), scl=Pin(scl_pin), freq=freq)
         self.sensor = APDS9960(self.bus)
         self.sensor.setProximityIntLowThreshold(50)
         self.sensor.enableProximitySensor()
@@ -27,18 +40,143 @@ class ProximitySensor:
         self.very_close_threshold = very_close_threshold
         self.close_threshold = close_threshold
         self.far_threshold = far_threshold
+        self.thresholds = (far_threshold, close_threshold, very_close_threshold)
+        self.hysteresis = hysteresis if isinstance(hysteresis, tuple) else (hysteresis,) * 3
+        self.filter = sample_filter
+        self.dwell_ms = dwell_ms
+
+        self.history = SampleHistory(self.HISTORY_SIZE)  # Raw readings of the bus reads
+        self.raw = None  # Last raw reading
+        self.sampled_ms = None  # time.ticks_ms() of the last raw reading
+        self.filtered = None  # Last reading after the filter
+        self.level = None  # ProximityState of the classified reading
+        self.changed_ms = 0  # When the state last changed
+        self.settled = False  # Further readings in the current band cannot change the state
+
+        self.int_pin = None
+        self.band = None  # (low, high) proximity band the interrupt thresholds are armed for
+        self.state = None  # ProximityState of the last bus read
+        self.burst = bytearray(self.BURST_LENGTH)
+
+        # Bus statistics, see stats
+        self.transactions = 0
+        self.reads = 0
+        self.gated_reads = 0
+        self.read_us = 0
+        self.read_us_max = 0
+        self.state_changes = 0
+        self.stats_start = ticks_ms()
+
+        if int_pin is not None:
+            self.enable_interrupt(int_pin)
 
     def read_proximity(self):
         """
         Reads the proximity value from the sensor and returns a ProximityState.
-        :return: A string indicating the proximity level.
-        """
-        proximity_value = self.sensor.readProximity()
-        if proximity_value >= self.very_close_threshold:
-            return ProximityState.VERY_CLOSE
-        elif proximity_value >= self.close_threshold:
-            return ProximityState.CLOSE
-        elif proximity_value >= self.far_threshold:
-            return ProximityState.FAR
-        else:
-            return ProximityState.NO_DETECTION
+        :return: The ProximityState of the reading.
+        """
+        if self.settled and self.int_pin is not None and self.int_pin.value():
+            # INT not asserted: the reading is still inside the armed band, so the state has not changed
+            self.gated_reads += 1
+            return self.state
+
+        start = ticks_us()
+        self.bus.readfrom_mem_into(self.sensor.address, APDS9960_REG_STATUS, self.burst)
+        elapsed = ticks_diff(ticks_us(), start)
+        self.transactions += 1
+        self.reads += 1
+        self.read_us += elapsed
+        if elapsed > self.read_us_max:
+            self.read_us_max = elapsed
+
+        now = ticks_ms()
+        raw = self.burst[self.BURST_LENGTH - 1]
+        self.raw = raw
+        self.sampled_ms = now
+        self.history.push(raw)
+        self.filtered = self.filter.update(raw, now) if self.filter is not None else raw
+
+        level = self._classify(self.filtered)
+        if level != self.level and (self.level is None or ticks_diff(now, self.changed_ms) >= self.dwell_ms):
+            self.level = level
+            self.state = level
+            self.changed_ms = now
+            self.state_changes += 1
+
+        # While the filter lags the raw reading or a change waits for the dwell time, keep reading the bus
+        band = self._band(self.level)
+        self.settled = level == self.level and band[0] <= raw <= band[1]
+        if self.int_pin is not None:
+            self._arm_interrupt(band, self.burst[0] & APDS9960_BIT_PINT)
+        return self.state
+
+    def stats(self):
+        """
+        Returns the bus usage since the previous call and starts a new measurement period.
+        :return: Dictionary with transactions per second, bus reads, reads answered from the INT line,
+            the mean and maximum read latency in microseconds, and the number of state changes.
+        """
+        elapsed_ms = ticks_diff(ticks_ms(), self.stats_start)
+        result = {
+            "transactions_per_sec": self.transactions * 1000 / elapsed_ms if elapsed_ms > 0 else 0,
+            "reads": self.reads,
+            "gated_reads": self.gated_reads,
+            "read_us_mean": self.read_us // self.reads if self.reads else 0,
+            "read_us_max": self.read_us_max,
+            "state_changes": self.state_changes,
+        }
+        self.transactions = self.reads = self.gated_reads = self.read_us = self.read_us_max = self.state_changes = 0
+        self.stats_start = ticks_ms()
+        return result
+
+    def enable_interrupt(self, int_pin, handler=None):
+        """
+        Uses the APDS-9960 interrupt line to signal proximity state changes.
+        The thresholds are armed around the band of the current state, so the line is only
+        asserted when the reading crosses into another ProximityState.
+        :param int_pin: The GPIO pin connected to the (active low) INT line of the sensor.
+        :param handler: Function called from the interrupt, taking the Pin, or None to only gate reads.
+        """
+        self.int_pin = Pin(int_pin, mode=Pin.IN, pull=Pin.PULL_UP)
+        if handler is not None:
+            self.int_pin.irq(handler=handler, trigger=Pin.IRQ_FALLING)
+        self.sensor.enableProximitySensor(interrupts=True)
+        self.band = None
+        self.settled = False
+        self.read_proximity()  # Arms the thresholds for the current reading
+
+    def _classify(self, value):
+        """
+        Returns the level of a filtered reading, starting from the current one.
+        """
+        thresholds = self.thresholds
+        if self.level is None:
+            level = 0
+            while level < 3 and value >= thresholds[level]:
+                level += 1
+            return level
+        level = self.level
+        while level < 3 and value >= thresholds[level]:
+            level += 1
+        while level > 0 and value < thresholds[level - 1] - self.hysteresis[level - 1]:
+            level -= 1
+        return level
+
+    def _band(self, level):
+        """
+        Returns the (low, high) raw readings that keep a level.
+        """
+        low = max(0, self.thresholds[level - 1] - self.hysteresis[level - 1]) if level > 0 else 0
+        high = self.thresholds[level] - 1 if level < 3 else 255
+        return low, high
+
+    def _arm_interrupt(self, band, pending):
+        if band != self.band:
+            self.sensor.setProximityIntLowThreshold(band[0])
+            self.sensor.setProximityIntHighThreshold(band[1])
+            self.transactions += 2
+            self.band = band
+        # Left pending while the reading is outside the band, so the next read is not skipped
+        if pending and self.settled:
+            self.sensor.clearProximityInt()
+            self.transactions += 1
@@ -0,0 +1,29 @@
+class Registry:
+    def __init__(self):
+        """
+        Creates components on first use instead of up front, so the box is ready sooner after power-up.
+        """
+        self.factories = {}
+        self.components = {}
+
+    def register(self, name, factory):
+        """
+        Registers how to create a component.
+        :param name: The name to look the component up by.
+        :param factory: Function without arguments returning the component.
+        """
+        self.factories[name] = factory
+
+    def get(self, name):
+        """
+        Returns a component, creating it if this is its first use.
+        :param name: The name it was registered with.
+        """
+        component = self.components.get(name)
+        if component is None:
+            component = self.factories[name]()
+            self.components[name] = component
+        return component
+
+    def is_created(self, name):
+        return name in self.components
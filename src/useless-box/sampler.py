@@ -0,0 +1,158 @@
+import _thread
+from array import array
+from micropython import const
+from time import ticks_ms, ticks_diff, ticks_add, sleep_ms
+
+SEQUENCE_MASK = const(0x3fffffff)  # Sample sequence numbers wrap here, and stay small ints
+SWITCH_BIT = const(0x80)  # In a sample's state byte; the low bits are the ProximityState
+
+class SampleRing:
+    def __init__(self, size=8):
+        """
+        Single-producer, single-consumer ring of sensor samples, without a lock.
+        The producer fills a slot and then publishes it by advancing written; a slot's sequence
+        number is cleared while it is filled, so the consumer notices a slot overwritten under it
+        and reads again. Nothing is allocated after construction.
+        :param size: Number of samples kept, a power of two.
+        """
+        if size & (size - 1):
+            raise ValueError("size must be a power of two")
+        self.mask = size - 1
+        self.sequences = array('i', bytearray(4 * size))
+        self.times = array('i', bytearray(4 * size))  # ticks_ms the sample was taken
+        self.read_times = array('i', bytearray(4 * size))  # ticks_ms of the bus read behind it, -1 for none
+        self.raws = array('H', bytearray(2 * size))
+        self.states = bytearray(size)
+        self.written = 0  # Sequence number of the next sample, the only variable the consumer polls
+
+    def push(self, time_ms, switch, proximity, raw, read_ms):
+        """
+        Adds a sample. Only the sensing thread calls this.
+        """
+        sequence = self.written
+        slot = sequence & self.mask
+        self.sequences[slot] = -1  # Being written
+        self.times[slot] = time_ms
+        self.read_times[slot] = read_ms
+        self.raws[slot] = raw
+        self.states[slot] = (SWITCH_BIT if switch else 0) | proximity
+        self.sequences[slot] = sequence
+        self.written = (sequence + 1) & SEQUENCE_MASK
+
+class SensorSampler:
+    PERIOD_MS = 10  # 100 samples per second
+
+    def __init__(self, box, period_ms=PERIOD_MS, size=8):
+        """
+        Samples the toggle switch and the proximity sensor on a thread of its own, at a fixed rate,
+        whatever the arms are doing. The controller takes the newest sample with latest instead of
+        reading the hardware, so the thread is the only user of the sensor's bus.
+        :param box: The UselessBox.
+        :param period_ms: Time between two samples.
+        :param size: Samples kept in the ring, a power of two.
+        """
+        self.box = box
+        self.period_ms = period_ms
+        self.ring = SampleRing(size)
+        self.running = False
+
+        # Newest sample, filled by latest; raw and sampled_ms as on ProximitySensor, for the approach predictor
+        self.switch = False
+        self.proximity = 0
+        self.raw = 0
+        self.sampled_ms = None
+        self.time_ms = 0
+        self.age_ms = 0  # Age of the newest sample when latest took it
+
+        # Instrumentation, see stats
+        self.started_ms = 0
+        self.overruns = 0  # Periods the sample took longer than
+        self.retries = 0  # Slots overwritten while latest read them
+        self.takes = 0
+        self.age_ms_total = 0
+        self.age_ms_max = 0
+
+    def start(self):
+        """
+        Takes the first sample and starts the sensing thread.
+        """
+        self.started_ms = ticks_ms()
+        self.sample()
+        self.running = True
+        _thread.start_new_thread(self._run, ())
+
+    def stop(self):
+        """
+        Ends the sensing thread after its current sample.
+        """
+        self.running = False
+
+    def _run(self):
+        deadline = ticks_ms()
+        while self.running:
+            deadline = ticks_add(deadline, self.period_ms)
+            wait_ms = ticks_diff(deadline, ticks_ms())
+            if wait_ms > 0:
+                sleep_ms(wait_ms)
+            elif wait_ms < 0:
+                # Late: skip the missed periods instead of sampling in a burst
+                self.overruns += 1
+                deadline = ticks_ms()
+            self.sample()
+
+    def sample(self):
+        """
+        Reads the toggle switch and the proximity sensor into the ring.
+        """
+        box = self.box
+        switch = box.get_switch_state()
+        proximity = box.get_proximity()
+        sensor = box.proximity_sensor
+        self.ring.push(ticks_ms(), switch, proximity, sensor.raw or 0, -1 if sensor.sampled_ms is None else sensor.sampled_ms)
+
+    def latest(self):
+        """
+        Takes the newest sample into the switch, proximity, raw, sampled_ms and time_ms attributes.
+        :return: False if there is no sample yet.
+        """
+        ring = self.ring
+        while True:
+            written = ring.written
+            if written == 0:
+                return False
+            sequence = (written - 1) & SEQUENCE_MASK
+            slot = sequence & ring.mask
+            time_ms = ring.times[slot]
+            read_ms = ring.read_times[slot]
+            raw = ring.raws[slot]
+            state = ring.states[slot]
+            if ring.sequences[slot] == sequence:
+                break
+            self.retries += 1
+        self.switch = bool(state & SWITCH_BIT)
+        self.proximity = state & (SWITCH_BIT - 1)
+        self.raw = raw
+        self.sampled_ms = None if read_ms < 0 else read_ms
+        self.time_ms = time_ms
+        self.age_ms = ticks_diff(ticks_ms(), time_ms)
+        self.takes += 1
+        self.age_ms_total += self.age_ms
+        if self.age_ms > self.age_ms_max:
+            self.age_ms_max = self.age_ms
+        return True
+
+    def stats(self):
+        """
+        Returns the sample rate and how old the samples the controller took were.
+        :return: Dictionary with samples per second, missed periods, samples taken by the controller,
+            their mean and maximum age in milliseconds, and reads retried because the slot was overwritten.
+        """
+        elapsed_ms = ticks_diff(ticks_ms(), self.started_ms)
+        return {
+            "samples_per_sec": round(self.ring.written * 1000 / elapsed_ms, 1) if elapsed_ms > 0 else 0,
+            "overruns": self.overruns,
+            "takes": self.takes,
+            "age_ms_mean": round(self.age_ms_total / self.takes, 1) if self.takes else 0,
+            "age_ms_max": self.age_ms_max,
+            "retries": self.retries,
+        }
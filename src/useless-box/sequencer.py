@@ -0,0 +1,158 @@
+from machine import Timer
+
+try:
+    import asyncio
+except ImportError:
+    import uasyncio as asyncio
+
+class Completion:
+    def __init__(self):
+        """
+        Completion handle of a sequence. Can be set from a timer callback and awaited from a task.
+        """
+        self.finished = False
+        self.flag = asyncio.ThreadSafeFlag()
+
+    def set(self):
+        self.finished = True
+        self.flag.set()
+
+    def is_set(self):
+        return self.finished
+
+    async def wait(self):
+        while not self.finished:
+            await self.flag.wait()
+
+class Channel:
+    def __init__(self, servo, target_angle, trajectory, start_tick, until=None):
+        """
+        A trajectory being played on one servo.
+        """
+        self.servo = servo
+        self.target_angle = target_angle
+        self.duties = trajectory.duties
+        self.delay = trajectory.delay
+        self.until = until
+        self.stopped = False  # Ended early by until
+        self.start_tick = start_tick
+        self.step = 0  # Index of the duty last written
+        self.done = Completion()
+
+class Sequencer:
+    TICK_MS = 20  # One PWM period of the SG90 (50 Hz)
+    MAX_CHANNELS = 4
+
+    def __init__(self, timer_id=0, tick_ms=TICK_MS):
+        """
+        Plays precomputed duty sequences from a hardware timer callback, so step timing does not
+        depend on when Python code gets to run. Has the same move/stop interface as MotionScheduler.
+        :param timer_id: The machine.Timer to use.
+        :param tick_ms: Interval in milliseconds between servo updates.
+        """
+        self.timer = Timer(timer_id)
+        self.tick_ms = tick_ms
+        self.ticks = 0
+        self.running = False
+        # Fixed slots instead of a list, so the timer callback never sees a list being resized
+        self.channels = [None] * self.MAX_CHANNELS
+
+    def move(self, servo, target_angle, trajectory, until=None):
+        """
+        Starts playing a trajectory on a servo and returns immediately.
+        :param servo: The SG90Servo to move.
+        :param target_angle: The angle the trajectory ends at.
+        :param trajectory: The Trajectory to play, see SG90Servo.plan.
+        :param until: Optional function checked from the timer callback every tick; the sequence
+            stops where it is once it returns True. Must not allocate much, e.g. a Pin read.
+        :return: The Channel, whose done attribute completes when the servo reaches the target angle.
+        """
+        self.stop(servo)
+        channel = Channel(servo, target_angle, trajectory, self.ticks, until)
+        servo.unsettle()
+        servo.write_duty(channel.duties[0])
+
+        for slot in range(self.MAX_CHANNELS):
+            if self.channels[slot] is None:
+                self.channels[slot] = channel
+                break
+        else:
+            raise RuntimeError("No free sequencer channel")
+
+        if not self.running:
+            self.running = True
+            self.timer.init(mode=Timer.PERIODIC, period=self.tick_ms, callback=self._tick)
+        return channel
+
+    def play(self, moves):
+        """
+        Starts several servos at once.
+        :param moves: List of (servo, target_angle, trajectory).
+        :return: The Channels, in the same order.
+        """
+        return [self.move(servo, target_angle, trajectory) for servo, target_angle, trajectory in moves]
+
+    def stop(self, servo):
+        """
+        Stops the sequence playing on a servo, leaving it where it is.
+        :param servo: The SG90Servo to stop.
+        """
+        for slot in range(self.MAX_CHANNELS):
+            channel = self.channels[slot]
+            if channel is not None and channel.servo is servo:
+                self.channels[slot] = None
+                servo.settle(servo.duty_to_angle(channel.duties[channel.step]))
+                channel.done.set()
+
+    def is_moving(self, servo):
+        for channel in self.channels:
+            if channel is not None and channel.servo is servo:
+                return True
+        return False
+
+    def _tick(self, timer):
+        self.ticks += 1
+        active = False
+        for slot in range(self.MAX_CHANNELS):
+            channel = self.channels[slot]
+            if channel is None:
+                continue
+
+            if channel.until is not None and channel.until():
+                channel.stopped = True
+                self.channels[slot] = None
+                channel.servo.settle(channel.servo.duty_to_angle(channel.duties[channel.step]))
+                channel.done.set()
+                continue
+
+            steps = len(channel.duties)
+            step = (self.ticks - channel.start_tick) * self.tick_ms // channel.delay if channel.delay > 0 else steps
+            if step >= steps:
+                self.channels[slot] = None
+                channel.servo.settle(channel.target_angle)
+                channel.done.set()
+                continue
+
+            active = True
+            if step != channel.step:
+                channel.step = step
+                channel.servo.write_duty(channel.duties[step])
+
+        if not active:
+            self.running = False
+            self.timer.deinit()
+
+# Example usage
+if __name__ == "__main__":
+    from time import sleep_ms
+    from arm_lid import LidArm
+    from arm_switch import SwitchArm
+
+    lid_arm = LidArm(pin=2)
+    switch_arm = SwitchArm(pin=0)
+    sequencer = Sequencer()
+
+    lid = sequencer.move(lid_arm.servo, lid_arm.open_angle, lid_arm.servo.plan(lid_arm.open_angle, 500))
+    while not lid.done.is_set():
+        print("Lid moving, CPU is free...")
+        sleep_ms(50)
@@ -1,37 +1,59 @@
+from array import array
 from machine import Pin, PWM
 from time import sleep_ms
+from telemetry import log, EVT_RESET
+from trajectory import TrajectoryCache, LINEAR
 
 class SG90Servo:
     PWM_FREQ = 50  # 50 Hz (20 ms period)
     MIN_DUTY = 26  # 5% duty cycle
     MAX_DUTY = 123  # 10% duty cycle
+    MIN_DUTY_U16 = MIN_DUTY << 6  # Same pulse widths as MIN_DUTY/MAX_DUTY, in 16-bit duty
+    MAX_DUTY_U16 = MAX_DUTY << 6
+    ANGLE_SCALE = 4  # Duty table entries per degree
+    SETTLE_MS = 250  # Time for the servo to reach a position written at once
 
-    def __init__(self, pin, default_angle=0):
+    def __init__(self, pin, default_angle=0, home=True):
         """
         Initializes the SG90 servo.
         :param pin: The GPIO pin connected to the servo.
         :param default_angle: The default starting angle of the servo (default is 0 degrees).
+        :param home: Move to the default angle now. Without it, no pulses are sent until the first move.
         """
+        self.pin = pin
         self.servo = PWM(Pin(pin, mode=Pin.OUT))
         self.servo.freq(self.PWM_FREQ)  # Set the frequency to 50 Hz (20 ms period)
+        self.attached = True  # False while the servo gets no pulses, see detach
         self.default_angle = default_angle  # Set the default angle
+        self.duty_table = self._build_duty_table()
+        self.trajectories = TrajectoryCache(self.duty_table)
+        self.positions = None  # PositionStore the settled angle is kept in, see restore
+        self.slot = 0
         self.current_angle = self.default_angle  # Initialize current angle
-        self.move_to_angle(self.default_angle)  # Move to the default angle on initialization
+        if home:
+            self.move_to_angle(self.default_angle)  # Move to the default angle on initialization
 
-    def angle_to_duty(self, angle):
+    def _build_duty_table(self):
         """
-        Converts the angle (0-180 degrees) to the corresponding duty cycle.
-        :param angle: The angle to move the servo to (0 to 180 degrees).
-        :return: The duty cycle percentage corresponding to the angle.
+        Precomputes the 16-bit duty cycle for every 1/ANGLE_SCALE degree from 0 to 180 degrees,
+        so moving the servo only needs integer math.
+        """
+        span = self.MAX_DUTY_U16 - self.MIN_DUTY_U16
+        count = 180 * self.ANGLE_SCALE
+        return array('H', (self.MIN_DUTY_U16 + span * i // count for i in range(count + 1)))
+
+    def angle_to_index(self, angle):
         """
-        # Interpolate between these values based on the angle
-        if angle <= 0:
-            duty = self.MIN_DUTY
-        elif angle >= 180:
-            duty = self.MAX_DUTY
-        else:
-            duty = self.MIN_DUTY + (angle / 180) * (self.MAX_DUTY - self.MIN_DUTY)
-        return int(duty)
+        Converts an angle to its index in the duty table.
+        :param angle: The angle (0 to 180 degrees).
+        :return: The duty table index, clamped to the table.
+        """
+        index = int(angle * self.ANGLE_SCALE + 0.5)
+        if index < 0:
+            return 0
+        if index >= len(self.duty_table):
+            return len(self.duty_table) - 1
+        return index
 
     def move_to_angle(self, angle, force = False):
         """
@@ -45,44 +67,173 @@ class SG90Servo:
         if not force and angle == self.current_angle:
             return
 
-        duty_value = self.angle_to_duty(angle)
-        self.servo.duty(duty_value)
-        self.current_angle = angle  # Update the current angle
-        sleep_ms(250)  # Wait for the servo to move
+        if not self.attached:
+            self.attach()
+        self.unsettle()
+        self.servo.duty_u16(self.duty_table[self.angle_to_index(angle)])
+        sleep_ms(self.SETTLE_MS)  # Wait for the servo to move
+        self.settle(angle)  # Update the current angle
 
-    def move_smoothly(self, target_angle, duration_full_range=1000, steps=50):
+    def move_smoothly(self, target_angle, duration_full_range=1000, curve=LINEAR, until=None):
         """
         Moves the servo smoothly from the current angle to the target angle over a specified duration.
         The duration is relative to a full 0-180 degree movement.
 
         :param target_angle: The target angle to move the servo to (0 to 180 degrees).
         :param duration_full_range: The duration in milliseconds for a full 0-180 degree movement.
-        :param steps: Number of steps for smooth movement.
+        :param curve: Velocity profile of the movement, see trajectory.py.
+        :param until: Optional function checked between steps; the servo stops where it is once it returns True.
+        :return: True if until stopped the movement before the target angle.
         """
-        start_angle = self.current_angle
-        angle_difference = abs(target_angle - start_angle)
+        trajectory = self.plan(target_angle, duration_full_range, curve)
+        step = self._play(trajectory.duties, trajectory.delay, until)
+        if step >= 0:
+            self.settle(self.duty_to_angle(trajectory.duties[step]))
+            return True
 
-        # Calculate the duration relative to the angle difference
-        duration = (angle_difference / 180) * duration_full_range
+        self.settle(target_angle)  # Update the current angle to the target angle
+        return False
 
-        start_duty = self.angle_to_duty(start_angle)
-        end_duty = self.angle_to_duty(target_angle)
+    def plan(self, target_angle, duration_full_range=1000, curve=LINEAR):
+        """
+        Returns the (cached) trajectory from the current angle to the target angle.
+        The number of steps follows from the distance, see TrajectoryCache.plan.
 
-        delay = int(duration / steps)
-        step_size = (end_duty - start_duty) / steps
+        :param target_angle: The target angle to move the servo to (0 to 180 degrees).
+        :param duration_full_range: The duration in milliseconds for a full 0-180 degree movement.
+        :param curve: Velocity profile of the movement, see trajectory.py.
+        """
+        start_index = self.angle_to_index(self.current_angle)
+        end_index = self.angle_to_index(target_angle)
+
+        # Calculate the duration relative to the angle difference
+        duration = abs(end_index - start_index) * duration_full_range // (180 * self.ANGLE_SCALE)
 
-        for step in range(steps + 1):
-            duty_value = int(start_duty + step * step_size)
-            self.servo.duty(duty_value)
+        return self.trajectories.get(start_index, end_index, duration, curve)
+
+    def _play(self, duties, delay, until=None):
+        """
+        Writes a trajectory's duty cycles. Integer-only, so it does not allocate.
+        :return: Index of the duty written when until returned True, or -1 if the trajectory was played to the end.
+        """
+        if not self.attached:
+            self.attach()
+        self.unsettle()
+        write = self.servo.duty_u16
+        if until is None:
+            for duty in duties:
+                write(duty)
+                sleep_ms(delay)
+            return -1
+
+        for step in range(len(duties)):
+            write(duties[step])
             sleep_ms(delay)
+            if until():
+                return step
+        return -1
+
+    def duty_to_angle(self, duty):
+        """
+        Converts a 16-bit duty cycle back to the angle it positions the servo at.
+        """
+        return (duty - self.MIN_DUTY_U16) * 180 / (self.MAX_DUTY_U16 - self.MIN_DUTY_U16)
+
+    def write_duty(self, duty):
+        """
+        Writes a 16-bit duty cycle, e.g. one step of a trajectory.
+        """
+        if not self.attached:
+            self.attach()
+        self.servo.duty_u16(duty)
+
+    def write_angle(self, angle):
+        """
+        Writes the duty cycle for an angle without waiting for the servo to get there.
+        The servo counts as moving until the caller settles it.
+        :param angle: The angle to move the servo to (0 to 180 degrees).
+        """
+        if not self.attached:
+            self.attach()
+        self.unsettle()
+        self.servo.duty_u16(self.duty_table[self.angle_to_index(angle)])
+        self.current_angle = angle
+
+    def detach(self):
+        """
+        Stops the pulses, so the servo no longer holds its position or draws its holding current.
+        The next write starts them again.
+        """
+        if self.attached:
+            self.servo.deinit()
+            self.attached = False
 
-        self.current_angle = target_angle  # Update the current angle to the target angle
+    def attach(self):
+        """
+        Starts the pulses again after detach.
+        """
+        self.servo.init(freq=self.PWM_FREQ)
+        self.attached = True
+
+    def settle(self, angle):
+        """
+        Records the angle the servo has stopped at, persisting it if a PositionStore is attached.
+        """
+        self.current_angle = angle
+        if self.positions is not None:
+            self.positions.save(self.slot, self.angle_to_index(angle))
+
+    def unsettle(self):
+        """
+        Forgets the persisted angle when a move starts, so restore returns None after a reset mid-move.
+        """
+        if self.positions is not None:
+            self.positions.forget(self.slot)
+
+    def restore(self, positions, slot):
+        """
+        Attaches a PositionStore that keeps the settled angle across soft resets.
+        :param positions: The PositionStore.
+        :param slot: This servo's slot in it.
+        :return: The angle the servo was last settled at, or None if it is unknown (after a power cycle).
+        """
+        self.positions = positions
+        self.slot = slot
+        index = positions.load(slot)
+        if index is None:
+            return None
+        self.current_angle = index / self.ANGLE_SCALE
+        return self.current_angle
+
+    async def move_to(self, target_angle, duration=1000, curve=LINEAR, until=None):
+        """
+        Moves the servo to the target angle without blocking other tasks.
+        The duration is relative to a full 0-180 degree movement, as for move_smoothly.
+
+        :param target_angle: The target angle to move the servo to (0 to 180 degrees).
+        :param duration: The duration in milliseconds for a full 0-180 degree movement.
+        :param curve: Velocity profile of the movement, see trajectory.py.
+        :param until: Optional function checked by the motion engine every tick, see move_smoothly.
+        :return: True if until stopped the movement before the target angle.
+        """
+        from motion import scheduler
+
+        # A move in progress settles where it is first, so the new one is planned from there
+        scheduler.stop(self)
+        motion = scheduler.move(self, target_angle, self.plan(target_angle, duration, curve), until)
+        try:
+            await motion.done.wait()
+        finally:
+            # Cancelled mid-move: stop where we are instead of finishing the stroke
+            if not motion.done.is_set():
+                scheduler.stop(self)
+        return motion.stopped
 
     def reset(self):
         """
         Resets the servo to the default starting angle (default is 0 degrees) instantly.
         """
-        print(f"Resetting servo to {self.default_angle} degrees.")
+        log.record(EVT_RESET, self.pin, self.angle_to_index(self.default_angle))
         self.move_to_angle(self.default_angle, force=True)  # Move instantly to the default angle
 
 # Example usage
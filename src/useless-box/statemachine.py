@@ -0,0 +1,49 @@
+class StateMachine:
+    def __init__(self, owner, transitions, state_names, event_names):
+        """
+        Dispatches events through a transition table computed once, with one cell per (state, event).
+        A cell holds the cell's transitions in order; the first whose guard passes runs its action and
+        sets the next state. Dispatching is one tuple index, plus a guard call per transition tried.
+        :param owner: Object whose methods the guards and actions are.
+        :param transitions: (state, event, guard, action, next_state) tuples, with guard and action the
+            names of owner methods without arguments. A guard of None always passes; an action of None
+            does nothing; a next_state of None keeps the state.
+        :param state_names: Name of every state, indexed by the state's int.
+        :param event_names: Name of every event, indexed by the event's int.
+        """
+        self.transitions = tuple(transitions)
+        self.state_names = state_names
+        self.event_names = event_names
+        self.event_count = len(event_names)
+        cells = [[] for _ in range(len(state_names) * self.event_count)]
+        for state, event, guard, action, next_state in self.transitions:
+            cells[state * self.event_count + event].append((
+                None if guard is None else getattr(owner, guard),
+                None if action is None else getattr(owner, action),
+                next_state,
+            ))
+        self.table = tuple(tuple(cell) for cell in cells)
+
+    def dispatch(self, state, event):
+        """
+        Runs the transition of an event in a state, if one applies.
+        :param state: The current state.
+        :param event: The event.
+        :return: The next state.
+        """
+        for guard, action, next_state in self.table[state * self.event_count + event]:
+            if guard is None or guard():
+                if action is not None:
+                    action()
+                return state if next_state is None else next_state
+        return state
+
+    def graph(self):
+        """
+        Returns the transition graph by name, in dispatch order, to test or draw it without hardware.
+        :return: List of (state, event, guard, action, next state) names, with None where the
+            transition has no guard or action, and the state's own name when it keeps the state.
+        """
+        return [(self.state_names[state], self.event_names[event], guard, action,
+                 self.state_names[state if next_state is None else next_state])
+                for state, event, guard, action, next_state in self.transitions]
@@ -0,0 +1,39 @@
+"""
+States and modes shared by the firmware and the host scripts (scripts/compile_behaviors.py), so this
+module imports nothing from the board.
+"""
+try:
+    from micropython import const
+except ImportError:
+    def const(value):
+        return value
+
+# Controller states
+STATE_IDLE = const(0)
+STATE_LID_OPEN = const(1)
+STATE_TEASING = const(2)
+STATE_SWITCH_OFF = const(3)
+STATE_STAGED = const(4)  # Lid open and switch arm close to the switch, because a flip was predicted
+STATE_COUNT = const(5)
+
+STATE_NAMES = ("IDLE", "LID_OPEN", "TEASING", "SWITCH_OFF", "STAGED")
+
+# Simple class to simulate an enumeration. The states are the levels, from far to near;
+# level n is reached at the nth threshold.
+class ProximityState:
+    NO_DETECTION = 0
+    FAR = 1
+    CLOSE = 2
+    VERY_CLOSE = 3
+
+PROXIMITY_NAMES = ("NO_DETECTION", "FAR", "CLOSE", "VERY_CLOSE")  # Name of each ProximityState
+
+# LED patterns
+PATTERN_OFF = const(0)
+PATTERN_ON = const(1)
+PATTERN_BLINK_SLOW = const(2)
+PATTERN_BLINK_FAST = const(3)
+PATTERN_BREATHE = const(4)
+PATTERN_STROBE = const(5)
+
+PATTERN_NAMES = ("OFF", "ON", "BLINK_SLOW", "BLINK_FAST", "BREATHE", "STROBE")
@@ -13,4 +13,17 @@ class ToggleSwitch:
         Checks if the toggle switch is in the "On" state.
         :return: True if the switch is "On", False otherwise.
         """
-        return self.pin.value() < 0.5
\ No newline at end of file
+        return self.pin.value() < 0.5
+
+    def is_off(self):
+        """
+        Checks if the toggle switch is in the "Off" state. Cheap enough to be polled by the motion engine.
+        """
+        return self.pin.value() > 0
+
+    def on_change(self, handler):
+        """
+        Calls the handler from an interrupt on every edge of the toggle switch.
+        :param handler: Function taking the Pin that changed, or None to disable the interrupt.
+        """
+        self.pin.irq(handler=handler, trigger=Pin.IRQ_RISING | Pin.IRQ_FALLING)
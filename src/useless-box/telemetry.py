@@ -0,0 +1,134 @@
+import struct
+from machine import disable_irq, enable_irq
+from micropython import const
+from time import ticks_ms
+
+# Levels, in the high byte of every event id
+DEBUG = const(0)
+INFO = const(1)
+WARNING = const(2)
+
+# Events and their arguments. Angles are in duty table steps (1/4 degree), see SG90Servo.ANGLE_SCALE.
+# scripts/decode_telemetry.py turns them back into text.
+EVT_PROXIMITY = const(0x001)  # ProximityState
+EVT_LED = const(0x002)  # LED pattern, 1 on, 0 off or one of the led PATTERN_ constants
+EVT_LID_OPEN = const(0x003)  # Percentage, duration ms
+EVT_LID_CLOSE = const(0x004)  # Percentage, duration ms
+EVT_OVERLAP = const(0x005)  # Milliseconds both arms moved at once
+EVT_ATTEMPT = const(0x006)  # Switch-off attempt number
+EVT_SLEEP = const(0x007)
+EVT_WAKE = const(0x008)  # 1 woken by the switch, 2 by a hand; resume time us
+EVT_COLLECT = const(0x009)  # Garbage collection at an idle point: duration ms, heap allocated KB after it
+
+EVT_SWITCH = const(0x101)  # 1 on, 0 off
+EVT_STATE = const(0x102)  # Controller state
+EVT_DELAY = const(0x103)  # Random delay ms before switching off
+EVT_SWITCH_OFF = const(0x104)
+EVT_SWITCHED_OFF = const(0x105)  # Attempts it took
+EVT_STAGE = const(0x106)
+EVT_STAND_DOWN = const(0x107)
+EVT_GESTURE = const(0x108)  # APDS9960_DIR_*
+EVT_TEASE = const(0x109)  # Lid percentage
+EVT_FAKEOUT = const(0x10a)
+EVT_PEEKABOO = const(0x10b)
+EVT_THREATEN = const(0x10c)
+EVT_CLOSE_LID = const(0x10d)
+EVT_KEEP_CLOSED = const(0x10e)
+EVT_HOLD_BACK = const(0x10f)
+EVT_SWITCH_ON_TOO_LONG = const(0x110)
+EVT_INACTIVE = const(0x111)
+EVT_PANIC = const(0x112)
+EVT_PUSH = const(0x113)
+EVT_TOGGLE_ANGLE = const(0x114)  # Angle the switch toggled at
+EVT_HOME = const(0x115)  # Servo pin, angle
+EVT_RESET = const(0x116)  # Servo pin, angle
+EVT_WIFI_CONNECTED = const(0x117)  # Attempts, duration ms of the last one, 1 if from the cached connection
+EVT_PROFILE_LOADED = const(0x118)  # Extended switch arm angle, open lid angle, clear lid angle of the calibration profile
+
+EVT_STILL_ON = const(0x201)  # Switch-off attempt number
+EVT_TOGGLE_MISSED = const(0x202)  # Angle the learned push ended at
+EVT_SLOW_WAKE = const(0x203)  # Resume time us, bound ms
+EVT_UNPLANNED_COLLECT = const(0x204)  # Garbage collected during a pass: pass number
+EVT_WIFI_FAILED = const(0x205)  # Attempt, network.STAT_*, backoff s (0 when the cached connection failed)
+EVT_WIFI_LOST = const(0x206)  # network.STAT_* after the link dropped
+EVT_BEHAVIOR_MISSING = const(0x207)  # Index in behavior.BEHAVIOR_NAMES of a program that is not loaded, -1 for another name
+EVT_NO_BEHAVIORS = const(0x208)  # The behavior program folder is missing
+
+RECORD_FORMAT = "<IHhhh"  # ticks_ms, event id, three arguments
+RECORD_SIZE = const(12)
+FILE_MAGIC = b"TLM1"
+HEADER_FORMAT = "<4sHHI"  # FILE_MAGIC, record size, records in the file, records written in total
+
+class Telemetry:
+    def __init__(self, size=256, level=INFO):
+        """
+        Records events as fixed-size binary records in a preallocated ring buffer, instead of
+        printing them. Recording packs integers into the buffer and allocates nothing.
+        The buffer keeps the last size records; dump or save them and decode them on the
+        computer with scripts/decode_telemetry.py.
+        :param size: Number of records kept.
+        :param level: Events below this level are not recorded.
+        """
+        self.buffer = bytearray(size * RECORD_SIZE)
+        self.size = size
+        self.level = level
+        self.next = 0  # Record slot written next
+        self.count = 0  # Records written in total
+
+    def record(self, event, a=0, b=0, c=0):
+        """
+        Records an event, if its level is enabled. Safe to call from an interrupt handler and from
+        the sensing and WiFi threads: the slot is claimed with interrupts off, so two callers never
+        pack into the same one, and packed after.
+        DEBUG events are recorded under `if __debug__:`, so they compile away at optimization
+        level 1 (micropython.opt_level(1), or mpy-cross -O1, see scripts/build.py --optimize).
+        :param event: One of the EVT_* ids.
+        :param a: First argument, a signed 16-bit integer.
+        :param b: Second argument.
+        :param c: Third argument.
+        """
+        if event >> 8 < self.level:
+            return
+        irq_state = disable_irq()
+        slot = self.next
+        self.next = slot + 1 if slot + 1 < self.size else 0
+        self.count += 1
+        enable_irq(irq_state)
+        struct.pack_into(RECORD_FORMAT, self.buffer, slot * RECORD_SIZE, ticks_ms(), event, a, b, c)
+
+    def clear(self):
+        self.next = 0
+        self.count = 0
+
+    def records(self):
+        """
+        Returns the recorded bytes, oldest record first. Allocates a copy of the buffer.
+        """
+        if self.count < self.size:
+            return bytes(self.buffer[:self.next * RECORD_SIZE])
+        split = self.next * RECORD_SIZE
+        return bytes(self.buffer[split:]) + bytes(self.buffer[:split])
+
+    def save(self, path="telemetry.bin"):
+        """
+        Writes the records to a file, to be copied to the computer and decoded there.
+        :param path: File to write.
+        """
+        data = self.records()
+        with open(path, "wb") as file:
+            file.write(struct.pack(HEADER_FORMAT, FILE_MAGIC, RECORD_SIZE, len(data) // RECORD_SIZE, self.count))
+            file.write(data)
+
+    def dump(self):
+        """
+        Prints the records as hex, e.g. through `mpremote exec "import telemetry; telemetry.log.dump()"`.
+        scripts/decode_telemetry.py reads the printed text as well as a saved file.
+        """
+        from binascii import hexlify
+
+        data = self.records()
+        print(str(hexlify(struct.pack(HEADER_FORMAT, FILE_MAGIC, RECORD_SIZE, len(data) // RECORD_SIZE, self.count)), "ascii"))
+        for start in range(0, len(data), 32 * RECORD_SIZE):
+            print(str(hexlify(data[start:start + 32 * RECORD_SIZE]), "ascii"))
+
+log = Telemetry()  # Shared by every module
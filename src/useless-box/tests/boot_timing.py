@@ -0,0 +1,72 @@
+import gc
+import sys
+from time import ticks_us, ticks_diff
+
+print("Boot Timing Test")
+print("================")
+
+# Dependencies first, so every line only counts the module itself
+MODULES = (
+    "apds9960.const",
+    "apds9960",
+    "states",
+    "telemetry",
+    "profiler",
+    "trajectory",
+    "filters",
+    "sg90",
+    "arm_lid",
+    "arm_switch",
+    "proximity",
+    "gestures",
+    "switch",
+    "led",
+    "predictor",
+    "calibration",
+    "planner",
+    "statemachine",
+    "power",
+    "heap",
+    "sampler",
+    "wifi",
+    "useless_box",
+    "controller",
+    "motion",
+    "events",
+    "bytecode",
+    "behavior",
+    "async_controller",
+    "event_controller",
+)
+
+# Forget modules imported by boot.py before the REPL was interrupted, so they load again
+for name in MODULES:
+    sys.modules.pop(name, None)
+gc.collect()
+
+boot_free = gc.mem_free()
+total_us = 0
+print("{:<20} {:>8} {:>8}  {}".format("module", "ms", "bytes", "loaded from"))
+for name in MODULES:
+    gc.collect()
+    free = gc.mem_free()
+    start = ticks_us()
+    __import__(name)
+    elapsed = ticks_diff(ticks_us(), start)
+    total_us += elapsed
+    module = sys.modules[name]
+    source = getattr(module, "__file__", "built-in")
+    print("{:<20} {:>8.1f} {:>8}  {}".format(name, elapsed / 1000, free - gc.mem_free(), source))
+
+gc.collect()
+print("imports: {:.1f} ms, {} bytes".format(total_us / 1000, boot_free - gc.mem_free()))
+
+# Time until the box is ready for the first interaction, with the pins from boot.py
+from controller import UselessBoxController
+
+start = ticks_us()
+controller = UselessBoxController(switch_pin=0, lid_pin=2, sda_pin=6, scl_pin=7, toggle_pin=21, led_pin=8)
+print("controller ready: {:.1f} ms".format(ticks_diff(ticks_us(), start) / 1000))
+
+gc.collect()
+print("free heap after boot: {} bytes".format(gc.mem_free()))
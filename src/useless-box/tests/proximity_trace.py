@@ -0,0 +1,34 @@
+# Records raw proximity readings and the toggle switch for scripts/score_predictor.py.
+# Reach for the switch a few times, flipping it sometimes, then stop with Ctrl-C.
+
+from time import sleep_ms, ticks_ms, ticks_diff
+
+from machine import Pin, SoftI2C
+
+from apds9960 import uAPDS9960 as APDS9960
+from switch import ToggleSwitch
+
+INTERVAL_MS = 20
+FILE = "trace.csv"
+
+print("Proximity Trace")
+print("===============")
+
+bus = SoftI2C(sda=Pin(6), scl=Pin(7))
+apds = APDS9960(bus)
+apds.enableProximitySensor()
+toggle = ToggleSwitch(21)
+
+start = ticks_ms()
+samples = 0
+with open(FILE, "w") as trace:
+    trace.write("ms,proximity,switch\n")
+    try:
+        while True:
+            trace.write("{},{},{}\n".format(ticks_diff(ticks_ms(), start), apds.readProximity(), 1 if toggle.is_on() else 0))
+            samples += 1
+            sleep_ms(INTERVAL_MS)
+    except KeyboardInterrupt:
+        pass
+
+print("{} samples in {}, copy it with: mpremote cp :{} .".format(samples, FILE, FILE))
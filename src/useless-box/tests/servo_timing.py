@@ -0,0 +1,40 @@
+import gc
+from array import array
+from time import ticks_us, ticks_diff
+from sg90 import SG90Servo
+
+print("Servo Step Timing Test")
+print("======================")
+
+STEPS = 100  # Upper bound on the trajectory steps of one move
+
+class TimedPWM:
+    """
+    Wraps the servo PWM to timestamp every duty write into a preallocated array.
+    """
+    def __init__(self, pwm):
+        self.pwm = pwm
+        self.times = array('i', [0] * (STEPS + 1))
+        self.count = 0
+
+    def duty_u16(self, value):
+        if self.count < len(self.times):
+            self.times[self.count] = ticks_us()
+            self.count += 1
+        self.pwm.duty_u16(value)
+
+servo = SG90Servo(0, default_angle=40)
+timed = TimedPWM(servo.servo)
+servo.servo = timed
+
+for target in (175, 40, 175, 40):
+    timed.count = 0
+    gc.collect()
+    free = gc.mem_free()
+    servo.move_smoothly(target_angle=target, duration_full_range=500)
+    allocated = free - gc.mem_free()
+
+    intervals = [ticks_diff(timed.times[i + 1], timed.times[i]) for i in range(timed.count - 1)]
+    mean = sum(intervals) // len(intervals)
+    print("move to {}: allocated={} bytes, step mean={}us min={}us max={}us jitter={}us".format(
+        target, allocated, mean, min(intervals), max(intervals), max(intervals) - min(intervals)))
@@ -0,0 +1,49 @@
+from time import ticks_us, ticks_diff
+from statemachine import StateMachine
+from controller import (TRANSITIONS, STATE_NAMES, EVENT_NAMES, STATE_IDLE, STATE_LID_OPEN, STATE_STAGED,
+                        EV_NO_DETECTION, EV_CLOSE, EV_VERY_CLOSE, EV_SWITCH_ON, EV_TIMER)
+
+print("State Machine Test")
+print("==================")
+
+class Stub:
+    """
+    Stands in for the controller: the guards named in passing pass, and actions are only recorded.
+    """
+    def __init__(self, passing=()):
+        self.passing = passing
+        self.actions = []
+
+    def __getattr__(self, name):
+        if name.startswith("_on_"):
+            return lambda: self.actions.append(name)
+        return lambda: name in self.passing
+
+def check(state, event, passing, expected_state, expected_actions):
+    stub = Stub(passing)
+    machine = StateMachine(stub, TRANSITIONS, STATE_NAMES, EVENT_NAMES)
+    next_state = machine.dispatch(state, event)
+    ok = next_state == expected_state and stub.actions == expected_actions
+    print("{} {} + {} -> {} {}".format("ok  " if ok else "FAIL", STATE_NAMES[state], EVENT_NAMES[event],
+                                      STATE_NAMES[next_state], stub.actions))
+
+check(STATE_IDLE, EV_NO_DETECTION, (), STATE_IDLE, [])
+check(STATE_IDLE, EV_VERY_CLOSE, (), STATE_IDLE, ["_on_hold_back"])
+check(STATE_IDLE, EV_VERY_CLOSE, ("_roll_threaten",), STATE_LID_OPEN, ["_on_threaten"])
+check(STATE_IDLE, EV_CLOSE, ("_roll_fakeout",), STATE_IDLE, ["_on_fakeout"])
+check(STATE_STAGED, EV_CLOSE, (), STATE_STAGED, [])
+check(STATE_STAGED, EV_NO_DETECTION, ("_stage_over",), STATE_IDLE, ["_on_stand_down"])
+check(STATE_LID_OPEN, EV_TIMER, ("_inactive",), STATE_IDLE, ["_on_inactive"])
+for state in range(len(STATE_NAMES)):
+    check(state, EV_SWITCH_ON, (), STATE_IDLE, ["_on_switch_on"])
+
+print("{} transitions:".format(len(TRANSITIONS)))
+machine = StateMachine(Stub(), TRANSITIONS, STATE_NAMES, EVENT_NAMES)
+for edge in machine.graph():
+    print("  {} + {} [{}] / {} -> {}".format(*edge))
+
+COUNT = 1000
+start = ticks_us()
+for i in range(COUNT):
+    machine.dispatch(STATE_IDLE, EV_NO_DETECTION)
+print("dispatch without a transition: {}us".format(ticks_diff(ticks_us(), start) / COUNT))
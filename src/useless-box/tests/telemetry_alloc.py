@@ -0,0 +1,36 @@
+import gc
+from time import ticks_us, ticks_diff
+from telemetry import Telemetry, INFO, EVT_SWITCH, EVT_LID_OPEN
+
+print("Telemetry Allocation Test")
+print("=========================")
+
+COUNT = 1000
+
+log = Telemetry(size=64, level=INFO)
+
+gc.collect()
+free = gc.mem_free()
+start = ticks_us()
+for i in range(COUNT):
+    log.record(EVT_SWITCH, i & 1)
+elapsed = ticks_diff(ticks_us(), start)
+print("record: allocated={} bytes, {}us per record".format(free - gc.mem_free(), elapsed // COUNT))
+
+gc.collect()
+free = gc.mem_free()
+start = ticks_us()
+for i in range(COUNT):
+    log.record(EVT_LID_OPEN, 50, 300)  # DEBUG, filtered out at INFO
+elapsed = ticks_diff(ticks_us(), start)
+print("filtered: allocated={} bytes, {}us per record".format(free - gc.mem_free(), elapsed // COUNT))
+
+gc.collect()
+free = gc.mem_free()
+start = ticks_us()
+for i in range(100):
+    print(f"Switch state: {'On' if i & 1 else 'Off'}")
+elapsed = ticks_diff(ticks_us(), start)
+print("print: allocated={} bytes, {}us per line".format(free - gc.mem_free(), elapsed // 100))
+
+log.dump()
@@ -0,0 +1,94 @@
+from array import array
+from micropython import const
+
+# Velocity profiles
+LINEAR = const(0)  # Constant speed
+EASE_IN_OUT = const(1)  # Cubic ease in and out
+TRAPEZOIDAL = const(2)  # Constant acceleration for the first third, cruise, constant deceleration for the last third
+S_CURVE = const(3)  # Jerk-limited (smootherstep), no sudden changes in acceleration
+
+def position(curve, t):
+    """
+    Fraction of the distance covered at a point in time of a movement.
+    :param curve: One of LINEAR, EASE_IN_OUT, TRAPEZOIDAL or S_CURVE.
+    :param t: Fraction of the movement duration (0 to 1).
+    :return: Fraction of the distance (0 to 1).
+    """
+    if curve == EASE_IN_OUT:
+        if t < 0.5:
+            return 4 * t * t * t
+        u = 2 - 2 * t
+        return 1 - u * u * u / 2
+    if curve == TRAPEZOIDAL:
+        # Top speed 1.5 reached after a third of the duration, so the area under the profile is 1
+        if t < 1 / 3:
+            return 2.25 * t * t
+        if t < 2 / 3:
+            return 0.25 + 1.5 * (t - 1 / 3)
+        u = 1 - t
+        return 1 - 2.25 * u * u
+    if curve == S_CURVE:
+        return t * t * t * (t * (6 * t - 15) + 10)
+    return t
+
+class Trajectory:
+    def __init__(self, duties, delay):
+        """
+        A planned movement: the duty cycles to write, one every delay milliseconds.
+        :param duties: array('H') of 16-bit duty cycles, ending at the target position.
+        :param delay: Milliseconds between writes.
+        """
+        self.duties = duties
+        self.delay = delay
+
+class TrajectoryCache:
+    UPDATE_MS = 20  # The servo only takes a new position once per PWM period (50 Hz)
+    SIZE = 16
+
+    def __init__(self, duty_table, update_ms=UPDATE_MS, size=SIZE):
+        """
+        Plans servo movements and keeps the most recent plans, so repeated moves reuse their duty arrays.
+        :param duty_table: The servo's duty table, see SG90Servo.angle_to_index.
+        :param update_ms: Shortest useful time between two duty writes.
+        :param size: Maximum number of cached trajectories.
+        """
+        self.duty_table = duty_table
+        self.update_ms = update_ms
+        self.size = size
+        self.trajectories = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, start_index, end_index, duration, curve=LINEAR):
+        """
+        Returns the trajectory between two duty table indexes, planning it if it is not cached.
+        :param start_index: Duty table index to start from.
+        :param end_index: Duty table index to end at.
+        :param duration: Duration in milliseconds of the movement.
+        :param curve: Velocity profile of the movement.
+        """
+        key = (start_index, end_index, duration, curve)
+        trajectory = self.trajectories.get(key)
+        if trajectory is not None:
+            self.hits += 1
+            return trajectory
+
+        self.misses += 1
+        if len(self.trajectories) >= self.size:
+            self.trajectories.pop(next(iter(self.trajectories)))
+        trajectory = self.plan(start_index, end_index, duration, curve)
+        self.trajectories[key] = trajectory
+        return trajectory
+
+    def plan(self, start_index, end_index, duration, curve=LINEAR):
+        """
+        Plans a movement with one step per update period, but never more steps than table indexes covered.
+        """
+        distance = end_index - start_index
+        steps = min(abs(distance), duration // self.update_ms)
+        if steps < 1:
+            steps = 1
+
+        table = self.duty_table
+        duties = array('H', (table[start_index + round(distance * position(curve, step / steps))] for step in range(1, steps + 1)))
+        return Trajectory(duties, duration // steps)
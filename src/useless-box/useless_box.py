@@ -1,44 +1,140 @@
 import time
+from time import sleep_ms
 from arm_lid import LidArm
 from arm_switch import SwitchArm
-from proximity import ProximitySensor
+from apds9960.const import APDS9960_DIR_NONE
+from calibration import CalibrationProfile
+from gestures import GesturePipeline
+from planner import ArmPlanner
+from positions import PositionStore
+from proximity import ProximitySensor, ProximityState
+from registry import Registry
+from sg90 import SG90Servo
 from switch import ToggleSwitch
+from telemetry import (log, EVT_HOME, EVT_LID_CLOSE, EVT_LID_OPEN, EVT_PEEKABOO, EVT_PROFILE_LOADED, EVT_PUSH, EVT_TEASE,
+                       EVT_THREATEN)
 
 class UselessBox:
-    def __init__(self, switch_pin, lid_pin, sda_pin, scl_pin, toggle_pin):
-        self.switch_arm = SwitchArm(switch_pin)
-        self.lid_arm = LidArm(lid_pin)
-        self.proximity_sensor = ProximitySensor(sda_pin, scl_pin)
-        self.toggle_switch = ToggleSwitch(toggle_pin)
+    ARMS = ("switch_arm", "lid_arm")  # Also their slots in the PositionStore
+
+    def __init__(self, switch_pin, lid_pin, sda_pin, scl_pin, toggle_pin, proximity_int_pin=None, hardware_i2c=False, proximity_filter=None, gesture_drain_ms=None):
+        """
+        Sets up the box. The peripherals are only created when first used, see home.
+        :param proximity_int_pin: GPIO pin connected to the APDS-9960 INT line, see ProximitySensor.
+        :param hardware_i2c: Talk to the APDS-9960 with the I2C peripheral instead of SoftI2C.
+        :param proximity_filter: Filter for the proximity readings, see ProximitySensor.
+        :param gesture_drain_ms: How often get_gesture is called, or None to leave the gesture engine off.
+        """
+        self.components = Registry()
+        self.components.register("switch_arm", lambda: SwitchArm(
+            switch_pin, self.profile.retracted_angle, self.profile.extended_angle, home=False))
+        self.components.register("lid_arm", lambda: LidArm(
+            lid_pin, self.profile.close_angle, self.profile.open_angle, self.profile.clear_angle, home=False))
+        self.components.register("proximity_sensor", lambda: ProximitySensor(
+            sda_pin, scl_pin, int_pin=proximity_int_pin, hardware_i2c=hardware_i2c, sample_filter=proximity_filter))
+        self.components.register("toggle_switch", lambda: ToggleSwitch(toggle_pin))
+        self.components.register("gesture_sensor", lambda: GesturePipeline(self.proximity_sensor, gesture_drain_ms))
+        self.components.register("planner", lambda: ArmPlanner(self.lid_arm, self.switch_arm))
+        self.gesture_drain_ms = gesture_drain_ms
+        self.positions = PositionStore(len(self.ARMS))
+        self._profile = None
+
+    @property
+    def profile(self):
+        """
+        The arm endpoints, from the profile saved by calibration.py, or the uncalibrated ones.
+        Read from flash when the first arm is created.
+        """
+        if self._profile is None:
+            self._profile = CalibrationProfile.load()
+            if self._profile is None:
+                self._profile = CalibrationProfile()
+            else:
+                profile = self._profile
+                log.record(EVT_PROFILE_LOADED, int(profile.extended_angle * SG90Servo.ANGLE_SCALE),
+                           int(profile.open_angle * SG90Servo.ANGLE_SCALE), int(profile.clear_angle * SG90Servo.ANGLE_SCALE))
+        return self._profile
+
+    @property
+    def switch_arm(self):
+        if not self.components.is_created("switch_arm"):
+            self.home()
+        return self.components.get("switch_arm")
+
+    @property
+    def lid_arm(self):
+        if not self.components.is_created("lid_arm"):
+            self.home()
+        return self.components.get("lid_arm")
+
+    @property
+    def proximity_sensor(self):
+        return self.components.get("proximity_sensor")
+
+    @property
+    def toggle_switch(self):
+        return self.components.get("toggle_switch")
+
+    @property
+    def planner(self):
+        return self.components.get("planner")
+
+    def home(self, wait=True):
+        """
+        Creates both arms and moves them to their default positions at the same time.
+        An arm that is already there according to the position kept across a soft reset is not waited for.
+        :param wait: Block until the arms have settled; the async controllers keep sampling instead.
+        :return: Milliseconds the arms need to settle.
+        """
+        settle_ms = 0
+        moving = []
+        for slot, name in enumerate(self.ARMS):
+            servo = self.components.get(name).servo
+            angle = servo.restore(self.positions, slot)
+            servo.write_angle(servo.default_angle)
+            if angle is None or servo.angle_to_index(angle) != servo.angle_to_index(servo.default_angle):
+                log.record(EVT_HOME, servo.pin, servo.angle_to_index(servo.default_angle))
+                settle_ms = SG90Servo.SETTLE_MS
+                moving.append(servo)
+            else:
+                servo.settle(servo.default_angle)
+
+        if wait and settle_ms:
+            sleep_ms(settle_ms)
+            for servo in moving:
+                servo.settle(servo.default_angle)
+        # Without waiting, a moving arm's position stays unknown until its first move ends
+        return settle_ms
 
     def open_lid(self, percentage, duration):
         """
         Opens the lid to the specified percentage over a given duration.
         """
-        print(f"Opening lid to {percentage}% over {duration}ms.")
+        if __debug__:
+            log.record(EVT_LID_OPEN, percentage, duration)
         self.lid_arm.open(percentage, duration)
 
     def close_lid(self, percentage, duration):
         """
         Closes the lid to the specified percentage over a given duration.
         """
-        print(f"Closing lid to {percentage}% over {duration}ms.")
+        if __debug__:
+            log.record(EVT_LID_CLOSE, percentage, duration)
         self.lid_arm.close(percentage, duration)
 
     def switch_off(self, duration):
         """
         Extends the switch arm to turn off the toggle.
         """
-        print("Extending switch arm to turn off the toggle.")
-        self.switch_arm.extend(100, duration)
-        time.sleep(0.5)
+        log.record(EVT_PUSH)
+        self.switch_arm.push(self.toggle_switch, duration)
         self.switch_arm.retract(100, duration)
 
     def play_peekaboo(self):
         """
         Performs the peek-a-boo sequence.
         """
-        print("Playing peek-a-boo!")
+        log.record(EVT_PEEKABOO)
         self.lid_arm.open(50, 300)
         time.sleep(0.5)
         self.lid_arm.close(0, 300)
@@ -47,7 +143,7 @@ class UselessBox:
         """
         Performs a teasing sequence when the hand is detected at a medium distance.
         """
-        print("Teasing the user!")
+        log.record(EVT_TEASE, 30)
         self.lid_arm.open(30, 300)
         time.sleep(0.3)
         self.lid_arm.close(0, 300)
@@ -56,19 +152,33 @@ class UselessBox:
         """
         A more involved teasing sequence where the switch arm moves partially.
         """
-        print("Threatening to switch off!")
-        self.lid_arm.open(100, 500)
-        self.switch_arm.extend(50, 300)
+        log.record(EVT_THREATEN)
+        self.planner.open_and_extend(100, 500, 50, 300, "threatening_tease")
         time.sleep(0.5)
-        self.switch_arm.retract(50, 300)
-        self.lid_arm.close(0, 500)
+        self.planner.retract_and_close(100, 300, 100, 500, "threatening_tease")
 
     def get_proximity(self):
         """
         Returns the proximity reading from the sensor.
         """
+        if self.components.is_created("gesture_sensor") and self.components.get("gesture_sensor").streaming:
+            # The sensor is in its gesture engine and the proximity reading is not updated
+            return self.proximity_sensor.state
         return self.proximity_sensor.read_proximity()
 
+    def get_gesture(self, proximity):
+        """
+        Drains the gesture FIFO while a hand is in range.
+        :param proximity: The current ProximityState; without a hand nearby the bus is left alone.
+        :return: The APDS9960_DIR_* of a completed gesture, or APDS9960_DIR_NONE.
+        """
+        if self.gesture_drain_ms is None:
+            return APDS9960_DIR_NONE
+        gestures = self.components.get("gesture_sensor")
+        if proximity == ProximityState.NO_DETECTION and not gestures.streaming:
+            return APDS9960_DIR_NONE
+        return gestures.poll()
+
     def get_switch_state(self):
         """
         Returns the current state of the switch.
@@ -1,23 +1,47 @@
+import struct
 import time
 import network
+from micropython import const
+from telemetry import log, EVT_WIFI_CONNECTED, EVT_WIFI_FAILED, EVT_WIFI_LOST
 
 # Configuration for the Access Point
 SSID = 'MicroPython-AP'
 PASSWORD = '12345678'
 
+CACHE_PATH = "wifi.bin"  # On the board's flash, next to boot.py; None to never cache the connection
+
+# WiFiManager states
+WIFI_OFF = const(0)  # Not started yet
+WIFI_CONNECTING = const(1)
+WIFI_CONNECTED = const(2)
+WIFI_BACKOFF = const(3)  # Waiting to try again after a failed attempt
+
+WIFI_NAMES = ("OFF", "CONNECTING", "CONNECTED", "BACKOFF")
+
+# Station statuses an attempt ends with, on the ESP32 port
+FAILED_STATUSES = (network.STAT_NO_AP_FOUND, network.STAT_WRONG_PASSWORD, network.STAT_ASSOC_FAIL,
+                   network.STAT_HANDSHAKE_TIMEOUT, network.STAT_BEACON_TIMEOUT)
+
 sta_if = network.WLAN(network.STA_IF)
 
-def connect_to_wifi(ssid=SSID, password=PASSWORD):
+def connect_to_wifi(ssid=SSID, password=PASSWORD, timeout_ms=15000):
+    """
+    Connects to an access point and waits for it, at most timeout_ms. Blocks the caller; boot.py
+    starts a WiFiManager instead, so the box does not wait for the network.
+    :return: True if connected.
+    """
     #ap_if = network.WLAN(network.AP_IF)
     sta_if.active(True)
     sta_if.connect(ssid, password)
 
     print('Connecting to WiFi', end="")
-    while not sta_if.isconnected():
+    start = time.ticks_ms()
+    while not sta_if.isconnected() and time.ticks_diff(time.ticks_ms(), start) < timeout_ms:
         time.sleep(1)
         print('.', end="")
 
-    print('connected')
+    print('connected' if sta_if.isconnected() else 'timed out')
+    return sta_if.isconnected()
 
 def network_config():
     print('Network config:', sta_if.ifconfig())
@@ -25,8 +49,8 @@ def network_config():
 def try_connect_to_wifi():
     if sta_if.isconnected():
         print('Already connected')
-    else:
-        connect_to_wifi()
+    elif not connect_to_wifi():
+        return
 
     network_config()
 
@@ -37,3 +61,227 @@ def start_hotspot(ssid=SSID, password=PASSWORD):
     ap.config(essid=ssid, password=password)
     print(f"Access Point {ssid} started with IP: {ap.ifconfig()[0]}")
 
+class WiFiManager:
+    CONNECT_TIMEOUT_MS = 15000  # Scan, association and DHCP
+    FAST_TIMEOUT_MS = 5000  # Association with the cached access point and DHCP
+    BACKOFF_MS = 2000  # Wait after the first failed attempt, doubled after every further one
+    MAX_BACKOFF_MS = 60000
+    POLL_MS = 100  # Between status checks while connecting
+    WATCH_MS = 1000  # Between link checks while connected
+
+    CACHE_MAGIC = 0x5557  # "UW"
+    CACHE_FORMAT = "<H6sB"  # Magic, BSSID, channel
+
+    def __init__(self, ssid=SSID, password=PASSWORD, on_change=None, cache_path=CACHE_PATH, timeout_ms=CONNECT_TIMEOUT_MS):
+        """
+        Connects to an access point on a thread of its own, so the box starts at the same time whether
+        the network is up or not. An attempt that fails or times out is retried after an exponential
+        backoff, and a dropped link is connected again.
+        The BSSID and channel of a connection are cached in flash. The next connection, after a reset
+        or a drop, joins that access point on that channel, which skips the scan. The address still
+        comes from DHCP, so the lease is renewed. If that fails, the next attempt scans, and a
+        connection it makes replaces the cache.
+        :param ssid: Network to join.
+        :param password: Its password.
+        :param on_change: Function called with the new WIFI_ state on every change, from the WiFi thread.
+            Keep it short, as for an interrupt handler.
+        :param cache_path: File the connection is cached in, or None to always scan.
+        :param timeout_ms: Time a scanning attempt gets before it counts as failed.
+        """
+        self.ssid = ssid
+        self.password = password
+        self.on_change = on_change
+        self.cache_path = cache_path
+        self.timeout_ms = timeout_ms
+        self.wlan = network.WLAN(network.STA_IF)
+        self.state = WIFI_OFF
+        self.running = False
+        self.cache = self._load()  # (bssid, channel), or None
+        self.found = None  # (bssid, channel) the current scanning attempt joins
+        self.fast = False  # The current attempt uses the cache
+        self.skip_cache = False  # The last attempt with the cache failed, so the next one scans
+        self.attempt_ms = 0
+        self.attempts = 0  # Since the last connection
+        self.backoff_ms = 0
+
+        # Instrumentation, see stats
+        self.started_ms = 0
+        self.first_connect_ms = None  # From start to the first connection
+        self.connect_ms = None  # Duration of the attempt that connected last
+        self.connections = 0
+        self.fast_connections = 0
+        self.failures = 0
+        self.drops = 0
+
+    def start(self):
+        """
+        Starts connecting on the WiFi thread and returns at once.
+        """
+        import _thread  # Only when the WiFi is used
+        self.started_ms = time.ticks_ms()
+        self.running = True
+        _thread.start_new_thread(self._run, ())
+
+    def stop(self):
+        """
+        Ends the WiFi thread after its current step, leaving the connection as it is.
+        """
+        self.running = False
+
+    def is_connected(self):
+        return self.state == WIFI_CONNECTED
+
+    def _run(self):
+        while self.running:
+            time.sleep_ms(self.step())
+
+    def step(self):
+        """
+        Advances the connection by one step. The WiFi thread calls it in a loop; only a scan blocks.
+        :return: Milliseconds until the next step.
+        """
+        now = time.ticks_ms()
+        state = self.state
+        wlan = self.wlan
+        if state == WIFI_OFF:
+            wlan.active(True)
+            wlan.config(reconnects=0)  # Reconnecting is left to the manager, with its backoff
+            if wlan.isconnected():
+                # Still connected from before a soft reset
+                self.attempt_ms = now
+                return self._connected(now)
+            return self._attempt(now)
+        if state == WIFI_CONNECTED:
+            if wlan.isconnected():
+                return self.WATCH_MS
+            self.drops += 1
+            log.record(EVT_WIFI_LOST, wlan.status())
+            return self._attempt(now)
+        if state == WIFI_BACKOFF:
+            return self._attempt(now)
+
+        if wlan.isconnected():
+            return self._connected(now)
+        status = wlan.status()
+        if status in FAILED_STATUSES or time.ticks_diff(now, self.attempt_ms) >= (self.FAST_TIMEOUT_MS if self.fast else self.timeout_ms):
+            return self._failed(now, status)
+        return self.POLL_MS
+
+    def _attempt(self, now):
+        """
+        Starts connecting, from the cache if there is one, and by scanning otherwise.
+        """
+        wlan = self.wlan
+        wlan.disconnect()  # Abandons an association still in progress
+        self.attempts += 1
+        self.attempt_ms = now
+        self.fast = self.cache is not None and not self.skip_cache
+        self._set(WIFI_CONNECTING)
+        if self.fast:
+            bssid, channel = self.cache
+            wlan.config(channel=channel)
+            wlan.connect(self.ssid, self.password, bssid=bssid)
+            return self.POLL_MS
+
+        self.found = self._scan()
+        if self.found is None:
+            # The network is down, which says nothing against the cache
+            self.skip_cache = False
+            return self._failed(now, network.STAT_NO_AP_FOUND)
+        bssid, channel = self.found
+        wlan.config(channel=channel)
+        wlan.connect(self.ssid, self.password, bssid=bssid)
+        return self.POLL_MS
+
+    def _scan(self):
+        """
+        Finds the strongest access point of the network.
+        :return: (bssid, channel), or None if the network is not in range.
+        """
+        ssid = self.ssid.encode()
+        best = None
+        for name, bssid, channel, rssi, security, hidden in self.wlan.scan():
+            if name == ssid and (best is None or rssi > best[2]):
+                best = (bssid, channel, rssi)
+        return None if best is None else best[:2]
+
+    def _connected(self, now):
+        elapsed_ms = time.ticks_diff(now, self.attempt_ms)
+        self.connections += 1
+        if self.fast:
+            self.fast_connections += 1
+        elif self.found is not None:
+            self._save(self.found[0], self.found[1])
+        if self.first_connect_ms is None:
+            self.first_connect_ms = time.ticks_diff(now, self.started_ms)
+        self.connect_ms = elapsed_ms
+        log.record(EVT_WIFI_CONNECTED, min(self.attempts, 32767), min(elapsed_ms, 32767), 1 if self.fast else 0)
+        self.attempts = 0
+        self.backoff_ms = 0
+        self.skip_cache = False
+        self._set(WIFI_CONNECTED)
+        return self.WATCH_MS
+
+    def _failed(self, now, status):
+        self.failures += 1
+        self.wlan.disconnect()
+        if self.fast:
+            # The network is down, or the access point moved: scan at once
+            log.record(EVT_WIFI_FAILED, min(self.attempts, 32767), status, 0)
+            self.skip_cache = True
+            return self._attempt(now)
+        self.backoff_ms = min(self.backoff_ms * 2, self.MAX_BACKOFF_MS) if self.backoff_ms else self.BACKOFF_MS
+        log.record(EVT_WIFI_FAILED, min(self.attempts, 32767), status, self.backoff_ms // 1000)
+        self._set(WIFI_BACKOFF)
+        return self.backoff_ms
+
+    def _set(self, state):
+        if state != self.state:
+            self.state = state
+            if self.on_change is not None:
+                self.on_change(state)
+
+    def _load(self):
+        """
+        Reads the connection cached by _save.
+        :return: (bssid, channel), or None.
+        """
+        if self.cache_path is None:
+            return None
+        try:
+            with open(self.cache_path, "rb") as file:
+                data = file.read()
+        except OSError:
+            return None
+        if len(data) != struct.calcsize(self.CACHE_FORMAT) or struct.unpack_from("<H", data)[0] != self.CACHE_MAGIC:
+            return None
+        magic, bssid, channel = struct.unpack(self.CACHE_FORMAT, data)
+        return bssid, channel
+
+    def _save(self, bssid, channel):
+        """
+        Caches a connection, unless it is the cached one: flash is only written when the network changed.
+        """
+        cache = (bssid, channel)
+        if self.cache_path is None or cache == self.cache:
+            return
+        self.cache = cache
+        with open(self.cache_path, "wb") as file:
+            file.write(struct.pack(self.CACHE_FORMAT, self.CACHE_MAGIC, bssid, channel))
+
+    def stats(self):
+        """
+        Returns how the connection went.
+        :return: Dictionary with the state's name, the milliseconds from start to the first connection,
+            the duration of the last successful attempt, the connections (and how many of them came from
+            the cache), the failed attempts and the dropped links.
+        """
+        return {
+            "state": WIFI_NAMES[self.state],
+            "first_connect_ms": self.first_connect_ms,
+            "connect_ms": self.connect_ms,
+            "connections": self.connections,
+            "fast_connections": self.fast_connections,
+            "failures": self.failures,
+            "drops": self.drops,
+        }